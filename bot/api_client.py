@@ -0,0 +1,525 @@
+#!/usr/bin/env python3
+"""
+Shared async client for the VC Dash API (login, state reads, collection writes).
+Used by main.py, eod.py, policies_bot.py, backfill.py and backfill_headed.py.
+
+One httpx.AsyncClient per run keeps connections alive between calls, so API I/O can run
+concurrently with scraping instead of blocking the event loop. Set API_HTTP2=1 (requires
+`pip install "httpx[http2]"`) to multiplex requests over a single HTTP/2 connection.
+
+Long-running processes can keep collections in memory with state_cache.StateCache, which
+re-fetches only the collections named in /state/stream events.
+
+GET /state is decoded incrementally (json_stream.py) so only the requested collections are
+ever held in memory.
+
+JSON request bodies of 1 KB or more are sent gzip-compressed (Content-Encoding: gzip) and
+responses are negotiated via Accept-Encoding (gzip, plus br when the brotli package is installed).
+
+Collection writes are compare-and-swap: the version of each collection read (GET /state meta.versions,
+GET /state/:key meta.version) is sent back as If-Match on PUT, so a concurrent writer's change is
+never silently overwritten. api_update_collection re-fetches just that collection and re-applies the
+caller's change on a version conflict (412).
+
+Writes that belong together (snapshots + house marketing at the end of a tick, perf_history + house
+marketing at EOD) go through api_batch as one POST /state/batch: one round-trip, one transaction and
+one SSE refresh for the dashboard. Build operations with the batch_* helpers.
+
+The auth cookie from /auth/login is saved to .api_session.json (mode 600, override with
+API_SESSION_FILE) and reused by later runs until shortly before it expires; a 401 on any call
+logs in again and retries the request once.
+"""
+
+import base64
+import gzip
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+import httpx
+
+from http_retry import request_with_retries
+from json_stream import iter_members
+
+NO_CACHE_HEADERS = {"Cache-Control": "no-cache", "Pragma": "no-cache"}
+SESSION_FILE = Path(os.environ.get("API_SESSION_FILE") or Path(__file__).resolve().parent / ".api_session.json")
+SESSION_REFRESH_MARGIN_SECONDS = 5 * 60
+# Used when /auth/login succeeds without an expiring cookie (session cookie or no-auth server).
+SESSION_DEFAULT_TTL_SECONDS = 12 * 60 * 60
+COMPRESS_MIN_BYTES = 1024
+# Whole-response retries when a streamed GET /state drops mid-body (after headers were received).
+STATE_STREAM_ATTEMPTS = 3
+# Re-fetch + re-apply rounds for api_update_collection after a version conflict.
+CONFLICT_RETRIES = 3
+
+
+def log(msg: str) -> None:
+    print(msg, flush=True)
+
+
+def _http2_enabled() -> bool:
+    if os.environ.get("API_HTTP2", "").strip().lower() not in ("1", "true", "yes"):
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        log("  API_HTTP2 is set but the h2 package is missing (pip install 'httpx[http2]'); using HTTP/1.1.")
+        return False
+    return True
+
+
+class ApiClient(httpx.AsyncClient):
+    """httpx.AsyncClient that remembers the admin credentials so a 401 can log in again transparently,
+    and the last seen version of each collection for conditional writes."""
+
+    credentials: tuple[str, str] | None = None
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.versions: dict[str, int] = {}
+
+
+def _remember_version(client: httpx.AsyncClient, key: str, version: Any) -> None:
+    versions = getattr(client, "versions", None)
+    if isinstance(versions, dict) and isinstance(version, int):
+        versions[key] = version
+
+
+def create_api_client(base_url: str) -> ApiClient:
+    """Return a pooled keep-alive client for base_url. Use as `async with create_api_client(...) as client:`."""
+    return ApiClient(
+        base_url=base_url.rstrip("/"),
+        headers={"Content-Type": "application/json"},
+        http2=_http2_enabled(),
+        limits=httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=60),
+        timeout=30,
+    )
+
+
+def _jwt_expiry(token: str) -> float | None:
+    """Return the `exp` claim of a JWT (seconds since epoch), or None if token is not a JWT."""
+    parts = token.split(".")
+    if len(parts) != 3:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(parts[1] + "=" * (-len(parts[1]) % 4)))
+    except (ValueError, TypeError):
+        return None
+    exp = payload.get("exp") if isinstance(payload, dict) else None
+    return float(exp) if isinstance(exp, (int, float)) else None
+
+
+def _save_session(client: httpx.AsyncClient, username: str) -> None:
+    cookies = []
+    expiries = []
+    for c in client.cookies.jar:
+        cookies.append({"name": c.name, "value": c.value, "domain": c.domain, "path": c.path})
+        if c.expires:
+            expiries.append(float(c.expires))
+        jwt_exp = _jwt_expiry(c.value or "")
+        if jwt_exp:
+            expiries.append(jwt_exp)
+    expires_at = min(expiries) if expiries else time.time() + SESSION_DEFAULT_TTL_SECONDS
+    data = {"baseUrl": str(client.base_url), "username": username, "expiresAt": expires_at, "cookies": cookies}
+    tmp = SESSION_FILE.with_name(SESSION_FILE.name + ".tmp")
+    try:
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.chmod(tmp, 0o600)
+        os.replace(tmp, SESSION_FILE)
+    except OSError as e:
+        log(f"  Could not save API session to {SESSION_FILE.name}: {e}")
+
+
+def _load_session(client: httpx.AsyncClient, username: str) -> bool:
+    """Load a saved, unexpired session for this API and user into client.cookies. Return True if loaded."""
+    try:
+        with open(SESSION_FILE, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if not isinstance(data, dict):
+        return False
+    if data.get("baseUrl") != str(client.base_url) or data.get("username") != username:
+        return False
+    expires_at = data.get("expiresAt")
+    if not isinstance(expires_at, (int, float)) or expires_at - SESSION_REFRESH_MARGIN_SECONDS <= time.time():
+        return False
+    for c in data.get("cookies") or []:
+        client.cookies.set(c["name"], c["value"], domain=c.get("domain") or "", path=c.get("path") or "/")
+    return True
+
+
+def _clear_session() -> None:
+    try:
+        SESSION_FILE.unlink()
+    except OSError:
+        pass
+
+
+async def _login(client: httpx.AsyncClient, username: str, password: str) -> bool:
+    r = await request_with_retries(
+        client,
+        "post",
+        "/auth/login",
+        json={"username": username, "password": password},
+        timeout=15,
+        log_fn=log,
+    )
+    if r.status_code != 200:
+        log(f"  Login failed: {r.status_code} {r.text[:200]}")
+        _clear_session()
+        return False
+    _save_session(client, username)
+    return True
+
+
+def _encode_json_body(kwargs: dict[str, Any]) -> None:
+    """Replace kwargs["json"] with compact (and, when large, gzip-compressed) content in place."""
+    body = json.dumps(kwargs.pop("json"), separators=(",", ":")).encode("utf-8")
+    headers = dict(kwargs.get("headers") or {})
+    if len(body) >= COMPRESS_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    kwargs["content"] = body
+    kwargs["headers"] = headers
+
+
+async def _request(client: httpx.AsyncClient, method: str, path: str, **kwargs: Any) -> httpx.Response:
+    if "json" in kwargs:
+        _encode_json_body(kwargs)
+    r = await request_with_retries(client, method, path, log_fn=log, **kwargs)
+    credentials = getattr(client, "credentials", None)
+    if r.status_code == 401 and credentials:
+        log("  API session rejected (401); logging in again.")
+        await r.aclose()
+        client.cookies.clear()
+        if await _login(client, *credentials):
+            r = await request_with_retries(client, method, path, log_fn=log, **kwargs)
+    return r
+
+
+async def api_login(client: httpx.AsyncClient, username: str, password: str) -> bool:
+    """Reuse the saved session for this API and user if still valid; otherwise POST /auth/login and save it."""
+    if isinstance(client, ApiClient):
+        client.credentials = (username, password)
+    if _load_session(client, username):
+        return True
+    return await _login(client, username, password)
+
+
+async def api_get_state(client: httpx.AsyncClient, keys: Iterable[str] | None = None) -> dict | None:
+    """GET /state, streamed and decoded incrementally; only collections in keys (all when None) are returned."""
+    for attempt in range(STATE_STREAM_ATTEMPTS):
+        r = await _request(client, "get", "/state", timeout=90, headers=NO_CACHE_HEADERS, stream=True)
+        try:
+            if r.status_code != 200:
+                log(f"  GET /state failed: {r.status_code}")
+                return None
+            state = {}
+            extra: dict[str, Any] = {"meta": None}
+            async for key, value in iter_members(r.aiter_text(), keys, extra=extra):
+                state[key] = value
+            meta = extra["meta"] if isinstance(extra["meta"], dict) else {}
+            for key, version in (meta.get("versions") or {}).items():
+                if keys is None or key in state:
+                    _remember_version(client, key, version)
+            return state
+        except httpx.RequestError as e:
+            log(f"  GET /state interrupted (attempt {attempt + 1}/{STATE_STREAM_ATTEMPTS}): {e!r}")
+        except ValueError as e:
+            log(f"  GET /state returned malformed JSON: {e}")
+            return None
+        finally:
+            await r.aclose()
+    return None
+
+
+async def api_get_collection(client: httpx.AsyncClient, key: str) -> list | None:
+    r = await _request(client, "get", f"/state/{key}", timeout=30, headers=NO_CACHE_HEADERS)
+    if r.status_code != 200:
+        log(f"  GET /state/{key} failed: {r.status_code}")
+        return None
+    data = r.json()
+    if not isinstance(data, dict):
+        return data
+    _remember_version(client, key, (data.get("meta") or {}).get("version"))
+    return data.get("data", data)
+
+
+async def _put_collection(client: httpx.AsyncClient, key: str, rows: list) -> int:
+    """PUT rows with If-Match on the last seen version of key (when known). Returns the HTTP status."""
+    headers = {}
+    version = (getattr(client, "versions", None) or {}).get(key)
+    if version is not None:
+        headers["If-Match"] = f'"{version}"'
+    r = await _request(client, "put", f"/state/{key}", json=rows, timeout=15, headers=headers)
+    if r.status_code == 200:
+        data = r.json()
+        if isinstance(data, dict):
+            _remember_version(client, key, (data.get("meta") or {}).get("version"))
+    elif r.status_code == 412:
+        log(f"  PUT /state/{key}: {key} changed since it was read (version conflict).")
+    else:
+        log(f"  PUT /state/{key} failed: {r.status_code} {r.text[:200]}")
+    return r.status_code
+
+
+async def api_open_state_stream(client: httpx.AsyncClient, read_timeout: float) -> httpx.Response:
+    """GET /state/stream (server-sent events), opened for streaming; the caller must aclose() it."""
+    return await _request(
+        client,
+        "get",
+        "/state/stream",
+        stream=True,
+        headers={"Accept": "text/event-stream", **NO_CACHE_HEADERS},
+        timeout=httpx.Timeout(10.0, read=read_timeout),
+    )
+
+
+async def api_put_collection(client: httpx.AsyncClient, key: str, rows: list) -> bool:
+    return await _put_collection(client, key, rows) == 200
+
+
+async def api_update_collection(
+    client: httpx.AsyncClient,
+    key: str,
+    apply: Callable[[list], list | None],
+    rows: list | None = None,
+) -> bool:
+    """
+    Compare-and-swap read-modify-write of one collection. apply(rows) returns the new collection (or None
+    for nothing to write); rows is the copy already loaded (e.g. from api_get_state), fetched when None.
+    On a version conflict only this collection is re-fetched and apply re-run, up to CONFLICT_RETRIES times.
+    """
+    for attempt in range(CONFLICT_RETRIES + 1):
+        if rows is None:
+            rows = await api_get_collection(client, key)
+            if rows is None:
+                return False
+        new_rows = apply(list(rows))
+        if new_rows is None:
+            return True
+        status = await _put_collection(client, key, new_rows)
+        if status != 412:
+            return status == 200
+        if attempt < CONFLICT_RETRIES:
+            log(f"  Re-fetching {key} and re-applying changes (attempt {attempt + 2}/{CONFLICT_RETRIES + 1}).")
+        rows = None
+    return False
+
+
+async def api_put_snapshots(client: httpx.AsyncClient, snapshots: list) -> bool:
+    return await api_put_collection(client, "snapshots", snapshots)
+
+
+async def api_put_perf_history(client: httpx.AsyncClient, perf_history: list) -> bool:
+    return await api_put_collection(client, "perfHistory", perf_history)
+
+
+def batch_upsert(collection: str, rows: list) -> dict:
+    return {"op": "upsert", "collection": collection, "rows": rows}
+
+
+def batch_delete(collection: str, ids: Iterable[str]) -> dict:
+    return {"op": "delete", "collection": collection, "ids": list(ids)}
+
+
+def batch_patch(collection: str, patches: list[dict]) -> dict:
+    """Each patch is {"id": ..., field: value, ...}; only those fields of the existing row change."""
+    return {"op": "patch", "collection": collection, "rows": patches}
+
+
+def batch_replace(collection: str, rows: list) -> dict:
+    return {"op": "replace", "collection": collection, "rows": rows}
+
+
+def batch_replace_dates(
+    collection: str,
+    rows_by_date: dict[str, list],
+    skip_existing: bool = False,
+    house_marketing: dict[str, float] | None = None,
+) -> dict:
+    """
+    Replace all rows of the dates in rows_by_date; with skip_existing, dates that already have rows are kept.
+    house_marketing ({dateKey: amount}) is set only for the dates actually replaced, so kept dates keep theirs.
+    """
+    operation = {
+        "op": "replaceDates",
+        "collection": collection,
+        "dateKeys": list(rows_by_date),
+        "rows": [row for rows in rows_by_date.values() for row in rows],
+        "skipExisting": skip_existing,
+    }
+    if house_marketing:
+        operation["houseMarketing"] = [
+            {"dateKey": date_key, "amount": round(amount, 2)} for date_key, amount in house_marketing.items()
+        ]
+    return operation
+
+
+def batch_set_house_marketing(date_key: str, amount: float) -> dict:
+    return {"op": "setHouseMarketing", "dateKey": date_key, "amount": round(amount, 2)}
+
+
+def batch_upsert_house_marketing(amounts: dict[str, float]) -> dict:
+    """House marketing for every date in amounts ({dateKey: amount}) in one operation; other dates are kept."""
+    return {
+        "op": "upsertHouseMarketing",
+        "entries": [{"dateKey": date_key, "amount": round(amount, 2)} for date_key, amount in amounts.items()],
+    }
+
+
+def batch_set_last_policies_bot_run(timestamp_iso: str) -> dict:
+    return {"op": "setLastPoliciesBotRun", "timestamp": timestamp_iso}
+
+
+def slot_snapshot_operations(existing: list, new_rows: list, date_key: str, slot_key: str) -> list[dict]:
+    """Batch operations replacing the (date_key, slot_key) snapshots with new_rows (row-level merge_snapshots)."""
+    keep_ids = {r["id"] for r in new_rows}
+    stale_ids = [
+        s["id"]
+        for s in existing
+        if (s.get("dateKey"), s.get("slot")) == (date_key, slot_key) and s.get("id") and s["id"] not in keep_ids
+    ]
+    operations = [batch_upsert("snapshots", new_rows)]
+    if stale_ids:
+        operations.append(batch_delete("snapshots", stale_ids))
+    return operations
+
+
+def slot_field_operations(existing: list, rows: list, fields: Iterable[str]) -> list[dict]:
+    """
+    Batch operations writing only fields (and updatedAt) of the snapshot rows already in existing; rows not there
+    yet are upserted whole. For ticks that scraped one site: the other site's numbers in the row are left alone.
+    """
+    existing_ids = {s.get("id") for s in existing}
+    fields = (*fields, "updatedAt")
+    patches = [{"id": r["id"], **{f: r[f] for f in fields}} for r in rows if r["id"] in existing_ids]
+    added = [r for r in rows if r["id"] not in existing_ids]
+    operations = []
+    if added:
+        operations.append(batch_upsert("snapshots", added))
+    if patches:
+        operations.append(batch_patch("snapshots", patches))
+    return operations
+
+
+async def _post_batch(
+    client: httpx.AsyncClient, operations: list[dict], cas: Iterable[str] = ()
+) -> tuple[int, dict[str, list]]:
+    """POST /state/batch. Returns (status code, stored rows of replaceDates dates by collection)."""
+    versions = getattr(client, "versions", None) or {}
+    body: dict[str, Any] = {"operations": operations}
+    expected = {key: versions[key] for key in cas if key in versions}
+    if expected:
+        body["expectedVersions"] = expected
+    r = await _request(client, "post", "/state/batch", json=body, timeout=30)
+    rows: dict[str, list] = {}
+    if r.status_code == 200:
+        data = r.json()
+        meta = (data.get("meta") or {}) if isinstance(data, dict) else {}
+        for key, version in (meta.get("versions") or {}).items():
+            _remember_version(client, key, version)
+        rows = ((data.get("data") or {}).get("rows") or {}) if isinstance(data, dict) else {}
+    elif r.status_code == 412:
+        log(f"  POST /state/batch: {', '.join(cas)} changed since read (version conflict).")
+    else:
+        log(f"  POST /state/batch failed: {r.status_code} {r.text[:200]}")
+    return r.status_code, rows
+
+
+async def api_batch(client: httpx.AsyncClient, operations: list[dict], cas: Iterable[str] = ()) -> bool:
+    """
+    Apply operations (batch_* helpers) in one transaction via POST /state/batch. Collections named in cas
+    must still be at the version last read, otherwise nothing is written and False is returned.
+    """
+    status, _ = await _post_batch(client, operations, cas)
+    return status == 200
+
+
+async def api_upsert_house_marketing(client: httpx.AsyncClient, amounts: dict[str, float]) -> bool:
+    """Write a range's house marketing ({dateKey: amount}) in one request. True when there is nothing to write."""
+    if not amounts:
+        return True
+    return await api_batch(client, [batch_upsert_house_marketing(amounts)])
+
+
+async def api_batch_rows(
+    client: httpx.AsyncClient, operations: list[dict], cas: Iterable[str] = ()
+) -> dict[str, list] | None:
+    """Like api_batch, but returns the stored rows of the dates named by replaceDates operations
+    ({collection: rows}), or None if the batch failed."""
+    status, rows = await _post_batch(client, operations, cas)
+    return rows if status == 200 else None
+
+
+async def api_batch_update(
+    client: httpx.AsyncClient,
+    collections: tuple[str, ...],
+    build: Callable[[dict[str, list]], list[dict] | None],
+    current: dict[str, list] | None = None,
+) -> bool:
+    """
+    Compare-and-swap batch over collections: build({key: rows}) returns the operations (None for nothing to
+    write) from the copies already loaded in current (fetched when missing). On a version conflict only
+    those collections are re-fetched and build re-run, up to CONFLICT_RETRIES times.
+    """
+    current = dict(current or {})
+    for attempt in range(CONFLICT_RETRIES + 1):
+        for key in collections:
+            if current.get(key) is None:
+                rows = await api_get_collection(client, key)
+                if rows is None:
+                    return False
+                current[key] = rows
+        operations = build(current)
+        if operations is None:
+            return True
+        status, _ = await _post_batch(client, operations, collections)
+        if status != 412:
+            return status == 200
+        if attempt < CONFLICT_RETRIES:
+            log(f"  Re-fetching {', '.join(collections)} and rebuilding batch (attempt {attempt + 2}/{CONFLICT_RETRIES + 1}).")
+        current = {}
+    return False
+
+
+async def api_get_audit_records(client: httpx.AsyncClient) -> list[dict]:
+    records = await api_get_collection(client, "auditRecords")
+    return records if isinstance(records, list) else []
+
+
+async def api_put_audit_records(client: httpx.AsyncClient, records: list[dict]) -> bool:
+    return await api_put_collection(client, "auditRecords", records)
+
+
+async def api_set_house_marketing(client: httpx.AsyncClient, date_key: str, amount: float) -> bool:
+    r = await _request(
+        client,
+        "post",
+        "/state/house-marketing",
+        json={"dateKey": date_key, "amount": round(amount, 2)},
+        timeout=10,
+    )
+    if r.status_code != 200:
+        log(f"  POST /state/house-marketing failed: {r.status_code} {r.text[:200]}")
+        return False
+    return True
+
+
+async def api_set_last_policies_bot_run(client: httpx.AsyncClient, timestamp_iso: str) -> bool:
+    r = await _request(
+        client,
+        "post",
+        "/state/last-policies-bot-run",
+        json={"timestamp": timestamp_iso},
+        timeout=10,
+    )
+    if r.status_code != 200:
+        log(f"  POST /state/last-policies-bot-run failed: {r.status_code} {r.text[:200]}")
+        return False
+    return True
@@ -8,6 +8,8 @@ import asyncio
 from pathlib import Path
 from typing import Optional
 
+from browser_profile import context_options, launch_options
+
 # Login URLs
 POLICYDEN_LOGIN = "https://app.policyden.com/login"
 WEGENERATE_LOGIN = "https://app.wegenerate.com/login"
@@ -102,8 +104,8 @@ async def login_and_save_async(
 
     out = False
     async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context()
+        browser = await p.chromium.launch(**launch_options())
+        context = await browser.new_context(**context_options())
         page = await context.new_page()
         try:
             await page.goto(login_url, wait_until="networkidle", timeout=30000)
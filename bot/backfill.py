@@ -3,13 +3,14 @@
 Backfill EOD performance by scraping historical data from PolicyDen and WeGenerate.
 
 When run interactively (TTY), prompts: "Press 1 for headless, 2 for headed". Option 2
-delegates to backfill_headed.py (visible browser). When run non-interactively (e.g. cron),
-always uses headless.
+runs backfill_headed.run_headed() (visible browser) in this process. When run
+non-interactively (e.g. cron), always uses headless.
 
 For each date in a given range, this script:
 - Scrapes PolicyDen (sales) and WeGenerate (calls + marketing) using the existing scrapers.
 - Writes/overwrites snapshots for (dateKey, slot) and sets house-level marketing for that date.
-- Optionally runs eod.py --backfill-range to freeze perf_history for the same range.
+- Optionally freezes perf_history for the same range (eod.freeze_range, as eod.py --backfill-range)
+  from the snapshots it just wrote, on the same API login.
 
 Usage examples:
   # Backfill from a start date up to yesterday (default slot=17:00)
@@ -27,31 +28,36 @@ from __future__ import annotations
 import argparse
 import asyncio
 import os
-import subprocess
 import sys
+import time
 from dataclasses import dataclass
 from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
 from typing import Iterable
 
-import requests
 from dotenv import load_dotenv
 from zoneinfo import ZoneInfo
 
-from http_retry import request_with_retries
-
+from api_client import (
+    api_get_state,
+    api_login,
+    api_batch,
+    batch_set_house_marketing,
+    create_api_client,
+    slot_snapshot_operations,
+)
+from backfill_headed import run_headed
+from eod import CHECKPOINT_FILE, freeze_range
 from main import (  # type: ignore[import]
     SLOT_CONFIG,
     ZONE,
     _run_scrapes_async,
-    api_get_state,
-    api_login,
-    api_put_snapshots,
-    api_set_house_marketing,
     load_agent_map,
     log,
     merge_snapshots,
 )
+from run_lock import single_flight
+from run_log import emit
 
 
 @dataclass
@@ -81,7 +87,7 @@ def parse_args() -> BackfillConfig:
     parser.add_argument(
         "--freeze",
         action="store_true",
-        help="After writing snapshots for the date range, run eod.py --backfill-range START END.",
+        help="After writing snapshots for the date range, freeze perf_history for it (as eod.py --backfill-range START END).",
     )
     parser.add_argument(
         "--dry-run",
@@ -207,21 +213,6 @@ def build_new_snapshot_rows(
     return new_rows
 
 
-def run_freeze_backfill(start_key: str, end_key: str) -> int:
-    script_path = Path(__file__).resolve().with_name("eod.py")
-    if not script_path.exists():
-        log(f"eod.py not found at {script_path}; skipping --freeze step.")
-        return 1
-    cmd = [sys.executable, str(script_path), "--backfill-range", start_key, end_key]
-    log(f"Running eod backfill: {' '.join(cmd)}")
-    try:
-        completed = subprocess.run(cmd, check=False)
-        return completed.returncode
-    except Exception as e:
-        log(f"Error running eod.py: {e}")
-        return 1
-
-
 def main() -> int:
     load_dotenv()
     cfg = parse_args()
@@ -233,28 +224,34 @@ def main() -> int:
         except (EOFError, KeyboardInterrupt):
             choice = "1"
         if choice == "2":
-            bot_dir = Path(__file__).resolve().parent
-            headed_script = bot_dir / "backfill_headed.py"
-            if not headed_script.exists():
-                log(f"backfill_headed.py not found at {headed_script}; running headless.")
-            else:
-                cmd = [
-                    sys.executable,
-                    str(headed_script),
-                    "--start",
-                    cfg.start.strftime("%Y-%m-%d"),
-                    "--end",
-                    cfg.end.strftime("%Y-%m-%d"),
-                    "--slot",
-                    cfg.slot_key,
-                ]
-                if cfg.freeze:
-                    cmd.append("--freeze")
-                if cfg.dry_run:
-                    cmd.append("--dry-run")
-                log(f"Running headed backfill: {' '.join(cmd)}")
-                return subprocess.run(cmd).returncode
+            # Same process: backfill_headed logs in, scrapes and (with --freeze) freezes on one client.
+            log("Running headed backfill...")
+            try:
+                return asyncio.run(run_headed(
+                    cfg.start, cfg.end, cfg.slot_key, cfg.slot_label, freeze=cfg.freeze, dry_run=cfg.dry_run,
+                ))
+            except KeyboardInterrupt:
+                log("Backfill interrupted (Ctrl+C).")
+                return 130
+
+    try:
+        return asyncio.run(main_async(cfg))
+    except KeyboardInterrupt:
+        log("Backfill interrupted (Ctrl+C).")
+        return 130
+
+
+async def main_async(cfg: BackfillConfig) -> int:
+    # One backfill at a time; it waits for the browser while a tick or policies sync has it (run_lock.py).
+    async with single_flight(Path(__file__).resolve().parent, "backfill", join=False) as flight:
+        if flight.skipped:
+            log("Another backfill is running; try again when it finishes.")
+            return 1
+        flight.code = await _backfill_async(cfg)
+        return flight.code
 
+
+async def _backfill_async(cfg: BackfillConfig) -> int:
     api_base = os.environ.get("API_BASE_URL", "").strip()
     if not api_base:
         log("Set API_BASE_URL in .env")
@@ -281,42 +278,45 @@ def main() -> int:
         log("No agent_map.json; exiting without backfill.")
         return 1
 
-    session = requests.Session()
-    session.headers["Content-Type"] = "application/json"
+    async with create_api_client(api_base) as client:
+        if not await api_login(client, admin_user, admin_pass):
+            return 1
 
-    if not api_login(session, api_base, admin_user, admin_pass):
-        return 1
+        state = await api_get_state(client, ("agents", "snapshots"))
+        if not state:
+            return 1
 
-    state = api_get_state(session, api_base)
-    if not state:
-        return 1
-
-    agents = state.get("agents") or []
-    active_ids = {a["id"] for a in agents if a.get("active")}
-    snapshots = list(state.get("snapshots") or [])
+        agents = state.get("agents") or []
+        active_ids = {a["id"] for a in agents if a.get("active")}
+        snapshots = list(state.get("snapshots") or [])
 
-    log(
-        f"Backfill range: {cfg.start} .. {cfg.end} (slot={cfg.slot_key}, freeze={cfg.freeze}, dry_run={cfg.dry_run})"
-    )
+        log(
+            f"Backfill range: {cfg.start} .. {cfg.end} (slot={cfg.slot_key}, freeze={cfg.freeze}, dry_run={cfg.dry_run})"
+        )
 
-    try:
         for date_key in iter_date_keys(cfg.start, cfg.end):
+            date_started = time.monotonic()
+
+            def date_done(outcome: str, rows: int = 0) -> None:
+                emit(
+                    "date", outcome=outcome, date=date_key, rows=rows,
+                    duration_ms=round((time.monotonic() - date_started) * 1000),
+                )
+
             sales_by_agent: dict[str, int]
             calls_by_agent: dict[str, int]
             marketing_by_agent: dict[str, float]
             campaign_marketing: float | None
 
-            sales_by_agent, calls_by_agent, marketing_by_agent, campaign_marketing = asyncio.run(
-                scrape_for_date(
-                    auth_policyden,
-                    auth_wegenerate,
-                    date_key,
-                    bot_dir,
-                    policyden_user,
-                    policyden_pass,
-                    wegenerate_user,
-                    wegenerate_pass,
-                )
+            sales_by_agent, calls_by_agent, marketing_by_agent, campaign_marketing = await scrape_for_date(
+                auth_policyden,
+                auth_wegenerate,
+                date_key,
+                bot_dir,
+                policyden_user,
+                policyden_pass,
+                wegenerate_user,
+                wegenerate_pass,
             )
 
             if not sales_by_agent and not calls_by_agent:
@@ -324,6 +324,7 @@ def main() -> int:
                     f"  {date_key}: both scrapers returned no data. "
                     "Check sessions (capture.py) or selectors; skipping snapshot write."
                 )
+                date_done("empty")
                 continue
 
             new_rows = build_new_snapshot_rows(
@@ -339,6 +340,7 @@ def main() -> int:
             )
             if not new_rows:
                 log(f"  {date_key}: no snapshot rows to push (check agent_map and active agents).")
+                date_done("no rows")
                 continue
 
             merged = merge_snapshots(snapshots, new_rows, date_key, cfg.slot_key)
@@ -350,38 +352,40 @@ def main() -> int:
                         f"  {date_key}: [dry-run] would set house marketing to ${campaign_marketing:,.2f}."
                     )
                 snapshots = merged
+                date_done("dry run", len(new_rows))
                 continue
 
-            if not api_put_snapshots(session, api_base, merged):
-                log(f"  {date_key}: PUT /state/snapshots failed; leaving local state unchanged.")
+            # The date's house marketing goes in the same transaction as its snapshots, so a run
+            # that stops part way leaves every pushed date complete.
+            operations = slot_snapshot_operations(snapshots, new_rows, date_key, cfg.slot_key)
+            if campaign_marketing is not None:
+                operations.append(batch_set_house_marketing(date_key, campaign_marketing))
+            if not await api_batch(client, operations):
+                log(f"  {date_key}: POST /state/batch failed; leaving local state unchanged.")
+                date_done("failed", len(new_rows))
                 continue
 
             snapshots = merged
             log(f"  {date_key}: pushed {len(new_rows)} snapshots for slot {cfg.slot_key}.")
-
+            date_done("pushed", len(new_rows))
             if campaign_marketing is not None:
-                if api_set_house_marketing(session, api_base, date_key, campaign_marketing):
-                    log(
-                        f"  {date_key}: set house marketing from WeGenerate campaign total "
-                        f"${campaign_marketing:,.2f}."
-                    )
-                else:
-                    log(f"  {date_key}: failed to set house marketing.")
-
-    except KeyboardInterrupt:
-        log("Backfill interrupted (Ctrl+C).")
-        return 130
-
-    if cfg.freeze and not cfg.dry_run:
-        start_key = cfg.start.strftime("%Y-%m-%d")
-        end_key = cfg.end.strftime("%Y-%m-%d")
-        rc = run_freeze_backfill(start_key, end_key)
-        if rc != 0:
-            log("eod backfill exited with non-zero status.")
-            return rc
+                log(f"  {date_key}: WeGenerate campaign total ${campaign_marketing:,.2f} (house marketing).")
+
+        if cfg.freeze and not cfg.dry_run:
+            start_key = cfg.start.strftime("%Y-%m-%d")
+            end_key = cfg.end.strftime("%Y-%m-%d")
+            log(f"Freezing perf_history for {start_key} .. {end_key}...")
+            # agents and the snapshots written above are passed along; only perfHistory is fetched.
+            rc = await freeze_range(
+                client, start_key, end_key, bot_dir / CHECKPOINT_FILE,
+                state={"agents": agents, "snapshots": snapshots},
+            )
+            if rc != 0:
+                log("eod backfill exited with non-zero status.")
+                return rc
 
-    log("Backfill complete.")
-    return 0
+        log("Backfill complete.")
+        return 0
 
 
 if __name__ == "__main__":
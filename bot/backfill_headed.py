@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 Self-contained backfill bot: PolicyDen + WeGenerate via Playwright, headed by default
-so you can watch the process. No imports from main.py, auth_login.py, or backfill.py.
+so you can watch the process. No imports from main.py, auth_login.py, or backfill.py; API calls
+go through the shared api_client.py and --freeze calls eod.freeze_range() in-process.
 
 Usage:
   python backfill_headed.py --start 2025-03-01 --end 2025-03-07
@@ -18,16 +19,27 @@ import asyncio
 import json
 import os
 import re
-import subprocess
 import sys
 import time
 import uuid
 from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
 
-import requests
 from dotenv import load_dotenv
-from playwright.async_api import async_playwright
+
+from api_client import (
+    api_get_state,
+    api_login,
+    api_batch,
+    batch_delete,
+    batch_set_house_marketing,
+    create_api_client,
+    slot_snapshot_operations,
+)
+from eod import CHECKPOINT_FILE, freeze_range
+from browser_profile import context_options, launch_options, sample_browser_memory, trim_context
+from run_lock import single_flight
+from run_log import emit
 
 # --- Constants ---
 ZONE = "America/New_York"
@@ -43,33 +55,6 @@ def log(msg: str) -> None:
     print(msg, flush=True)
 
 
-# --- HTTP with retries (inlined, no http_retry import) ---
-def request_with_retries(
-    session: requests.Session,
-    method: str,
-    url: str,
-    *,
-    max_retries: int = 5,
-    **kwargs,
-) -> requests.Response:
-    last_exc = None
-    for attempt in range(max_retries):
-        try:
-            r = session.request(method, url, **kwargs)
-            _ = r.content
-            return r
-        except (
-            requests.exceptions.ChunkedEncodingError,
-            requests.exceptions.ConnectionError,
-            requests.exceptions.Timeout,
-        ) as e:
-            last_exc = e
-            log(f"  Request failed (attempt {attempt + 1}/{max_retries}): {e}")
-            if attempt < max_retries - 1:
-                time.sleep(2 + 2**attempt)
-    raise last_exc or RuntimeError("request_with_retries: no attempt ran")
-
-
 # --- Config / env ---
 def load_agent_map(bot_dir: Path) -> dict[str, str]:
     path = bot_dir / "agent_map.json"
@@ -93,65 +78,14 @@ def get_env() -> tuple[str, str, str, str, str, str, str]:
     return api_base, admin_user, admin_pass, policyden_user, policyden_pass, wegenerate_user, wegenerate_pass
 
 
-# --- API (inlined) ---
-def api_login(session: requests.Session, base_url: str, username: str, password: str) -> bool:
-    url = f"{base_url.rstrip('/')}/auth/login"
-    r = request_with_retries(session, "post", url, json={"username": username, "password": password}, timeout=15)
-    if r.status_code != 200:
-        log(f"  Login failed: {r.status_code} {r.text[:200]}")
-        return False
-    return True
-
-
-def api_get_state(session: requests.Session, base_url: str) -> dict | None:
-    url = f"{base_url.rstrip('/')}/state"
-    r = request_with_retries(
-        session, "get", url, timeout=90, max_retries=5,
-        headers={"Cache-Control": "no-cache", "Pragma": "no-cache"},
-    )
-    if r.status_code != 200:
-        log(f"  GET /state failed: {r.status_code}")
-        return None
-    data = r.json()
-    return data.get("data") if isinstance(data, dict) else data
-
-
-def api_put_snapshots(session: requests.Session, base_url: str, snapshots: list) -> bool:
-    url = f"{base_url.rstrip('/')}/state/snapshots"
-    r = request_with_retries(session, "put", url, json=snapshots, timeout=15)
-    if r.status_code != 200:
-        log(f"  PUT /state/snapshots failed: {r.status_code} {r.text[:200]}")
-        return False
-    return True
-
-
-def api_set_house_marketing(session: requests.Session, base_url: str, date_key: str, amount: float) -> bool:
-    url = f"{base_url.rstrip('/')}/state/house-marketing"
-    r = request_with_retries(session, "post", url, json={"dateKey": date_key, "amount": round(amount, 2)}, timeout=10)
-    if r.status_code != 200:
-        log(f"  POST /state/house-marketing failed: {r.status_code} {r.text[:200]}")
-        return False
-    return True
-
-
-def api_put_perf_history(session: requests.Session, base_url: str, perf_history: list) -> bool:
-    url = f"{base_url.rstrip('/')}/state/perfHistory"
-    r = request_with_retries(session, "put", url, json=perf_history, timeout=15)
-    if r.status_code != 200:
-        log(f"  PUT /state/perfHistory failed: {r.status_code} {r.text[:200]}")
-        return False
-    return True
-
-
 def merge_snapshots(existing: list, new_rows: list, date_key: str, slot_key: str) -> list:
     key = (date_key, slot_key)
     rest = [s for s in existing if (s.get("dateKey"), s.get("slot")) != key]
     return rest + new_rows
 
 
-def delete_weekend_dates_in_range(
-    session: requests.Session,
-    api_base: str,
+async def delete_weekend_dates_in_range(
+    client,
     snapshots: list,
     perf_history: list,
     start_date: date,
@@ -175,11 +109,13 @@ def delete_weekend_dates_in_range(
     if dry_run:
         log(f"  delete-weekends: [dry-run] would remove {removed_snaps} snapshots, {removed_perf} perfHistory rows")
         return snapshots, perf_history
-    if removed_snaps > 0 and not api_put_snapshots(session, api_base, filtered_snapshots):
-        log("  delete-weekends: failed to PUT snapshots")
-        return snapshots, perf_history
-    if removed_perf > 0 and not api_put_perf_history(session, api_base, filtered_perf):
-        log("  delete-weekends: failed to PUT perfHistory")
+    operations = []
+    if removed_snaps > 0:
+        operations.append(batch_delete("snapshots", [s["id"] for s in snapshots if s.get("dateKey") in weekend_dates]))
+    if removed_perf > 0:
+        operations.append(batch_delete("perfHistory", [p["id"] for p in perf_history if p.get("dateKey") in weekend_dates]))
+    if operations and not await api_batch(client, operations):
+        log("  delete-weekends: failed to delete weekend rows")
         return snapshots, perf_history
     if removed_snaps > 0 or removed_perf > 0:
         log(f"  delete-weekends: removed {removed_snaps} snapshots, {removed_perf} perfHistory rows")
@@ -523,6 +459,10 @@ async def scrape_wegenerate(
     return out_calls, marketing_by_agent, campaign_marketing
 
 
+def _elapsed_ms(started: float) -> int:
+    return round((time.monotonic() - started) * 1000)
+
+
 # --- Build snapshot rows and push ---
 def build_snapshot_rows(
     date_key: str,
@@ -565,20 +505,6 @@ def build_snapshot_rows(
     return new_rows
 
 
-def run_freeze(start_key: str, end_key: str, bot_dir: Path) -> int:
-    script = bot_dir / "eod.py"
-    if not script.exists():
-        log(f"  eod.py not found at {script}; skipping --freeze.")
-        return 1
-    cmd = [sys.executable, str(script), "--backfill-range", start_key, end_key]
-    log(f"  Running: {' '.join(cmd)}")
-    try:
-        return subprocess.run(cmd, check=False).returncode
-    except Exception as e:
-        log(f"  Error running eod: {e}")
-        return 1
-
-
 # --- Main backfill loop ---
 async def run_backfill(
     start_date: date,
@@ -605,103 +531,117 @@ async def run_backfill(
     skip_weekends: bool = True,
     delete_weekends: bool = False,
 ) -> int:
-    session = requests.Session()
-    session.headers["Content-Type"] = "application/json"
-    if not api_login(session, api_base, admin_user, admin_pass):
-        return 1
-    state = api_get_state(session, api_base)
-    if not state:
-        return 1
-    agents = state.get("agents") or []
-    active_ids = {a["id"] for a in agents if a.get("active")}
-    snapshots = list(state.get("snapshots") or [])
-    perf_history = list(state.get("perfHistory") or [])
-    start_key = start_date.strftime("%Y-%m-%d")
-    if delete_weekends:
-        log("Delete weekend dates in range...")
-        snapshots, perf_history = delete_weekend_dates_in_range(
-            session, api_base, snapshots, perf_history, start_date, end_date, dry_run
-        )
-    end_key = end_date.strftime("%Y-%m-%d")
-
-    launch_options = {"headless": not headed}
-    if slow_mo is not None:
-        launch_options["slow_mo"] = slow_mo
-
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(**launch_options)
-        current = start_date
-        while current <= end_date:
-            if skip_weekends and current.weekday() >= 5:  # 5=Saturday, 6=Sunday
-                log(f"\n=== {current.strftime('%Y-%m-%d')} (weekend, skipping) ===")
-                current += timedelta(days=1)
-                continue
-            date_key = current.strftime("%Y-%m-%d")
-            log(f"\n=== {date_key} ===")
-            ctx_opts = {}
-            if video_dir:
-                ctx_opts["record_video_dir"] = video_dir
-            context = await browser.new_context(**ctx_opts)
-            if trace_dir:
-                await context.tracing.start(screenshots=True, snapshots=True)
-            page = await context.new_page()
-            if auth_policyden.exists():
-                try:
-                    await context.storage_state(path=str(auth_policyden))
-                except Exception:
-                    pass
-            log("  PolicyDen: opening dashboard...")
-            sales_by_agent = await scrape_policyden(
-                page, context, date_key, auth_policyden, policyden_user, policyden_pass
+    async with create_api_client(api_base) as client:
+        if not await api_login(client, admin_user, admin_pass):
+            return 1
+        state = await api_get_state(client, ("agents", "snapshots", "perfHistory"))
+        if not state:
+            return 1
+        agents = state.get("agents") or []
+        active_ids = {a["id"] for a in agents if a.get("active")}
+        snapshots = list(state.get("snapshots") or [])
+        perf_history = list(state.get("perfHistory") or [])
+        start_key = start_date.strftime("%Y-%m-%d")
+        if delete_weekends:
+            log("Delete weekend dates in range...")
+            snapshots, perf_history = await delete_weekend_dates_in_range(
+                client, snapshots, perf_history, start_date, end_date, dry_run
             )
-            await _stop_trace(context, trace_dir, f"{date_key}_policyden")
-            await context.close()
-            context = await browser.new_context(**ctx_opts)
-            if trace_dir:
-                await context.tracing.start(screenshots=True, snapshots=True)
-            page = await context.new_page()
-            if auth_wegenerate.exists():
-                try:
-                    await context.storage_state(path=str(auth_wegenerate))
-                except Exception:
-                    pass
-            log("  WeGenerate: opening dashboard...")
-            calls_by_agent, marketing_by_agent, campaign_marketing = await scrape_wegenerate(
-                page, context, date_key, auth_wegenerate, wegenerate_user, wegenerate_pass
-            )
-            await _stop_trace(context, trace_dir, f"{date_key}_wegenerate")
-            await context.close()
-
-            new_rows = build_snapshot_rows(
-                date_key, slot_key, slot_label, agent_map, active_ids, snapshots,
-                sales_by_agent, calls_by_agent, marketing_by_agent,
-            )
-            if not new_rows:
-                log(f"  {date_key}: no snapshot rows (check agent_map and active agents).")
-                current += timedelta(days=1)
-                continue
-            merged = merge_snapshots(snapshots, new_rows, date_key, slot_key)
-            snapshots = merged
-            if dry_run:
-                log(f"  [dry-run] Would push {len(new_rows)} snapshots for {date_key}")
-                if campaign_marketing is not None:
-                    log(f"  [dry-run] Would set house marketing ${campaign_marketing:,.2f}")
-            else:
-                if api_put_snapshots(session, api_base, merged):
-                    log(f"  Pushed {len(new_rows)} snapshots for {date_key} {slot_key}.")
+        end_key = end_date.strftime("%Y-%m-%d")
+
+        from playwright.async_api import async_playwright
+        async with sample_browser_memory("Backfill"), async_playwright() as p:
+            # Inside the sample block, so the browser carries its tag and is measured.
+            launch = launch_options(headless=not headed)
+            if slow_mo is not None:
+                launch["slow_mo"] = slow_mo
+            browser = await p.chromium.launch(**launch)
+            current = start_date
+            while current <= end_date:
+                if skip_weekends and current.weekday() >= 5:  # 5=Saturday, 6=Sunday
+                    log(f"\n=== {current.strftime('%Y-%m-%d')} (weekend, skipping) ===")
+                    current += timedelta(days=1)
+                    continue
+                date_key = current.strftime("%Y-%m-%d")
+                date_started = time.monotonic()
+                log(f"\n=== {date_key} ===")
+                ctx_opts = {}
+                if video_dir:
+                    ctx_opts["record_video_dir"] = video_dir
+                context = await browser.new_context(**context_options(**ctx_opts))
+                await trim_context(context)
+                if trace_dir:
+                    await context.tracing.start(screenshots=True, snapshots=True)
+                page = await context.new_page()
+                if auth_policyden.exists():
+                    try:
+                        await context.storage_state(path=str(auth_policyden))
+                    except Exception:
+                        pass
+                log("  PolicyDen: opening dashboard...")
+                sales_by_agent = await scrape_policyden(
+                    page, context, date_key, auth_policyden, policyden_user, policyden_pass
+                )
+                await _stop_trace(context, trace_dir, f"{date_key}_policyden")
+                await context.close()
+                context = await browser.new_context(**context_options(**ctx_opts))
+                await trim_context(context)
+                if trace_dir:
+                    await context.tracing.start(screenshots=True, snapshots=True)
+                page = await context.new_page()
+                if auth_wegenerate.exists():
+                    try:
+                        await context.storage_state(path=str(auth_wegenerate))
+                    except Exception:
+                        pass
+                log("  WeGenerate: opening dashboard...")
+                calls_by_agent, marketing_by_agent, campaign_marketing = await scrape_wegenerate(
+                    page, context, date_key, auth_wegenerate, wegenerate_user, wegenerate_pass
+                )
+                await _stop_trace(context, trace_dir, f"{date_key}_wegenerate")
+                await context.close()
+
+                new_rows = build_snapshot_rows(
+                    date_key, slot_key, slot_label, agent_map, active_ids, snapshots,
+                    sales_by_agent, calls_by_agent, marketing_by_agent,
+                )
+                if not new_rows:
+                    log(f"  {date_key}: no snapshot rows (check agent_map and active agents).")
+                    emit("date", outcome="no rows", date=date_key, rows=0, duration_ms=_elapsed_ms(date_started))
+                    current += timedelta(days=1)
+                    continue
+                previous = snapshots
+                snapshots = merge_snapshots(snapshots, new_rows, date_key, slot_key)
+                if dry_run:
+                    log(f"  [dry-run] Would push {len(new_rows)} snapshots for {date_key}")
                     if campaign_marketing is not None:
-                        if api_set_house_marketing(session, api_base, date_key, campaign_marketing):
-                            log(f"  Set house marketing ${campaign_marketing:,.2f} for {date_key}.")
+                        log(f"  [dry-run] Would set house marketing ${campaign_marketing:,.2f}")
+                    emit("date", outcome="dry run", date=date_key, rows=len(new_rows), duration_ms=_elapsed_ms(date_started))
                 else:
-                    log(f"  Failed to PUT snapshots for {date_key}; stopping.")
-                    await browser.close()
-                    return 1
-            current += timedelta(days=1)
-        await browser.close()
-
-    if freeze and not dry_run:
-        return run_freeze(start_key, end_key, bot_dir)
-    return 0
+                    # House marketing in the same transaction as the date's snapshots, so a run that
+                    # stops part way leaves every pushed date complete.
+                    operations = slot_snapshot_operations(previous, new_rows, date_key, slot_key)
+                    if campaign_marketing is not None:
+                        operations.append(batch_set_house_marketing(date_key, campaign_marketing))
+                    if await api_batch(client, operations):
+                        log(f"  Pushed {len(new_rows)} snapshots for {date_key} {slot_key}.")
+                        emit("date", outcome="pushed", date=date_key, rows=len(new_rows), duration_ms=_elapsed_ms(date_started))
+                    else:
+                        log(f"  Failed to write snapshots for {date_key}; stopping.")
+                        emit("date", outcome="failed", date=date_key, rows=len(new_rows), duration_ms=_elapsed_ms(date_started))
+                        await browser.close()
+                        return 1
+                current += timedelta(days=1)
+            await browser.close()
+
+        if freeze and not dry_run:
+            # Freeze from the snapshots just written, on the same login (no eod.py subprocess or state re-download).
+            log(f"  Freezing perf_history for {start_key} .. {end_key}...")
+            return await freeze_range(
+                client, start_key, end_key, bot_dir / CHECKPOINT_FILE,
+                state={"agents": agents, "snapshots": snapshots, "perfHistory": perf_history},
+            )
+        return 0
 
 
 def main() -> int:
@@ -715,7 +655,7 @@ def main() -> int:
     parser.add_argument("--trace", type=str, default=None, metavar="DIR", help="Save trace to DIR")
     parser.add_argument("--video", type=str, default=None, metavar="DIR", help="Save video to DIR")
     parser.add_argument("--dry-run", action="store_true", help="Scrape only; do not PUT/POST")
-    parser.add_argument("--freeze", action="store_true", help="Run eod.py --backfill-range after snapshots (same as backfill.py --freeze)")
+    parser.add_argument("--freeze", action="store_true", help="Freeze perf_history for the range after snapshots (as eod.py --backfill-range; same as backfill.py --freeze)")
     parser.add_argument("--skip-weekends", action="store_true", default=True, help="Skip Saturday and Sunday (default)")
     parser.add_argument("--no-skip-weekends", action="store_false", dest="skip_weekends", help="Include weekends")
     parser.add_argument("--delete-weekends", action="store_true", help="Remove existing snapshots and perfHistory for weekend dates in the range")
@@ -731,6 +671,27 @@ def main() -> int:
         return 1
     slot_key = args.slot.strip()
     slot_label = SLOT_LABEL_DEFAULT if slot_key == SLOT_KEY_DEFAULT else f"{slot_key} slot"
+    return asyncio.run(run_headed(
+        start_date, end_date, slot_key, slot_label,
+        headed=args.headed,
+        slow_mo=args.slow_mo,
+        trace_dir=args.trace,
+        video_dir=args.video,
+        dry_run=args.dry_run,
+        freeze=args.freeze,
+        skip_weekends=args.skip_weekends,
+        delete_weekends=args.delete_weekends,
+    ))
+
+
+async def run_headed(
+    start_date: date,
+    end_date: date,
+    slot_key: str = SLOT_KEY_DEFAULT,
+    slot_label: str = SLOT_LABEL_DEFAULT,
+    **options,
+) -> int:
+    """Backfill [start_date, end_date] with settings from .env; options as for run_backfill. Used by backfill.py."""
     api_base, admin_user, admin_pass, policyden_user, policyden_pass, wegenerate_user, wegenerate_pass = get_env()
     if not api_base or not admin_user or not admin_pass:
         log("Set API_BASE_URL, ADMIN_USERNAME, ADMIN_PASSWORD in .env")
@@ -742,21 +703,20 @@ def main() -> int:
         return 1
     auth_policyden = bot_dir / "auth_policyden.json"
     auth_wegenerate = bot_dir / "auth_wegenerate.json"
-    return asyncio.run(run_backfill(
-        start_date, end_date, slot_key, slot_label, bot_dir,
-        auth_policyden, auth_wegenerate,
-        api_base, admin_user, admin_pass,
-        policyden_user, policyden_pass, wegenerate_user, wegenerate_pass,
-        agent_map,
-        headed=args.headed,
-        slow_mo=args.slow_mo,
-        trace_dir=args.trace,
-        video_dir=args.video,
-        dry_run=args.dry_run,
-        freeze=args.freeze,
-        skip_weekends=args.skip_weekends,
-        delete_weekends=args.delete_weekends,
-    ))
+    # Same lock as backfill.py's headless runs: one backfill at a time, queued behind other browser jobs.
+    async with single_flight(bot_dir, "backfill", join=False) as flight:
+        if flight.skipped:
+            log("Another backfill is running; try again when it finishes.")
+            return 1
+        flight.code = await run_backfill(
+            start_date, end_date, slot_key, slot_label, bot_dir,
+            auth_policyden, auth_wegenerate,
+            api_base, admin_user, admin_pass,
+            policyden_user, policyden_pass, wegenerate_user, wegenerate_pass,
+            agent_map,
+            **options,
+        )
+        return flight.code
 
 
 if __name__ == "__main__":
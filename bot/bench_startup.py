@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the bot entry points: median wall time of a fresh interpreter importing each
+module, minus a bare interpreter, over --runs runs. Exits 1 when a module goes over its budget, so a
+new top-level import that slows every cron tick shows up before it reaches the VPS. CI runs it after the
+bot tests (.github/workflows/ci.yml).
+
+trading_window is the whole cost of a main.py tick outside the scraping window (the fast path).
+Run ./build_pyc.sh first to measure what cron sees on the VPS (bytecode already compiled).
+
+Usage:
+    ./venv/bin/python bench_startup.py
+    ./venv/bin/python bench_startup.py --runs 20
+    ./venv/bin/python bench_startup.py --profile main    # slowest imports of one module (-X importtime)
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Milliseconds on top of a bare interpreter.
+BUDGETS_MS = {
+    "trading_window": 30,
+    "main": 400,
+    "policies_bot": 400,
+    "eod": 600,
+    "scheduler": 700,
+}
+PROFILE_TOP = 15
+
+
+def log(msg: str) -> None:
+    print(msg, flush=True)
+
+
+def time_command(args: list[str], bot_dir: Path, runs: int) -> float:
+    """Median wall time of args in milliseconds."""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(args, cwd=bot_dir, check=True, stdout=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def profile(module: str, bot_dir: Path) -> None:
+    """Print the imports of module with the largest cumulative time."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=bot_dir, check=True, capture_output=True, text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = line.removeprefix("import time:").split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].strip()))
+    for cumulative_us, name in sorted(rows, reverse=True)[:PROFILE_TOP]:
+        log(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure bot module import times against budgets.")
+    parser.add_argument("--runs", type=int, default=10, help="Runs per module (median is reported; default 10)")
+    parser.add_argument("--profile", metavar="MODULE", help="Show the slowest imports of MODULE instead")
+    args = parser.parse_args()
+    bot_dir = Path(__file__).resolve().parent
+
+    if args.profile:
+        profile(args.profile, bot_dir)
+        return 0
+
+    baseline = time_command([sys.executable, "-c", "pass"], bot_dir, args.runs)
+    log(f"Bare interpreter: {baseline:.1f} ms (median of {args.runs})")
+    over = []
+    for module, budget in BUDGETS_MS.items():
+        elapsed = time_command([sys.executable, "-c", f"import {module}"], bot_dir, args.runs) - baseline
+        status = "ok" if elapsed <= budget else "OVER BUDGET"
+        log(f"  {module:<16} {elapsed:7.1f} ms  (budget {budget} ms)  {status}")
+        if elapsed > budget:
+            over.append(module)
+    if over:
+        log(f"Over budget: {', '.join(over)}. Run with --profile MODULE to see which imports grew.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
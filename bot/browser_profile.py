@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Chromium launch settings for the scrapers, and browser memory sampling for each run.
+
+BOT_LOW_MEMORY=1 (for 1 GB hosts) changes how the scrapers run Chromium:
+- Headless runs use the headless shell binary. This is Playwright's default for headless=True
+  since 1.49, the minimum requirements.txt pins; install only that binary with
+  `playwright install --only-shell chromium`.
+- Renderer flags are trimmed: one renderer process, no site-isolation trials, no GPU, no
+  extensions, and no background networking.
+- The V8 heap of each renderer is capped at BOT_JS_HEAP_MB (default 256).
+- Contexts get a smaller viewport, no service workers, and images, media and fonts are not
+  loaded. The scrapers keep one tab per context and close pages as soon as they are read.
+
+Every browser run samples the memory of the processes it starts (the Playwright driver and
+Chromium) and logs the peak and mean. This works on Linux only, via /proc. It counts PSS where
+available, so memory shared between Chromium processes is counted once. Only this run's browser is
+counted: launch_options() tags it with a switch naming the sample, and the sampler adds up that
+Chromium process, its descendants and its driver, so another job's browser is never included.
+"""
+
+import asyncio
+import contextvars
+import os
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator
+
+JS_HEAP_MB_DEFAULT = 256
+LOW_MEMORY_ARGS = [
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--mute-audio",
+    "--no-first-run",
+    "--renderer-process-limit=1",
+    "--disable-site-isolation-trials",
+    "--disable-back-forward-cache",
+]
+LOW_MEMORY_VIEWPORT = {"width": 1280, "height": 720}
+BLOCKED_RESOURCE_TYPES = ("image", "media", "font")
+SAMPLE_SECONDS = 1.0
+PROC = Path("/proc")
+# Unknown to Chromium (ignored); marks the browser process of a sample_browser_memory block.
+SAMPLE_SWITCH = "--vc-bot-sample"
+
+_sample_tag: contextvars.ContextVar[str | None] = contextvars.ContextVar("browser_sample_tag", default=None)
+
+
+def log(msg: str) -> None:
+    print(msg, flush=True)
+
+
+def low_memory() -> bool:
+    return os.environ.get("BOT_LOW_MEMORY", "").strip().lower() in ("1", "true", "yes")
+
+
+def launch_options(headless: bool = True, **options) -> dict:
+    """
+    Keyword arguments for chromium.launch(): options plus the low-memory flags when BOT_LOW_MEMORY is set, and
+    the sample tag inside sample_browser_memory(). Call it inside that block so the browser is measured.
+    """
+    launch = {"headless": headless, **options}
+    if low_memory():
+        try:
+            heap_mb = int(os.environ.get("BOT_JS_HEAP_MB") or JS_HEAP_MB_DEFAULT)
+        except ValueError:
+            heap_mb = JS_HEAP_MB_DEFAULT
+        launch["args"] = [*launch.get("args", []), *LOW_MEMORY_ARGS, f"--js-flags=--max-old-space-size={heap_mb}"]
+    tag = _sample_tag.get()
+    if tag is not None:
+        launch["args"] = [*launch.get("args", []), f"{SAMPLE_SWITCH}={tag}"]
+    return launch
+
+
+def context_options(**options) -> dict:
+    """Keyword arguments for browser.new_context(): options plus a smaller viewport when BOT_LOW_MEMORY is set."""
+    if low_memory():
+        return {"viewport": LOW_MEMORY_VIEWPORT, "service_workers": "block", **options}
+    return options
+
+
+async def trim_context(context) -> None:
+    """With BOT_LOW_MEMORY, don't load images, media or fonts in context (the scrapers only read text)."""
+    if not low_memory():
+        return
+
+    async def block_heavy(route) -> None:
+        if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    await context.route("**/*", block_heavy)
+
+
+def _processes(tag: str) -> tuple[dict[int, list[int]], dict[int, int], list[int]]:
+    """(children by parent pid, parent by pid, pids whose command line carries tag) from one /proc scan."""
+    children: dict[int, list[int]] = {}
+    parents: dict[int, int] = {}
+    tagged: list[int] = []
+    needle = f"{SAMPLE_SWITCH}={tag}".encode()
+    for entry in PROC.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+            cmdline = (entry / "cmdline").read_bytes()
+        except OSError:
+            continue
+        pid = int(entry.name)
+        # The command name may contain spaces and parentheses; the fields after it are fixed.
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        children.setdefault(ppid, []).append(pid)
+        parents[pid] = ppid
+        if needle in cmdline:
+            tagged.append(pid)
+    return children, parents, tagged
+
+
+def _run_pids(tag: str) -> set[int]:
+    """The tagged browser processes (and everything they started) plus their parent, the Playwright driver."""
+    children, parents, tagged = _processes(tag)
+    me = os.getpid()
+    tagged_set = set(tagged)
+    # Chromium's own children may carry the switch too; start from the topmost tagged processes.
+    roots = [pid for pid in tagged if parents.get(pid) not in tagged_set]
+    found: set[int] = set()
+    stack = list(roots)
+    while stack:
+        pid = stack.pop()
+        if pid not in found:
+            found.add(pid)
+            stack.extend(children.get(pid, []))
+    found.update(parents[pid] for pid in roots if parents.get(pid) not in (None, me))
+    return found
+
+
+def _memory_bytes(pid: int) -> int:
+    """PSS of pid (RSS on kernels without smaps_rollup); 0 if it has exited."""
+    try:
+        for line in (PROC / str(pid) / "smaps_rollup").read_text().splitlines():
+            if line.startswith("Pss:"):
+                return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        resident_pages = int((PROC / str(pid) / "statm").read_text().split()[1])
+    except (OSError, IndexError, ValueError):
+        return 0
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+@dataclass
+class BrowserMemory:
+    label: str
+    samples: int = 0
+    peak_mb: float = 0.0
+    total_mb: float = 0.0
+
+    @property
+    def mean_mb(self) -> float:
+        return self.total_mb / self.samples if self.samples else 0.0
+
+
+@asynccontextmanager
+async def sample_browser_memory(label: str) -> AsyncIterator[BrowserMemory]:
+    """
+    Sample the memory of the browser launched inside the block (with launch_options()) every SAMPLE_SECONDS;
+    log peak and mean after.
+    """
+    memory = BrowserMemory(label)
+    if not (PROC / "self").exists():
+        yield memory
+        return
+    tag = uuid.uuid4().hex[:12]
+    token = _sample_tag.set(tag)
+
+    async def sample() -> None:
+        while True:
+            pids = _run_pids(tag)
+            if pids:
+                mb = sum(_memory_bytes(pid) for pid in pids) / (1024 * 1024)
+                memory.samples += 1
+                memory.total_mb += mb
+                memory.peak_mb = max(memory.peak_mb, mb)
+            await asyncio.sleep(SAMPLE_SECONDS)
+
+    task = asyncio.create_task(sample())
+    try:
+        yield memory
+    finally:
+        _sample_tag.reset(token)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        if memory.samples:
+            profile = "low-memory" if low_memory() else "default"
+            log(
+                f"  {label} browser memory: peak {memory.peak_mb:.0f} MB, mean {memory.mean_mb:.0f} MB "
+                f"({memory.samples} samples, {profile} profile)."
+            )
@@ -0,0 +1,16 @@
+#!/usr/bin/env bash
+# Compile the bot and its venv to bytecode ahead of time, so cron runs (python -m main, -m eod, ...)
+# load cached .pyc files instead of compiling on start. Run after each deploy or pip install; a stale
+# .pyc is just recompiled, so forgetting only costs the first run.
+
+set -e
+cd "$(dirname "$0")"
+PY=./venv/bin/python
+if [[ ! -x "$PY" ]]; then
+  PY=python3
+  echo "No venv found; using $PY."
+fi
+
+$PY -m compileall -q -j 0 -x '/(venv|playwright-browsers)/' .
+$PY -m compileall -q -j 0 "$($PY -c 'import sysconfig; print(sysconfig.get_paths()["purelib"])')"
+echo "Bytecode compiled. Check startup with: $PY bench_startup.py"
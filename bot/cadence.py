@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Adaptive scrape cadence for scheduler.py (BOT_CADENCE=adaptive).
+
+Each site's scraped values are compared with its previous scrape: a change drops that site's
+interval to BOT_CADENCE_MIN_MINUTES (default 2), a quiet scrape doubles it up to
+BOT_CADENCE_MAX_MINUTES (default 15). Within BOT_CADENCE_BOUNDARY_MINUTES (default 15) of a slot
+boundary (11:00, 13:00, 15:00, 17:00) the minimum interval applies, and a run is always placed
+BOUNDARY_LEAD_MINUTES before the boundary so the closing slot gets its final numbers. An empty
+scrape (session expired, site down) is not an observation and leaves the interval as it was.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Iterable
+
+SITES = ("policyden", "wegenerate")
+MIN_MINUTES_DEFAULT = 2.0
+MAX_MINUTES_DEFAULT = 15.0
+BOUNDARY_MINUTES_DEFAULT = 15.0
+BOUNDARY_LEAD_MINUTES = 2.0
+BACKOFF_FACTOR = 2.0
+
+
+def log(msg: str) -> None:
+    print(msg, flush=True)
+
+
+@dataclass
+class SiteCadence:
+    interval: float
+    values: Any = None
+    scrapes: int = 0
+    changes: int = 0
+
+
+@dataclass
+class AdaptiveCadence:
+    """Per-site intervals (minutes) from observed changes; next_due() is when the next tick should start."""
+
+    boundaries: Iterable[int]
+    min_minutes: float = MIN_MINUTES_DEFAULT
+    max_minutes: float = MAX_MINUTES_DEFAULT
+    boundary_minutes: float = BOUNDARY_MINUTES_DEFAULT
+    sites: dict[str, SiteCadence] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self.boundaries = sorted(self.boundaries)
+        for site in SITES:
+            self.sites.setdefault(site, SiteCadence(self.min_minutes))
+
+    def observe(self, site: str, values: Any) -> None:
+        """Record one scrape of site. The first scrape counts as a change (nothing to compare yet)."""
+        s = self.sites[site]
+        changed = s.values is None or values != s.values
+        s.values = values
+        s.scrapes += 1
+        if changed:
+            s.changes += 1
+            s.interval = self.min_minutes
+        else:
+            s.interval = min(self.max_minutes, s.interval * BACKOFF_FACTOR)
+        log(
+            f"  Cadence {site}: {'changed' if changed else 'quiet'}, next in {s.interval:g} min "
+            f"({s.changes}/{s.scrapes} scrapes changed)."
+        )
+
+    def interval(self, site: str) -> float:
+        return self.sites[site].interval
+
+    def next_due(self, now: datetime, sites: Iterable[str] = SITES) -> datetime:
+        """Next run time for sites: the soonest site interval, tightened ahead of the next slot boundary."""
+        minutes = min(self.sites[site].interval for site in sites)
+        due = now + timedelta(minutes=minutes)
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        for minute_of_day in self.boundaries:
+            boundary = midnight + timedelta(minutes=minute_of_day)
+            final_run = boundary - timedelta(minutes=BOUNDARY_LEAD_MINUTES)
+            if final_run <= now:
+                continue
+            window_start = boundary - timedelta(minutes=self.boundary_minutes)
+            if now >= window_start:
+                due = min(due, now + timedelta(minutes=self.min_minutes))
+            else:
+                due = min(due, window_start)
+            due = min(due, final_run)
+            break
+        # Start on a whole minute, like the fixed cadence.
+        whole = due.replace(second=0, microsecond=0)
+        return whole if whole == due else whole + timedelta(minutes=1)
+
@@ -5,7 +5,9 @@ EOD script: run intra-day bot then freeze today's snapshots, or backfill/set-mar
 Cron (9:15 PM EST Mon–Fri; set CRON_TZ=America/New_York):
   15 21 * * 1-5 cd /home/ubuntu/bot && ./venv/bin/python eod.py >> /home/ubuntu/bot/freeze.log 2>&1
 
-With no arguments, runs main.py (with one retry on failure) then freezes today's snapshots into perf_history.
+With no arguments, runs main.py's tick in-process (with one retry on failure), then freezes today's
+snapshots into perf_history from the state that tick loaded and wrote (one login, no second state
+download).
 
 Backfill a past date (from existing snapshots):
   ./venv/bin/python eod.py --date 2025-03-02
@@ -16,29 +18,54 @@ Backfill all past dates that have snapshots but no perf_history:
 Backfill a date range (START and END inclusive, YYYY-MM-DD):
   ./venv/bin/python eod.py --backfill-range 2025-03-01 2025-03-07
 
+Backfills are written in chunks of --chunk-size dates (default 30), each chunk one batch. After each
+chunk a checkpoint is saved to .eod_backfill_checkpoint.json; after a failure, rerun the same command
+with --resume to continue after the last written chunk.
+
 Set EOD marketing total for a date by scaling existing perf_history (corrective):
   ./venv/bin/python eod.py --set-marketing [--date YYYY-MM-DD] [--amount 4354]
 
+Correct many dates at once from a CSV of `date,amount` lines (optional header); state is read once and
+every date is rescaled and written in one batch, with a before/after line per date:
+  ./venv/bin/python eod.py --set-marketing-file corrections.csv
+
 Uses same .env as main.py: API_BASE_URL, ADMIN_USERNAME, ADMIN_PASSWORD.
 """
 
 import argparse
+import asyncio
+import csv
+import json
 import os
-import subprocess
 import sys
 import time
 import uuid
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from typing import Awaitable, Callable
 from zoneinfo import ZoneInfo
 
-import requests
+import numpy as np
 from dotenv import load_dotenv
 
-from http_retry import request_with_retries
+from api_client import (
+    api_get_state,
+    api_login,
+    api_batch_rows,
+    api_batch_update,
+    batch_replace_dates,
+    batch_upsert_house_marketing,
+    create_api_client,
+)
+from metrics import COST_PER_CALL, frozen_metrics, rescale_marketing, to_optional, totals_by_date
+from run_lock import single_flight
+from run_log import emit, finish, log_phase, run_context
 
 ZONE = "America/New_York"
 SLOT_ORDER = ("17:00", "15:00", "13:00", "11:00")
+SLOT_PRIORITY = {k: i for i, k in enumerate(SLOT_ORDER)}
+BACKFILL_CHUNK_DAYS = 30
+CHECKPOINT_FILE = ".eod_backfill_checkpoint.json"
 
 
 def log(msg: str) -> None:
@@ -49,175 +76,357 @@ def get_date_key_est() -> str:
     return datetime.now(ZoneInfo(ZONE)).strftime("%Y-%m-%d")
 
 
-def compute_metrics(calls: int, sales: int, marketing: float | None = None) -> dict:
-    if marketing is None:
-        marketing = calls * 15
-    cpa = (marketing / sales) if sales > 0 else None
-    cvr = (sales / calls) if calls > 0 else None
-    return {"marketing": marketing, "cpa": cpa, "cvr": cvr}
+def frozen_date_operations(frozen_by_date: dict[str, list], skip_existing: bool = False) -> list[dict]:
+    """
+    Batch operations replacing the perf_history rows of the dates in frozen_by_date with the frozen rows
+    (server-side, so only those dates travel) and setting house marketing to each date's frozen total.
+    With skip_existing, dates another run has frozen meanwhile keep their rows and their house marketing
+    (the server makes both decisions together, inside the replaceDates operation).
+    """
+    frozen_rows = [row for rows in frozen_by_date.values() for row in rows]
+    totals = totals_by_date([r["dateKey"] for r in frozen_rows], [r["marketing"] for r in frozen_rows])
+    return [batch_replace_dates("perfHistory", frozen_by_date, skip_existing, totals)]
+
+
+async def run_main_then_retry(
+    client,
+    bot_dir: Path,
+    load_state: Callable[[], Awaitable[dict | None]] | None = None,
+) -> dict | None:
+    """
+    Run main.py's scrape-and-push tick in this process on the logged-in client; on failure wait 60s and run
+    once more (do not raise). load_state defaults to GET /state for agents and snapshots.
+    Returns the agents/snapshots state the tick left on the server, or None.
+    """
+    # Imported here so backfill-only callers (backfill_headed.py) don't load main.py and its scrapers.
+    from main import run_tick
+
+    if load_state is None:
+        load_state = lambda: api_get_state(client, ("agents", "snapshots"))
+    for attempt in range(2):
+        log("EOD: running main tick..." if attempt == 0 else "EOD: running main tick (retry)...")
+        try:
+            returncode, state = await run_tick(client, bot_dir, load_state)
+        except Exception as e:
+            log(f"  main tick failed: {e!r}")
+            returncode, state = 1, None
+        if returncode == 0 or attempt == 1:
+            return state
+        log(f"  main tick exited {returncode}; retrying once in 60s...")
+        await asyncio.sleep(60)
+    return None
+
+
+def index_snapshots(snapshots: list, slot_priority: dict) -> dict[str, dict[str, dict]]:
+    """
+    One pass over snapshots: {dateKey: {agentId: snapshot to freeze}}. The 17:00 snapshot wins,
+    otherwise the one with the highest slot_priority (the first seen on ties, as max() would pick).
+    """
+    index: dict[str, dict[str, dict]] = {}
+    ranks: dict[tuple[str, str], tuple[bool, int]] = {}
+    for s in snapshots:
+        date_key, agent_id = s.get("dateKey"), s.get("agentId")
+        if not date_key or not agent_id:
+            continue
+        slot = s.get("slot", "")
+        rank = (slot == "17:00", slot_priority.get(slot, -1))
+        key = (date_key, agent_id)
+        if key not in ranks or rank > ranks[key]:
+            ranks[key] = rank
+            index.setdefault(date_key, {})[agent_id] = s
+    return index
 
 
-def api_login(session: requests.Session, base_url: str, username: str, password: str) -> bool:
-    r = request_with_retries(
-        session,
-        "post",
-        f"{base_url.rstrip('/')}/auth/login",
-        json={"username": username, "password": password},
-        timeout=15,
-        log_fn=log,
-    )
-    if r.status_code != 200:
-        log(f"  Login failed: {r.status_code} {r.text[:200]}")
-        return False
-    return True
-
-
-def api_get_state(session: requests.Session, base_url: str) -> dict | None:
-    r = request_with_retries(
-        session,
-        "get",
-        f"{base_url.rstrip('/')}/state",
-        timeout=60,
-        headers={"Cache-Control": "no-cache", "Pragma": "no-cache"},
-        log_fn=log,
-    )
-    if r.status_code != 200:
-        log(f"  GET /state failed: {r.status_code}")
-        return None
-    data = r.json()
-    return data.get("data") if isinstance(data, dict) else data
-
-
-def api_put_perf_history(session: requests.Session, base_url: str, perf_history: list) -> bool:
-    r = request_with_retries(
-        session,
-        "put",
-        f"{base_url.rstrip('/')}/state/perfHistory",
-        json=perf_history,
-        timeout=15,
-        log_fn=log,
-    )
-    if r.status_code != 200:
-        log(f"  PUT /state/perfHistory failed: {r.status_code} {r.text[:200]}")
-        return False
-    return True
-
-
-def api_set_house_marketing(session: requests.Session, base_url: str, date_key: str, amount: float) -> bool:
-    r = request_with_retries(
-        session,
-        "post",
-        f"{base_url.rstrip('/')}/state/house-marketing",
-        json={"dateKey": date_key, "amount": round(amount, 2)},
-        timeout=10,
-        log_fn=log,
-    )
-    if r.status_code != 200:
-        log(f"  POST /state/house-marketing failed: {r.status_code} {r.text[:200]}")
-        return False
-    return True
-
-
-def run_main_then_retry(bot_dir: Path) -> None:
-    """Run main.py; on non-zero exit, wait 60s and run once more (do not raise)."""
-    main_py = bot_dir / "main.py"
-    if not main_py.exists():
-        log("  main.py not found; skipping scrape step.")
-        return
-    log("EOD: running main.py...")
-    result = subprocess.run([sys.executable, str(main_py)], cwd=str(bot_dir))
-    if result.returncode != 0:
-        log(f"  main.py exited {result.returncode}; retrying once in 60s...")
-        time.sleep(60)
-        subprocess.run([sys.executable, str(main_py)], cwd=str(bot_dir))
-
-
-def freeze_date(
-    date_key: str,
+def freeze_dates(
+    date_keys: list[str],
     agents: list,
     active_ids: set,
-    snapshots: list,
-    slot_priority: dict,
-) -> list:
-    """Build frozen perf_history rows for one date from snapshots. Does not mutate state."""
-    today_snapshots = [s for s in snapshots if s.get("dateKey") == date_key]
-    frozen_rows = []
-    for agent in agents:
-        if agent["id"] not in active_ids:
-            continue
-        agent_id = agent["id"]
-        agent_snaps = [s for s in today_snapshots if s.get("agentId") == agent_id]
-        exact_17 = next((s for s in agent_snaps if s.get("slot") == "17:00"), None)
-        source = exact_17
-        if not source and agent_snaps:
-            source = max(
-                agent_snaps,
-                key=lambda s: slot_priority.get(s.get("slot", ""), -1),
-            )
-        if not source:
-            continue
-        calls = source.get("billableCalls", 0) or 0
-        sales = source.get("sales", 0) or 0
-        raw_marketing = source.get("marketing")
-        marketing_val = float(raw_marketing) if isinstance(raw_marketing, (int, float)) else None
-        m = compute_metrics(calls, sales, marketing_val)
-        frozen_rows.append({
+    snapshot_index: dict[str, dict[str, dict]],
+) -> dict[str, list]:
+    """Build frozen perf_history rows per date from index_snapshots(); dates with nothing to freeze are left out."""
+    frozen_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    active_agent_ids = [a["id"] for a in agents if a["id"] in active_ids]
+    picked: list[tuple[str, str]] = []
+    calls: list = []
+    sales: list = []
+    raw_marketing: list[float] = []
+    for date_key in date_keys:
+        by_agent = snapshot_index.get(date_key) or {}
+        for agent_id in active_agent_ids:
+            source = by_agent.get(agent_id)
+            if not source:
+                continue
+            picked.append((date_key, agent_id))
+            calls.append(source.get("billableCalls", 0) or 0)
+            sales.append(source.get("sales", 0) or 0)
+            m = source.get("marketing")
+            raw_marketing.append(float(m) if isinstance(m, (int, float)) else np.nan)
+    # All dates in one pass over NumPy columns.
+    marketing, cpa, cvr = frozen_metrics(calls, sales, raw_marketing)
+    defaulted = np.isnan(np.asarray(raw_marketing, dtype=np.float64)).tolist()
+    frozen_by_date: dict[str, list] = {}
+    for (date_key, agent_id), row_calls, row_sales, default, m, row_cpa, row_cvr in zip(
+        picked, calls, sales, defaulted, marketing.tolist(), to_optional(cpa), to_optional(cvr)
+    ):
+        frozen_by_date.setdefault(date_key, []).append({
             "id": f"perf_{uuid.uuid4()}",
             "dateKey": date_key,
             "agentId": agent_id,
-            "billableCalls": calls,
-            "sales": sales,
-            "marketing": m["marketing"],
-            "cpa": m["cpa"],
-            "cvr": m["cvr"],
-            "frozenAt": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "billableCalls": row_calls,
+            "sales": row_sales,
+            # Keep the call-based fallback an int, as JSON has always carried it.
+            "marketing": row_calls * COST_PER_CALL if default else m,
+            "cpa": row_cpa,
+            "cvr": row_cvr,
+            "frozenAt": frozen_at,
         })
-    return frozen_rows
+    return frozen_by_date
 
 
-def cmd_set_marketing(
-    session: requests.Session,
-    api_base: str,
-    date_key: str,
-    amount: float,
+def load_checkpoint(path: Path) -> dict:
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def save_checkpoint(path: Path, backfill: str, completed_through: str) -> None:
+    try:
+        path.write_text(json.dumps({"backfill": backfill, "completedThrough": completed_through}))
+    except OSError as e:
+        log(f"  Could not save checkpoint {path.name}: {e}")
+
+
+async def run_backfill(
+    client,
+    backfill: str,
+    dates: list[str],
+    agents: list,
+    active_ids: set,
+    snapshot_index: dict[str, dict[str, dict]],
+    checkpoint_path: Path,
+    chunk_size: int,
+    resume: bool,
 ) -> int:
-    """Scale perf_history marketing for date_key to target amount; update house marketing. Returns exit code."""
-    state = api_get_state(session, api_base)
-    if not state:
-        return 1
-    perf_history = list(state.get("perfHistory") or [])
-    rows = [row for row in perf_history if row.get("dateKey") == date_key]
+    """
+    Freeze dates (sorted) and write them chunk_size dates per batch, checkpointing after each chunk.
+    backfill identifies the run (e.g. "all", "range 2025-03-01 2025-03-07") so --resume only continues
+    the same backfill. Returns exit code.
+    """
+    if resume:
+        checkpoint = load_checkpoint(checkpoint_path)
+        if checkpoint.get("backfill") == backfill and checkpoint.get("completedThrough"):
+            done_through = checkpoint["completedThrough"]
+            dates = [d for d in dates if d > done_through]
+            log(f"Resuming {backfill} backfill after {done_through}; {len(dates)} dates left.")
+        else:
+            log(f"No checkpoint for the {backfill} backfill; starting from the first date.")
+    if not dates:
+        checkpoint_path.unlink(missing_ok=True)
+        log("Nothing left to backfill.")
+        return 0
+
+    chunks = [dates[i:i + chunk_size] for i in range(0, len(dates), chunk_size)]
+    log(f"Backfilling {len(dates)} dates: {dates[0]} .. {dates[-1]} in {len(chunks)} chunk(s) of up to {chunk_size}.")
+    started = time.monotonic()
+    done = 0
+    rows_stored = 0
+    for n, chunk in enumerate(chunks, 1):
+        chunk_started = time.monotonic()
+        frozen_by_date = freeze_dates(chunk, agents, active_ids, snapshot_index)
+        for date_key in chunk:
+            frozen_rows = frozen_by_date.get(date_key)
+            if not frozen_rows:
+                log(f"  {date_key}: no snapshots for active agents, skip")
+                continue
+            total_marketing = sum(r["marketing"] for r in frozen_rows)
+            log(f"  {date_key}: froze {len(frozen_rows)} rows, marketing=${total_marketing:,.2f}")
+        if frozen_by_date:
+            # Dates frozen by another run meanwhile keep their rows.
+            stored = await api_batch_rows(client, frozen_date_operations(frozen_by_date, skip_existing=True))
+            if stored is None:
+                log(f"Chunk {n}/{len(chunks)} ({chunk[0]} .. {chunk[-1]}) failed; rerun with --resume to continue from it.")
+                emit(
+                    "chunk", outcome="failed", dates=len(chunk), first=chunk[0], last=chunk[-1],
+                    duration_ms=round((time.monotonic() - chunk_started) * 1000),
+                )
+                return 1
+            rows_stored += len(stored.get("perfHistory") or [])
+        save_checkpoint(checkpoint_path, backfill, chunk[-1])
+        done += len(chunk)
+        elapsed = time.monotonic() - started
+        emit(
+            "chunk", outcome="ok", dates=len(chunk), first=chunk[0], last=chunk[-1],
+            rows=sum(len(rows) for rows in frozen_by_date.values()),
+            duration_ms=round((time.monotonic() - chunk_started) * 1000),
+        )
+        log(
+            f"Chunk {n}/{len(chunks)} ({chunk[0]} .. {chunk[-1]}) written in {time.monotonic() - chunk_started:.1f}s; "
+            f"{done}/{len(dates)} dates, {done / elapsed if elapsed > 0 else 0:.1f} dates/s."
+        )
+    checkpoint_path.unlink(missing_ok=True)
+    log(f"Backfill complete: {len(dates)} dates, {rows_stored} perf_history rows stored in {time.monotonic() - started:.1f}s.")
+    return 0
+
+
+async def freeze_range(
+    client,
+    start_key: str,
+    end_key: str,
+    checkpoint_path: Path,
+    chunk_size: int = BACKFILL_CHUNK_DAYS,
+    resume: bool = False,
+    state: dict[str, list] | None = None,
+) -> int:
+    """
+    Backfill perf_history for dates in [start_key, end_key] that have snapshots but no perf_history.
+    state: agents / snapshots / perfHistory the caller already holds (e.g. a scraping backfill's merged
+    snapshots); only the missing keys are fetched. Returns exit code.
+    """
+    state = dict(state or {})
+    missing = tuple(key for key in ("agents", "snapshots", "perfHistory") if state.get(key) is None)
+    if missing:
+        fetched = await api_get_state(client, missing)
+        if not fetched:
+            return 1
+        state.update(fetched)
+    agents = state.get("agents") or []
+    active_ids = {a["id"] for a in agents if a.get("active")}
+    snapshot_index = index_snapshots(state.get("snapshots") or [], SLOT_PRIORITY)
+    frozen_dates = {p.get("dateKey") for p in state.get("perfHistory") or []}
+    dates_to_backfill = sorted(d for d in snapshot_index if start_key <= d <= end_key and d not in frozen_dates)
+    if not dates_to_backfill:
+        log(f"No dates in [{start_key}, {end_key}] with snapshots missing perf_history.")
+        return 0
+    return await run_backfill(
+        client, f"range {start_key} {end_key}", dates_to_backfill, agents, active_ids, snapshot_index,
+        checkpoint_path, chunk_size, resume,
+    )
+
+
+def load_marketing_corrections(path: Path) -> dict[str, float] | None:
+    """{dateKey: amount} from a `date,amount` CSV (header and blank lines allowed). None if any line is invalid."""
+    targets: dict[str, float] = {}
+    try:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            lines = list(csv.reader(f))
+    except OSError as e:
+        log(f"Could not read {path}: {e}")
+        return None
+    for line_no, fields in enumerate(lines, start=1):
+        fields = [field.strip() for field in fields]
+        if not any(fields):
+            continue
+        if line_no == 1 and fields[0].lower() == "date":
+            continue
+        if len(fields) != 2:
+            log(f"{path}:{line_no}: expected date,amount")
+            return None
+        date_key, amount_text = fields
+        try:
+            datetime.strptime(date_key, "%Y-%m-%d")
+            amount = float(amount_text.replace("$", "").replace(",", ""))
+        except ValueError:
+            log(f"{path}:{line_no}: invalid date or amount: {','.join(fields)}")
+            return None
+        if amount <= 0:
+            log(f"{path}:{line_no}: amount must be positive.")
+            return None
+        if date_key in targets:
+            log(f"{path}:{line_no}: {date_key} listed again; using the later amount.")
+        targets[date_key] = amount
+    if not targets:
+        log(f"{path}: no corrections found.")
+        return None
+    return targets
+
+
+def rescale_dates(
+    perf_history: list,
+    targets: dict[str, float],
+) -> tuple[dict[str, list], dict[str, tuple[float, float]]]:
+    """
+    Scale perf_history marketing (and CPA) of every target date so the date sums to its amount, all dates in one pass.
+    Returns (rescaled rows by date, {dateKey: (sum before, sum after)}); dates with no rows or a zero sum are left out.
+    """
+    rows = [row for row in perf_history if row.get("dateKey") in targets]
     if not rows:
-        log(f"No perf_history rows for {date_key}. Run EOD freeze for that date first.")
-        return 1
-    current_sum = sum(float(row.get("marketing", 0) or 0) for row in rows)
-    if current_sum <= 0:
-        log(f"Current marketing sum for {date_key} is 0; cannot scale.")
-        return 1
-    scale = amount / current_sum
-    for row in rows:
-        m = float(row.get("marketing", 0) or 0) * scale
-        row["marketing"] = round(m, 2)
-        sales = float(row.get("sales", 0) or 0)
-        row["cpa"] = round(row["marketing"] / sales, 4) if sales > 0 else None
-    if not api_put_perf_history(session, api_base, perf_history):
+        return {}, {}
+    before = totals_by_date(
+        [row["dateKey"] for row in rows],
+        [float(row.get("marketing", 0) or 0) for row in rows],
+    )
+    rows = [row for row in rows if before[row["dateKey"]] > 0]
+    if not rows:
+        return {}, {}
+    date_keys = [row["dateKey"] for row in rows]
+    marketing, cpa = rescale_marketing(
+        [float(row.get("marketing", 0) or 0) for row in rows],
+        [float(row.get("sales", 0) or 0) for row in rows],
+        np.array([targets[d] / before[d] for d in date_keys]),
+    )
+    rows_by_date: dict[str, list] = {}
+    for row, m, row_cpa in zip(rows, marketing.tolist(), to_optional(cpa)):
+        row["marketing"] = m
+        row["cpa"] = row_cpa
+        rows_by_date.setdefault(row["dateKey"], []).append(row)
+    after = totals_by_date(date_keys, marketing)
+    return rows_by_date, {d: (before[d], after[d]) for d in rows_by_date}
+
+
+async def cmd_set_marketing(
+    client,
+    targets: dict[str, float],
+) -> int:
+    """
+    Scale perf_history marketing of each date to its target amount and update house marketing, every date in
+    one batch. Logs before/after per date. Returns exit code (1 if any date could not be scaled).
+    """
+    summary: dict[str, tuple[float, float]] = {}
+
+    def scale_marketing(current: dict[str, list]) -> list[dict] | None:
+        nonlocal summary
+        rows_by_date, summary = rescale_dates(current["perfHistory"], targets)
+        with_rows = {row.get("dateKey") for row in current["perfHistory"]}
+        for date_key in targets:
+            if date_key not in with_rows:
+                log(f"No perf_history rows for {date_key}. Run EOD freeze for that date first.")
+            elif date_key not in summary:
+                log(f"Current marketing sum for {date_key} is 0; cannot scale.")
+        if not rows_by_date:
+            return None
+        return [
+            batch_replace_dates("perfHistory", rows_by_date),
+            batch_upsert_house_marketing({date_key: after for date_key, (_, after) in summary.items()}),
+        ]
+
+    # Fetches perfHistory once with its version; re-scales the fresh copy if another writer got in first.
+    if not await api_batch_update(client, ("perfHistory",), scale_marketing) or not summary:
         return 1
-    new_sum = sum(row["marketing"] for row in rows)
-    if not api_set_house_marketing(session, api_base, date_key, new_sum):
-        log("  Failed to set house marketing.")
+    for date_key, (before, after) in summary.items():
+        log(f"Set EOD marketing for {date_key}: ${before:,.2f} -> ${after:,.2f} (target ${targets[date_key]:,.2f}).")
+    if len(summary) < len(targets):
+        log(f"Rescaled {len(summary)} of {len(targets)} dates; the rest were skipped (see above).")
         return 1
-    log(f"Set EOD marketing for {date_key} to ${new_sum:,.2f} (target ${amount:,.2f}).")
     return 0
 
 
 def main() -> int:
+    return asyncio.run(main_async())
+
+
+async def main_async() -> int:
     load_dotenv()
     parser = argparse.ArgumentParser(description="EOD: run main then freeze today, or backfill/set-marketing.")
     parser.add_argument("--date", default=None, help="Backfill date YYYY-MM-DD (default: today when not set-marketing; skips time check)")
     parser.add_argument("--backfill-all", action="store_true", help="Backfill all past dates that have snapshots but no perf_history")
     parser.add_argument("--backfill-range", nargs=2, metavar=("START", "END"), default=None, help="Backfill date range START END (YYYY-MM-DD inclusive)")
     parser.add_argument("--set-marketing", action="store_true", help="Scale perf_history marketing for a date to target amount (corrective)")
+    parser.add_argument("--set-marketing-file", metavar="CSV", default=None, help="Scale perf_history marketing for every date,amount line in CSV (one batch)")
     parser.add_argument("--amount", type=float, default=4354.0, help="Target marketing total for --set-marketing (default: 4354)")
+    parser.add_argument("--chunk-size", type=int, default=BACKFILL_CHUNK_DAYS, help=f"Dates per batch for backfills (default: {BACKFILL_CHUNK_DAYS})")
+    parser.add_argument("--resume", action="store_true", help="Continue a failed backfill after its last checkpointed chunk")
     args = parser.parse_args()
 
     api_base = os.environ.get("API_BASE_URL", "").strip()
@@ -234,10 +443,24 @@ def main() -> int:
 
     bot_dir = Path(__file__).resolve().parent
     set_marketing = args.set_marketing
+    set_marketing_file = args.set_marketing_file
     backfill_all = args.backfill_all
     backfill_range = args.backfill_range
     single_date = args.date.strip() if args.date else None
 
+    if set_marketing_file:
+        if set_marketing or backfill_all or backfill_range or single_date:
+            log("Do not use --date, --backfill-all, --backfill-range, or --set-marketing with --set-marketing-file.")
+            return 1
+        targets = load_marketing_corrections(Path(set_marketing_file))
+        if targets is None:
+            return 1
+        async with create_api_client(api_base) as client:
+            if not await api_login(client, admin_user, admin_pass):
+                return 1
+            with run_context("set-marketing") as run:
+                return finish(run, await cmd_set_marketing(client, targets))
+
     if set_marketing:
         if backfill_all or backfill_range or single_date:
             log("Do not use --date, --backfill-all, or --backfill-range with --set-marketing.")
@@ -249,126 +472,155 @@ def main() -> int:
         if amount <= 0:
             log("Amount must be positive.")
             return 1
-        session = requests.Session()
-        session.headers["Content-Type"] = "application/json"
-        if not api_login(session, api_base, admin_user, admin_pass):
-            return 1
-        return cmd_set_marketing(session, api_base, date_key, amount)
+        async with create_api_client(api_base) as client:
+            if not await api_login(client, admin_user, admin_pass):
+                return 1
+            with run_context("set-marketing") as run:
+                return finish(run, await cmd_set_marketing(client, {date_key: amount}))
 
     if sum([bool(backfill_all), bool(backfill_range), bool(single_date)]) > 1:
         log("Use only one of: --date, --backfill-all, --backfill-range")
         return 1
+    if args.resume and not (backfill_all or backfill_range):
+        log("--resume only applies to --backfill-all and --backfill-range.")
+        return 1
+    chunk_size = args.chunk_size
+    if chunk_size < 1:
+        log("--chunk-size must be at least 1.")
+        return 1
+    checkpoint_path = bot_dir / CHECKPOINT_FILE
+    if backfill_range:
+        start_key, end_key = backfill_range[0].strip(), backfill_range[1].strip()
+        if start_key > end_key:
+            log("--backfill-range START must be <= END")
+            return 1
 
-    session = requests.Session()
-    session.headers["Content-Type"] = "application/json"
+    async with create_api_client(api_base) as client:
+        if not await api_login(client, admin_user, admin_pass):
+            return 1
 
-    if not api_login(session, api_base, admin_user, admin_pass):
-        return 1
-    state = api_get_state(session, api_base)
+        if not backfill_all and not backfill_range and not single_date:
+            return await run_eod(client, bot_dir)
+        with run_context("freeze-backfill") as run:
+            code = await freeze_backfill(
+                client, backfill_all, (start_key, end_key) if backfill_range else None, single_date,
+                checkpoint_path, chunk_size, args.resume,
+            )
+            return finish(run, code)
+
+
+async def freeze_backfill(
+    client,
+    backfill_all: bool,
+    backfill_range: tuple[str, str] | None,
+    single_date: str | None,
+    checkpoint_path: Path,
+    chunk_size: int,
+    resume: bool,
+) -> int:
+    """--backfill-range, --backfill-all or --date on a logged-in client. Returns exit code."""
+    if backfill_range:
+        return await freeze_range(client, *backfill_range, checkpoint_path, chunk_size, resume)
+    # perf_history is only needed to find the dates a backfill is missing; freezes write by date.
+    keys = ("agents", "snapshots", "perfHistory") if backfill_all else ("agents", "snapshots")
+    state = await api_get_state(client, keys)
     if not state:
         return 1
-
     agents = state.get("agents") or []
     active_ids = {a["id"] for a in agents if a.get("active")}
-    snapshots = state.get("snapshots") or []
-    perf_history = list(state.get("perfHistory") or [])
-    slot_priority = {k: i for i, k in enumerate(SLOT_ORDER)}
-    today_key = get_date_key_est()
+    # Index once so every date is frozen from lookups instead of rescanning the full history.
+    snapshot_index = index_snapshots(state.get("snapshots") or [], SLOT_PRIORITY)
 
     if backfill_all:
-        snapshot_dates = sorted(set(s.get("dateKey") for s in snapshots if s.get("dateKey")))
-        dates_to_backfill = [
-            d for d in snapshot_dates
-            if d < today_key and not any(p.get("dateKey") == d for p in perf_history)
-        ]
+        today_key = get_date_key_est()
+        frozen_dates = {p.get("dateKey") for p in state.get("perfHistory") or []}
+        dates_to_backfill = sorted(d for d in snapshot_index if d < today_key and d not in frozen_dates)
         if not dates_to_backfill:
             log("No past dates with snapshots missing perf_history.")
             return 0
-        log(f"Backfilling {len(dates_to_backfill)} dates: {dates_to_backfill[0]} .. {dates_to_backfill[-1]}")
-        for date_key in dates_to_backfill:
-            frozen_rows = freeze_date(date_key, agents, active_ids, snapshots, slot_priority)
-            if not frozen_rows:
-                log(f"  {date_key}: no snapshots for active agents, skip")
-                continue
-            perf_history = [p for p in perf_history if p.get("dateKey") != date_key] + frozen_rows
-            total_marketing = sum(r["marketing"] for r in frozen_rows)
-            log(f"  {date_key}: froze {len(frozen_rows)} rows, marketing=${total_marketing:,.2f}")
-            if not api_set_house_marketing(session, api_base, date_key, total_marketing):
-                log(f"    Failed to set house marketing for {date_key}")
-        if api_put_perf_history(session, api_base, perf_history):
-            log("Backfill complete.")
-            return 0
-        log("PUT perfHistory failed after backfill.")
-        return 1
+        return await run_backfill(
+            client, "all", dates_to_backfill, agents, active_ids, snapshot_index,
+            checkpoint_path, chunk_size, resume,
+        )
+
+    log(f"Backfilling perf_history for {single_date}.")
+    return await freeze_date(client, single_date, agents, active_ids, snapshot_index, replace=True)
 
-    if backfill_range:
-        start_key, end_key = backfill_range[0].strip(), backfill_range[1].strip()
-        if start_key > end_key:
-            log("--backfill-range START must be <= END")
-            return 1
-        snapshot_dates = sorted(set(s.get("dateKey") for s in snapshots if s.get("dateKey")))
-        dates_to_backfill = [
-            d for d in snapshot_dates
-            if start_key <= d <= end_key and not any(p.get("dateKey") == d for p in perf_history)
-        ]
-        if not dates_to_backfill:
-            log(f"No dates in [{start_key}, {end_key}] with snapshots missing perf_history.")
-            return 0
-        log(f"Backfilling {len(dates_to_backfill)} dates in range.")
-        for date_key in dates_to_backfill:
-            frozen_rows = freeze_date(date_key, agents, active_ids, snapshots, slot_priority)
-            if not frozen_rows:
-                continue
-            perf_history = [p for p in perf_history if p.get("dateKey") != date_key] + frozen_rows
-            total_marketing = sum(r["marketing"] for r in frozen_rows)
-            if not api_set_house_marketing(session, api_base, date_key, total_marketing):
-                log(f"  Failed house marketing for {date_key}")
-        if api_put_perf_history(session, api_base, perf_history):
-            log("Backfill range complete.")
-            return 0
-        return 1
 
-    # Today's EOD: run main.py first, then freeze today
-    backfill_date = single_date
-    if backfill_date:
-        date_key = backfill_date
-        log(f"Backfilling perf_history for {date_key}.")
-    else:
-        run_main_then_retry(bot_dir)
-        state = api_get_state(session, api_base)
+async def run_eod(
+    client,
+    bot_dir: Path,
+    load_state: Callable[[], Awaitable[dict | None]] | None = None,
+) -> int:
+    """
+    Today's EOD on a logged-in client: run main's tick in this process, then freeze today from the agents and
+    snapshots it just loaded and wrote instead of downloading them again. load_state as for run_main_then_retry
+    (scheduler.py passes its state cache). A second EOD started meanwhile joins this one (run_lock.py).
+    Returns exit code.
+    """
+    async with single_flight(bot_dir, "eod", browser=False) as flight:
+        if flight.joined is not None:
+            return flight.joined
+        flight.code = await _run_eod(client, bot_dir, load_state)
+        return flight.code
+
+
+async def _run_eod(
+    client,
+    bot_dir: Path,
+    load_state: Callable[[], Awaitable[dict | None]] | None,
+) -> int:
+    state = await run_main_then_retry(client, bot_dir, load_state)
+    if state is None:
+        state = await api_get_state(client, ("agents", "snapshots"))
         if not state:
             return 1
-        snapshots = state.get("snapshots") or []
-        perf_history = list(state.get("perfHistory") or [])
-        now = datetime.now(ZoneInfo(ZONE))
-        if now.hour < 21 or (now.hour == 21 and now.minute < 15):
-            log("Before 9:15 PM EST; skipping freeze (run at 9:15 PM or later).")
-            return 0
-        date_key = today_key
-
-    if not backfill_date and any(p.get("dateKey") == date_key for p in perf_history):
-        log(f"perfHistory already has rows for {date_key}; skipping.")
+    now = datetime.now(ZoneInfo(ZONE))
+    if now.hour < 21 or (now.hour == 21 and now.minute < 15):
+        log("Before 9:15 PM EST; skipping freeze (run at 9:15 PM or later).")
         return 0
+    agents = state.get("agents") or []
+    active_ids = {a["id"] for a in agents if a.get("active")}
+    snapshot_index = index_snapshots(state.get("snapshots") or [], SLOT_PRIORITY)
+    return await freeze_date(client, get_date_key_est(), agents, active_ids, snapshot_index, replace=False)
 
-    if backfill_date:
-        perf_history = [p for p in perf_history if p.get("dateKey") != date_key]
-
-    frozen_rows = freeze_date(date_key, agents, active_ids, snapshots, slot_priority)
 
-    if not frozen_rows:
-        log(f"No snapshots to freeze for {date_key} (no data for active agents).")
-        return 0
+async def freeze_date(
+    client,
+    date_key: str,
+    agents: list,
+    active_ids: set,
+    snapshot_index: dict[str, dict[str, dict]],
+    replace: bool,
+) -> int:
+    """Freeze date_key into perf_history with its house marketing. Without replace, existing rows are kept."""
+    with log_phase("freeze") as record:
+        record["date"] = date_key
+        frozen_rows = freeze_dates([date_key], agents, active_ids, snapshot_index).get(date_key)
+
+        if not frozen_rows:
+            log(f"No snapshots to freeze for {date_key} (no data for active agents).")
+            record.update(outcome="empty", rows=0)
+            return 0
 
-    merged = perf_history + frozen_rows
-    if api_put_perf_history(session, api_base, merged):
-        log(f"Froze {len(frozen_rows)} rows for {date_key} (EOD save).")
+        # perf_history rows and house marketing are written in one transaction. If today is already frozen
+        # (an earlier or concurrent EOD run) its rows are kept (skip_existing). Only --date replaces them.
+        stored = await api_batch_rows(
+            client, frozen_date_operations({date_key: frozen_rows}, skip_existing=not replace)
+        )
+        if stored is None:
+            record.update(outcome="failed", rows=len(frozen_rows))
+            return 1
+        stored_ids = {row.get("id") for row in stored.get("perfHistory") or []}
+        if frozen_rows[0]["id"] not in stored_ids:
+            log(f"perfHistory already had rows for {date_key}; kept them.")
+            record.update(outcome="kept", rows=0)
+            return 0
         total_marketing = sum(r["marketing"] for r in frozen_rows)
-        if api_set_house_marketing(session, api_base, date_key, total_marketing):
-            log(f"Set house marketing from frozen sum: ${total_marketing:,.2f} for {date_key}.")
-        else:
-            log("  Failed to set house marketing from frozen sum.")
+        log(f"Froze {len(frozen_rows)} rows for {date_key} (EOD save).")
+        log(f"Set house marketing from frozen sum: ${total_marketing:,.2f} for {date_key}.")
+        record.update(outcome="frozen", rows=len(frozen_rows), marketing=round(total_marketing, 2))
         return 0
-    return 1
 
 
 if __name__ == "__main__":
@@ -1,45 +1,233 @@
 #!/usr/bin/env python3
 """
-Shared HTTP request helper with retries for ChunkedEncodingError and connection/read failures.
-Used by main.py, eod.py, policies_bot.py when calling the API.
+Shared async HTTP request helper with retries for dropped connections, protocol errors, timeouts
+and 429/502/503/504 responses.
+Used by api_client.py (and through it main.py, eod.py, policies_bot.py, backfill.py, backfill_headed.py).
+
+Per process it also keeps:
+- a client-side token bucket per server rate-limit class (see RATE_LIMITS), so bulk jobs run at
+  the allowed speed without tripping 429s;
+- a total retry-sleep budget per run (API_RETRY_BUDGET_SECONDS, default 120), so outages cannot
+  burn minutes on retries. A script run has one; scheduler.py gives every job run a fresh one
+  (new_retry_budget), so the budget is not used up for good over the scheduler's lifetime;
+- a circuit breaker that fails fast with CircuitOpenError once the API is clearly down, and
+  closes again after the cooldown once a trial request succeeds.
 """
 
+import asyncio
+import contextvars
+import os
+import random
 import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from typing import Any, Callable
 
-import requests
+import httpx
+
+# Server limits per route (server/src/app.ts, server/src/routes/state.ts); keep in sync.
+RATE_LIMITS = {
+    "GET /state": 240,
+    "GET /state/:key": 180,
+    "PUT /state/:key": 240,
+    "POST /state/batch": 240,
+    "default": 60,
+}
+RETRY_STATUSES = {429, 502, 503, 504}
+RETRY_BUDGET_SECONDS = float(os.environ.get("API_RETRY_BUDGET_SECONDS", "120"))
+CIRCUIT_FAILURE_THRESHOLD = 5  # one request's full retry cycle
+CIRCUIT_COOLDOWN_SECONDS = 60.0
+BACKOFF_CAP_SECONDS = 30.0
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised without touching the network while the circuit breaker is open."""
+
+
+class TokenBucket:
+    """Reservation-based token bucket: refills 90% of per_minute over 60s with a 10% burst, so no
+    rolling minute exceeds per_minute. Safe without locks on a single event loop."""
+
+    def __init__(self, per_minute: int) -> None:
+        self.rate = per_minute * 0.9 / 60.0
+        self.capacity = max(1.0, per_minute * 0.1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self) -> float:
+        """Take one token, sleeping until it is available. Returns seconds waited."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class CircuitBreaker:
+    """Opens after CIRCUIT_FAILURE_THRESHOLD consecutive failures; after the cooldown one trial
+    request is let through (half-open) and either closes the circuit or re-opens it. Other requests
+    fail fast while the trial is in flight; a trial that never reports back (cancelled, 429) is
+    replaced by a new one after another cooldown."""
+
+    def __init__(self, threshold: int, cooldown: float) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.trial_started: float | None = None
+
+    def check(self) -> None:
+        if self.opened_at is None:
+            return
+        now = time.monotonic()
+        remaining = self.cooldown - (now - self.opened_at)
+        if remaining > 0:
+            raise CircuitOpenError(
+                f"API circuit open after {self.failures} consecutive failures; next attempt in {remaining:.0f}s"
+            )
+        if self.trial_started is not None and now - self.trial_started < self.cooldown:
+            raise CircuitOpenError(
+                f"API circuit half-open after {self.failures} consecutive failures; trial request in flight"
+            )
+        self.trial_started = now
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.trial_started = None
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
 
+class RetryBudget:
+    """Total seconds a run may spend sleeping between retries."""
 
-def request_with_retries(
-    session: requests.Session,
+    def __init__(self, seconds: float) -> None:
+        self.remaining = seconds
+
+    def take(self, delay: float) -> bool:
+        if delay > self.remaining:
+            return False
+        self.remaining -= delay
+        return True
+
+
+_BUCKETS = {name: TokenBucket(limit) for name, limit in RATE_LIMITS.items()}
+_BREAKER = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_COOLDOWN_SECONDS)
+# The current run's budget; tasks started by a run share it (asyncio copies the context).
+_BUDGET: contextvars.ContextVar[RetryBudget] = contextvars.ContextVar(
+    "retry_budget", default=RetryBudget(RETRY_BUDGET_SECONDS)
+)
+
+
+def new_retry_budget() -> None:
+    """Give the current task, and the tasks it starts from now on, a full retry budget of their own."""
+    _BUDGET.set(RetryBudget(RETRY_BUDGET_SECONDS))
+
+
+def _bucket_for(method: str, url: str | httpx.URL) -> TokenBucket:
+    path = httpx.URL(str(url)).path.rstrip("/")
+    m = method.upper()
+    if path == "/state" and m == "GET":
+        return _BUCKETS["GET /state"]
+    if path == "/state/batch" and m == "POST":
+        return _BUCKETS["POST /state/batch"]
+    if path.startswith("/state/") and path.count("/") == 2 and m in ("GET", "PUT"):
+        return _BUCKETS[f"{m} /state/:key"]
+    return _BUCKETS["default"]
+
+
+def _backoff(attempt: int) -> float:
+    """Exponential backoff (2 + 2**attempt, capped) with equal jitter."""
+    base = min(BACKOFF_CAP_SECONDS, 2 + 2**attempt)
+    return random.uniform(base / 2, base)
+
+
+def _retry_after_seconds(r: httpx.Response) -> float | None:
+    value = (r.headers.get("retry-after") or "").strip()
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+async def request_with_retries(
+    client: httpx.AsyncClient,
     method: str,
     url: str,
     *,
     max_retries: int = 5,
     log_fn: Callable[[str], None] | None = None,
+    stream: bool = False,
     **kwargs: Any,
-) -> requests.Response:
+) -> httpx.Response:
     """
-    Perform session.request(method, url, **kwargs), force a full read of the response,
-    and retry on ChunkedEncodingError, ConnectionError, or Timeout with exponential backoff.
-    Returns the Response (content is cached so callers can use r.status_code, r.json(), etc.).
+    Perform await client.request(method, url, **kwargs), paced by the route's token bucket, and retry
+    on transport errors (connect/read failures, connection dropped mid-body, timeouts) and on
+    429/502/503/504 responses. Waits honor Retry-After when present, otherwise jittered exponential
+    backoff, and all waits draw from the per-run retry budget. Uses asyncio.sleep so browser work and
+    other API calls keep running meanwhile.
+    Returns the last Response (body fully read, unless stream=True and the status is not retryable:
+    then the caller reads it incrementally and must aclose() it) or raises the last transport error;
+    raises CircuitOpenError immediately while the API is considered down.
     """
     last_exc: BaseException | None = None
+    last_response: httpx.Response | None = None
     for attempt in range(max_retries):
+        _BREAKER.check()
+        waited = await _bucket_for(method, url).acquire()
+        if waited >= 1 and log_fn:
+            log_fn(f"  Rate limit pacing: waited {waited:.1f}s before {method.upper()} {url}")
         try:
-            r = session.request(method, url, **kwargs)
-            _ = r.content  # Force full read; raises ChunkedEncodingError if connection drops mid-stream
-            return r
-        except (
-            requests.exceptions.ChunkedEncodingError,
-            requests.exceptions.ConnectionError,
-            requests.exceptions.Timeout,
-        ) as e:
-            last_exc = e
+            if stream:
+                r = await client.send(client.build_request(method, url, **kwargs), stream=True)
+                if r.status_code in RETRY_STATUSES:
+                    await r.aread()
+            else:
+                r = await client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            _BREAKER.record_failure()
+            last_exc, last_response = e, None
+            delay = _backoff(attempt)
+            if log_fn:
+                log_fn(f"  Request failed (attempt {attempt + 1}/{max_retries}): {e!r}")
+        else:
+            if r.status_code not in RETRY_STATUSES:
+                _BREAKER.record_success()
+                return r
+            if r.status_code != 429:
+                _BREAKER.record_failure()
+            last_exc, last_response = None, r
+            retry_after = _retry_after_seconds(r)
+            delay = retry_after if retry_after is not None else _backoff(attempt)
+            if log_fn:
+                log_fn(f"  {method.upper()} {url} returned {r.status_code} (attempt {attempt + 1}/{max_retries}).")
+        if attempt == max_retries - 1:
+            break
+        budget = _BUDGET.get()
+        if not budget.take(delay):
             if log_fn:
-                log_fn(f"  Request failed (attempt {attempt + 1}/{max_retries}): {e}")
-            if attempt < max_retries - 1:
-                time.sleep(2 + 2**attempt)
+                log_fn(f"  Retry budget exhausted ({budget.remaining:.0f}s left, need {delay:.1f}s); giving up.")
+            break
+        await asyncio.sleep(delay)
+    if last_response is not None:
+        return last_response
     if last_exc is not None:
         raise last_exc
     raise RuntimeError("request_with_retries: no attempt ran")  # unreachable
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Incremental JSON reader for large API responses (GET /state).
+
+Decodes the response text chunk by chunk and only materializes the requested members of the
+`{"data": {...}}` envelope. Unrequested collections are skipped without building any objects, and
+array members are decoded one row at a time, so peak memory is the requested rows plus a network
+chunk instead of raw bytes + decoded text + the whole object graph.
+Used by api_client.api_get_state.
+"""
+
+import json
+import re
+from typing import Any, AsyncIterable, AsyncIterator, Iterable
+
+_WHITESPACE = " \t\n\r"
+_STRUCT_SPECIAL = re.compile(r'["\[\]{}]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+_NUMBER_CHARS = "0123456789.eE+-"
+_DECODER = json.JSONDecoder()
+
+
+class _Reader:
+    """Cursor over a stream of text chunks; consumed text is dropped on each refill."""
+
+    def __init__(self, chunks: AsyncIterable[str]) -> None:
+        self._chunks = chunks.__aiter__()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    async def _fill(self, min_chars: int = 1) -> bool:
+        """Append at least min_chars of new text (fewer at end of stream). Return False if nothing was added."""
+        parts = [self.buf[self.pos:]]
+        added = 0
+        while added < min_chars and not self.eof:
+            try:
+                chunk = await self._chunks.__anext__()
+            except StopAsyncIteration:
+                self.eof = True
+                break
+            parts.append(chunk)
+            added += len(chunk)
+        self.buf = "".join(parts)
+        self.pos = 0
+        return added > 0
+
+    async def peek(self) -> str:
+        """Skip whitespace and return the next character without consuming it."""
+        while True:
+            buf = self.buf
+            while self.pos < len(buf) and buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(buf):
+                return buf[self.pos]
+            if not await self._fill():
+                raise ValueError("Unexpected end of JSON stream")
+
+    async def expect(self, ch: str) -> None:
+        got = await self.peek()
+        if got != ch:
+            raise ValueError(f"Expected {ch!r} in JSON stream, got {got!r}")
+        self.pos += 1
+
+    async def read_value(self) -> Any:
+        """Decode one complete JSON value at the cursor."""
+        await self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # Incomplete value: grow the buffer geometrically so large values stay linear.
+                if not await self._fill(max(1, len(self.buf) - self.pos)):
+                    raise
+                continue
+            # A number running up to the end of the buffer may continue in the next chunk: "1" of "15",
+            # or "1" of "1.5" / "1e3" (raw_decode stops before a trailing "." or "e" with no digits yet).
+            if not self.eof and isinstance(value, (int, float)) and not isinstance(value, bool):
+                tail = end
+                while tail < len(self.buf) and self.buf[tail] in _NUMBER_CHARS:
+                    tail += 1
+                if tail == len(self.buf) and await self._fill():
+                    continue
+            elif end == len(self.buf) and not self.eof and await self._fill():
+                continue
+            self.pos = end
+            return value
+
+    async def skip_value(self) -> None:
+        """Consume one JSON value without decoding it."""
+        if await self.peek() not in '[{"':
+            await self.read_value()
+            return
+        depth = 0
+        in_string = False
+        escape = False
+        while True:
+            buf, i, n = self.buf, self.pos, len(self.buf)
+            while i < n:
+                if escape:
+                    escape = False
+                    i += 1
+                    continue
+                m = (_STRING_SPECIAL if in_string else _STRUCT_SPECIAL).search(buf, i)
+                if m is None:
+                    i = n
+                    break
+                ch = m.group()
+                i = m.end()
+                if in_string:
+                    if ch == "\\":
+                        escape = True
+                        continue
+                    in_string = False
+                    if depth == 0:
+                        self.pos = i
+                        return
+                elif ch == '"':
+                    in_string = True
+                elif ch in "[{":
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        self.pos = i
+                        return
+            self.pos = i
+            if not await self._fill():
+                raise ValueError("Unexpected end of JSON stream")
+
+    async def object_keys(self) -> AsyncIterator[str]:
+        """Yield each member name of the object at the cursor; the caller must consume its value."""
+        await self.expect("{")
+        if await self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = await self.read_value()
+            if not isinstance(key, str):
+                raise ValueError("Expected object key in JSON stream")
+            await self.expect(":")
+            yield key
+            ch = await self.peek()
+            self.pos += 1
+            if ch == "}":
+                return
+            if ch != ",":
+                raise ValueError(f"Expected ',' or '}}' in JSON stream, got {ch!r}")
+
+    async def array_items(self) -> AsyncIterator[Any]:
+        """Yield each element of the array at the cursor, decoded one at a time."""
+        await self.expect("[")
+        if await self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield await self.read_value()
+            ch = await self.peek()
+            self.pos += 1
+            if ch == "]":
+                return
+            if ch != ",":
+                raise ValueError(f"Expected ',' or ']' in JSON stream, got {ch!r}")
+
+
+async def iter_members(
+    chunks: AsyncIterable[str],
+    keys: Iterable[str] | None = None,
+    *,
+    envelope: str | None = "data",
+    extra: dict[str, Any] | None = None,
+) -> AsyncIterator[tuple[str, Any]]:
+    """
+    Yield (name, value) for each member of the `envelope` object (or of the top-level object when
+    envelope is None) whose name is in keys (every member when keys is None). Top-level siblings of
+    the envelope whose names are already keys of extra (e.g. {"meta": None}) are decoded into it.
+    Raises ValueError on malformed or truncated JSON.
+    """
+    wanted = set(keys) if keys is not None else None
+    reader = _Reader(chunks)
+
+    async def members() -> AsyncIterator[tuple[str, Any]]:
+        async for name in reader.object_keys():
+            if wanted is not None and name not in wanted:
+                await reader.skip_value()
+            elif await reader.peek() == "[":
+                yield name, [row async for row in reader.array_items()]
+            else:
+                yield name, await reader.read_value()
+
+    if envelope is None:
+        async for item in members():
+            yield item
+        return
+    async for name in reader.object_keys():
+        if name == envelope and await reader.peek() == "{":
+            async for item in members():
+                yield item
+        elif extra is not None and name in extra:
+            extra[name] = await reader.read_value()
+        else:
+            await reader.skip_value()
@@ -11,23 +11,39 @@ auth_policyden.json, auth_wegenerate.json, agent_map.json.
 """
 from __future__ import annotations
 
+from trading_window import exit_outside_window, in_scraping_window
+
+if __name__ == "__main__":
+    # Fast path: outside the window, exit before the imports below (asyncio, httpx, dotenv, API client).
+    exit_outside_window()
+
+import argparse
 import asyncio
+import hashlib
 import json
 import os
 import sys
+import time
 import uuid
 from pathlib import Path
+from typing import Awaitable, Callable, Iterable
 
+import httpx
 from dotenv import load_dotenv
 
 from auth_login import login_and_save_async
-from http_retry import request_with_retries
-
-# Optional: reduce detection on datacenter IPs
-try:
-    from playwright_stealth import stealth_async
-except ImportError:
-    stealth_async = None
+from browser_profile import context_options, launch_options, low_memory, sample_browser_memory, trim_context
+from run_lock import lock_wait_seconds, single_flight
+from run_log import emit, log_phase
+from api_client import (
+    api_get_state,
+    api_login,
+    api_batch_update,
+    batch_set_house_marketing,
+    create_api_client,
+    slot_field_operations,
+    slot_snapshot_operations,
+)
 
 # --- Config (match dashboard) ---
 ZONE = "America/New_York"
@@ -37,6 +53,11 @@ SLOT_CONFIG = [
     {"key": "15:00", "label": "3:00 PM", "minute_of_day": 15 * 60},
     {"key": "17:00", "label": "5:00 PM", "minute_of_day": 17 * 60},
 ]
+# Fingerprints of the last pushed (dateKey, slot) payload per site; ticks that scrape the same numbers skip the write.
+LAST_PUSH_FILE = ".last_push.json"
+SITES = ("policyden", "wegenerate")
+# Snapshot fields each site fills. A tick that scrapes one site writes only that site's fields of the slot rows.
+SITE_FIELDS = {"policyden": ("sales",), "wegenerate": ("billableCalls", "marketing")}
 POLICYDEN_LOGIN = "https://app.policyden.com/login"
 POLICYDEN_POLICIES = "https://app.policyden.com/policies"
 POLICYDEN_DASHBOARD = "https://app.policyden.com/dashboard"
@@ -95,6 +116,16 @@ def log(msg: str) -> None:
     print(msg, flush=True)
 
 
+def load_stealth():
+    """playwright_stealth's stealth_async (reduces detection on datacenter IPs), or None if not installed.
+    Imported on first use: it loads playwright, which ticks outside the window never need."""
+    try:
+        from playwright_stealth import stealth_async
+    except ImportError:
+        return None
+    return stealth_async
+
+
 def get_date_key_est() -> str:
     from datetime import datetime
     from zoneinfo import ZoneInfo
@@ -398,9 +429,11 @@ async def scrape_policyden(
         return out
 
     async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(storage_state=str(auth_path))
+        browser = await p.chromium.launch(**launch_options())
+        context = await browser.new_context(**context_options(storage_state=str(auth_path)))
+        await trim_context(context)
         page = await context.new_page()
+        stealth_async = load_stealth()
         if stealth_async:
             await stealth_async(page)
         try:
@@ -421,6 +454,9 @@ async def scrape_policyden(
                     await page.click(open_btn, timeout=8000)
                 live_page = await popup_info.value
                 await live_page.wait_for_load_state("networkidle", timeout=15000)
+                if low_memory():
+                    # One tab at a time: the dashboard is not needed once Live View is open.
+                    await page.close()
             except Exception:
                 await page.wait_for_timeout(3000)
                 live_page = page
@@ -528,9 +564,11 @@ async def scrape_wegenerate(
         return out, marketing_by_agent, campaign_marketing
 
     async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(storage_state=str(auth_path))
+        browser = await p.chromium.launch(**launch_options())
+        context = await browser.new_context(**context_options(storage_state=str(auth_path)))
+        await trim_context(context)
         page = await context.new_page()
+        stealth_async = load_stealth()
         if stealth_async:
             await stealth_async(page)
         try:
@@ -699,81 +737,18 @@ async def scrape_wegenerate(
     return out, marketing_by_agent, campaign_marketing
 
 
-def api_login(session, base_url: str, username: str, password: str) -> bool:
-    r = request_with_retries(
-        session,
-        "post",
-        f"{base_url.rstrip('/')}/auth/login",
-        json={"username": username, "password": password},
-        timeout=15,
-        log_fn=log,
-    )
-    if r.status_code != 200:
-        log(f"  Login failed: {r.status_code} {r.text[:200]}")
-        return False
-    return True
-
-
-def api_get_state(session, base_url: str) -> dict | None:
-    r = request_with_retries(
-        session,
-        "get",
-        f"{base_url.rstrip('/')}/state",
-        timeout=90,
-        max_retries=5,
-        headers={"Cache-Control": "no-cache", "Pragma": "no-cache"},
-        log_fn=log,
-    )
-    if r.status_code != 200:
-        log(f"  GET /state failed: {r.status_code}")
-        return None
-    data = r.json()
-    return data.get("data") if isinstance(data, dict) else data
-
-
-def api_put_snapshots(session, base_url: str, snapshots: list) -> bool:
-    r = request_with_retries(
-        session,
-        "put",
-        f"{base_url.rstrip('/')}/state/snapshots",
-        json=snapshots,
-        timeout=15,
-        log_fn=log,
-    )
-    if r.status_code != 200:
-        log(f"  PUT /state/snapshots failed: {r.status_code} {r.text[:200]}")
-        return False
-    return True
-
-
-def api_set_house_marketing(session, base_url: str, date_key: str, amount: float) -> bool:
-    r = request_with_retries(
-        session,
-        "post",
-        f"{base_url.rstrip('/')}/state/house-marketing",
-        json={"dateKey": date_key, "amount": round(amount, 2)},
-        timeout=10,
-        log_fn=log,
-    )
-    if r.status_code != 200:
-        log(f"  POST /state/house-marketing failed: {r.status_code} {r.text[:200]}")
-        return False
-    return True
-
-
-def send_telegram(text: str) -> bool:
+async def send_telegram(text: str) -> bool:
     """Send a message via Telegram Bot API. Returns True if sent, False if skipped or failed."""
     token = os.environ.get("TELEGRAM_BOT_TOKEN", "").strip()
     chat_id = os.environ.get("TELEGRAM_CHAT_ID", "").strip()
     if not token or not chat_id:
         return False
     try:
-        import requests
-        r = requests.post(
-            f"https://api.telegram.org/bot{token}/sendMessage",
-            json={"chat_id": chat_id, "text": text, "disable_web_page_preview": True},
-            timeout=10,
-        )
+        async with httpx.AsyncClient(timeout=10) as client:
+            r = await client.post(
+                f"https://api.telegram.org/bot{token}/sendMessage",
+                json={"chat_id": chat_id, "text": text, "disable_web_page_preview": True},
+            )
         if r.status_code != 200:
             log(f"  Telegram send failed: {r.status_code} {r.text[:200]}")
             return False
@@ -795,6 +770,45 @@ def merge_snapshots(
     return rest + new_rows
 
 
+def _fingerprint_value(field: str, value):
+    """One type per field, so scraped rows and the server's JSON hash alike (201.0 marketing comes back as 201)."""
+    if not isinstance(value, (int, float)):
+        return value
+    return float(value) if field == "marketing" else int(value)
+
+
+def snapshot_fingerprint(rows: list, campaign_marketing: float | None, site: str) -> str:
+    """Hash of what a tick pushes for one (dateKey, slot) from site: per-agent SITE_FIELDS (and WeGenerate's
+    campaign total)."""
+    payload = sorted([r.get("agentId"), *(_fingerprint_value(f, r.get(f)) for f in SITE_FIELDS[site])] for r in rows)
+    campaign = _fingerprint_value("marketing", campaign_marketing) if site == "wegenerate" else None
+    return hashlib.sha256(json.dumps([payload, campaign]).encode()).hexdigest()
+
+
+def load_last_push(path: Path) -> dict:
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def save_last_push(path: Path, date_key: str, slot_key: str, fingerprints: dict[str, str]) -> None:
+    """Record the pushed sites' fingerprints; the other site's are kept while the (dateKey, slot) is the same."""
+    last_push = load_last_push(path)
+    if (last_push.get("dateKey"), last_push.get("slot")) == (date_key, slot_key):
+        fingerprints = {**(last_push.get("fingerprints") or {}), **fingerprints}
+    try:
+        path.write_text(json.dumps({
+            "dateKey": date_key,
+            "slot": slot_key,
+            "fingerprints": fingerprints,
+            "pushedAt": time.time(),
+        }))
+    except OSError as e:
+        log(f"  Could not save {path.name}: {e}")
+
+
 async def _run_scrapes_async(
     auth_policyden: Path,
     auth_wegenerate: Path,
@@ -804,25 +818,52 @@ async def _run_scrapes_async(
     policyden_pass: str,
     wegenerate_user: str,
     wegenerate_pass: str,
+    sites: Iterable[str] = SITES,
 ):
-    """Run both scrapers (async)."""
-    log("Scraping PolicyDen (sales)...")
-    sales = await scrape_policyden(
-        auth_policyden, date_key, bot_dir, policyden_user, policyden_pass
-    )
-    log("Scraping WeGenerate (calls + marketing)...")
-    calls, marketing_by_agent, campaign_marketing = await scrape_wegenerate(
-        auth_wegenerate, date_key, bot_dir, wegenerate_user, wegenerate_pass
-    )
+    """Run the scrapers of sites (async). A site not in sites returns empty values, like a failed scrape."""
+    sales: dict[str, int] = {}
+    calls: dict[str, int] = {}
+    marketing_by_agent: dict[str, float] = {}
+    campaign_marketing: float | None = None
+    if "policyden" in sites:
+        log("Scraping PolicyDen (sales)...")
+        with log_phase("scrape", site="policyden") as record:
+            async with sample_browser_memory("PolicyDen") as memory:
+                sales = await scrape_policyden(
+                    auth_policyden, date_key, bot_dir, policyden_user, policyden_pass
+                )
+            record.update(outcome="ok" if sales else "empty", rows=len(sales), browser_peak_mb=round(memory.peak_mb))
+    if "wegenerate" in sites:
+        log("Scraping WeGenerate (calls + marketing)...")
+        with log_phase("scrape", site="wegenerate") as record:
+            async with sample_browser_memory("WeGenerate") as memory:
+                calls, marketing_by_agent, campaign_marketing = await scrape_wegenerate(
+                    auth_wegenerate, date_key, bot_dir, wegenerate_user, wegenerate_pass
+                )
+            record.update(outcome="ok" if calls else "empty", rows=len(calls), browser_peak_mb=round(memory.peak_mb))
     return sales, calls, marketing_by_agent, campaign_marketing
 
 
+async def _login_and_get_state(client, username: str, password: str) -> dict | None:
+    if not await api_login(client, username, password):
+        return None
+    return await api_get_state(client, ("agents", "snapshots"))
+
+
 def main() -> int:
     return asyncio.run(main_async())
 
 
 async def main_async() -> int:
     load_dotenv()
+    parser = argparse.ArgumentParser(description="Scrape PolicyDen and WeGenerate and write the current slot's snapshots.")
+    parser.add_argument(
+        "--site",
+        action="append",
+        choices=SITES,
+        help="Scrape only this site and write only its fields (repeatable; default: both)",
+    )
+    args = parser.parse_args()
     bot_dir = Path(__file__).resolve().parent
 
     api_base = os.environ.get("API_BASE_URL", "").strip()
@@ -837,27 +878,63 @@ async def main_async() -> int:
         log("Set ADMIN_USERNAME, ADMIN_PASSWORD in .env")
         return 1
 
-    date_key = get_date_key_est()
-    slot_key, slot_label = get_current_slot()
-    log(f"Date: {date_key}  Slot: {slot_key} ({slot_label})")
+    async with create_api_client(api_base) as client:
+        code, _ = await run_tick(
+            client, bot_dir, lambda: _login_and_get_state(client, admin_user, admin_pass), sites=args.site or SITES
+        )
+        return code
+
 
+async def run_tick(
+    client,
+    bot_dir: Path,
+    load_state: Callable[[], Awaitable[dict | None]],
+    observe: Callable[[str, object], None] | None = None,
+    sites: Iterable[str] = SITES,
+) -> tuple[int, dict | None]:
+    """
+    One intra-day run: scrape sites (both by default) and write the current slot's snapshots. A run that scrapes
+    one site, or where one site's scrape fails, writes only that site's fields (SITE_FIELDS) and keeps the
+    other's stored numbers. load_state() (login and/or GET agents + snapshots) runs while the browsers scrape.
+    Returns (exit code, state): state holds agents and snapshots as the server has them after the run, or None
+    when they were not loaded or the write failed, so callers in the same process (eod.py) can carry on without
+    another login or GET /state.
+    observe(site, values), if given, gets each site's scraped values (scheduler.py's adaptive cadence).
+    A tick that finds another in progress for the same sites joins it (exit code of that run, no state); one
+    that cannot get the browser within BOT_LOCK_WAIT_SECONDS is skipped (see run_lock.py).
+    """
     from datetime import datetime
     from zoneinfo import ZoneInfo
-    now_est = datetime.now(ZoneInfo(ZONE))
-    if now_est.hour < 9:
-        log("Outside scraping window (9 AM–9 PM EST, Mon–Fri); skipping.")
-        return 0
-    if now_est.hour > 21:
-        log("Outside scraping window (9 AM–9 PM EST, Mon–Fri); skipping.")
-        return 0
-    if now_est.weekday() >= 5:
+    if not in_scraping_window(datetime.now(ZoneInfo(ZONE))):
         log("Outside scraping window (9 AM–9 PM EST, Mon–Fri); skipping.")
-        return 0
+        return 0, None
+
+    sites = tuple(site for site in SITES if site in sites)
+    job = "tick" if sites == SITES else "tick-" + "-".join(sites)
+    async with single_flight(bot_dir, job, browser_wait=lock_wait_seconds()) as flight:
+        if flight.joined is not None:
+            return flight.joined, None
+        if flight.skipped:
+            return 0, None
+        flight.code, state = await _run_tick(client, bot_dir, load_state, observe, sites)
+        return flight.code, state
+
+
+async def _run_tick(
+    client,
+    bot_dir: Path,
+    load_state: Callable[[], Awaitable[dict | None]],
+    observe: Callable[[str, object], None] | None,
+    sites: tuple[str, ...],
+) -> tuple[int, dict | None]:
+    date_key = get_date_key_est()
+    slot_key, slot_label = get_current_slot()
+    log(f"Date: {date_key}  Slot: {slot_key} ({slot_label})" + ("" if sites == SITES else f"  Sites: {', '.join(sites)}"))
 
     agent_map = load_agent_map(bot_dir)
     if not agent_map:
         log("No agent_map.json; exiting.")
-        return 0
+        return 0, None
 
     auth_policyden = bot_dir / "auth_policyden.json"
     auth_wegenerate = bot_dir / "auth_wegenerate.json"
@@ -867,33 +944,45 @@ async def main_async() -> int:
     wegenerate_user = os.environ.get("WEGENERATE_USERNAME", "").strip()
     wegenerate_pass = os.environ.get("WEGENERATE_PASSWORD", "").strip()
 
-    sales_by_agent, calls_by_agent, marketing_by_agent, campaign_marketing = await _run_scrapes_async(
-        auth_policyden,
-        auth_wegenerate,
-        date_key,
-        bot_dir,
-        policyden_user,
-        policyden_pass,
-        wegenerate_user,
-        wegenerate_pass,
-    )
+    # Log in and load state while the browsers scrape, so API I/O overlaps with Playwright work.
+    state_task = asyncio.create_task(load_state())
+    try:
+        sales_by_agent, calls_by_agent, marketing_by_agent, campaign_marketing = await _run_scrapes_async(
+            auth_policyden,
+            auth_wegenerate,
+            date_key,
+            bot_dir,
+            policyden_user,
+            policyden_pass,
+            wegenerate_user,
+            wegenerate_pass,
+            sites,
+        )
+    except BaseException:
+        state_task.cancel()
+        raise
 
-    if not sales_by_agent and not calls_by_agent:
+    # An empty scrape is a failed one: that site's fields keep their stored values instead of dropping to 0.
+    scraped = tuple(
+        site for site, values in (("policyden", sales_by_agent), ("wegenerate", calls_by_agent))
+        if site in sites and values
+    )
+    if not scraped and sites == SITES:
         log("  Both scrapers empty. Re-run capture.py for both sites, re-upload auth_*.json to the VPS, and try again (sessions expire).")
         msg = (
             "VC Dash bot: PolicyDen and WeGenerate sessions may have expired. "
             "Both scrapers returned no data. Re-run capture.py for both sites and re-upload auth_*.json to the VPS."
         )
-        if send_telegram(msg):
+        if await send_telegram(msg):
             log("  Telegram notification sent.")
     else:
-        if not sales_by_agent:
+        if "policyden" in sites and "policyden" not in scraped:
             log("  PolicyDen returned no data (session may have expired).")
-            if send_telegram("VC Dash bot: PolicyDen session may have expired. Re-run capture.py policyden and re-upload auth_policyden.json."):
+            if await send_telegram("VC Dash bot: PolicyDen session may have expired. Re-run capture.py policyden and re-upload auth_policyden.json."):
                 log("  Telegram notification sent.")
-        if not calls_by_agent:
+        if "wegenerate" in sites and "wegenerate" not in scraped:
             log("  WeGenerate returned no data (session may have expired).")
-            if send_telegram("VC Dash bot: WeGenerate session may have expired. Re-run capture.py wegenerate and re-upload auth_wegenerate.json."):
+            if await send_telegram("VC Dash bot: WeGenerate session may have expired. Re-run capture.py wegenerate and re-upload auth_wegenerate.json."):
                 log("  Telegram notification sent.")
 
     verbose = os.environ.get("BOT_VERBOSE", "").strip().lower() in ("1", "true", "yes")
@@ -902,80 +991,138 @@ async def main_async() -> int:
         log("  [verbose] WeGenerate scraped (name -> calls): " + str(dict(sorted(calls_by_agent.items()))))
         log("  [verbose] WeGenerate scraped (name -> marketing): " + str(dict(sorted(marketing_by_agent.items()))))
         log("  [verbose] agent_map keys (display names): " + str(list(agent_map.keys())))
-
-    import requests
-    session = requests.Session()
-    session.headers["Content-Type"] = "application/json"
+    if observe is not None:
+        if "policyden" in scraped:
+            observe("policyden", sales_by_agent)
+        if "wegenerate" in scraped:
+            observe("wegenerate", (calls_by_agent, marketing_by_agent, campaign_marketing))
+    if not scraped:
+        state_task.cancel()
+        log("Nothing scraped; keeping the slot's stored numbers.")
+        return 1, None
+    if "wegenerate" not in scraped:
+        campaign_marketing = None
 
     try:
-        if not api_login(session, api_base, admin_user, admin_pass):
-            return 1
-        state = api_get_state(session, api_base)
+        state = await state_task
         if not state:
-            return 1
+            return 1, None
 
         agents = state.get("agents") or []
         active_ids = {a["id"] for a in agents if a.get("active")}
         name_to_id = {a["name"]: a["id"] for a in agents}
 
         existing_snapshots = state.get("snapshots") or []
-        existing_by_key = {(s["dateKey"], s["slot"], s["agentId"]): s for s in existing_snapshots}
 
         from datetime import datetime, timezone
         from zoneinfo import ZoneInfo
         now_utc = datetime.now(ZoneInfo(ZONE)).astimezone(timezone.utc)
         now_iso = now_utc.strftime("%Y-%m-%dT%H:%M:%S.000Z")
-        new_rows = []
-        for display_name, agent_id in agent_map.items():
-            if agent_id not in active_ids:
-                continue
-            sales = sales_by_agent.get(display_name, 0)
-            calls = calls_by_agent.get(display_name, 0)
-            existing = existing_by_key.get((date_key, slot_key, agent_id))
-            snap_id = existing["id"] if existing else f"snap_{uuid.uuid4()}"
-            # Prefer fresh marketing from WeGenerate; otherwise preserve existing value for this slot if present.
-            raw_marketing = marketing_by_agent.get(display_name)
-            if isinstance(raw_marketing, (int, float)):
-                marketing = float(raw_marketing)
-            elif existing and isinstance(existing.get("marketing"), (int, float)):
-                marketing = float(existing.get("marketing"))  # type: ignore[arg-type]
-            else:
-                marketing = None
-            new_rows.append({
-                "id": snap_id,
-                "dateKey": date_key,
-                "slot": slot_key,
-                "slotLabel": slot_label,
-                "agentId": agent_id,
-                "billableCalls": calls,
-                "sales": sales,
-                "marketing": marketing,
-                "updatedAt": now_iso,
-            })
-            if verbose:
+
+        def build_rows(snapshots: list) -> list[dict]:
+            # Field-level merge onto the slot's stored rows: only the scraped sites' fields change.
+            stored = {s["agentId"]: s for s in snapshots if (s.get("dateKey"), s.get("slot")) == (date_key, slot_key)}
+            rows = []
+            for display_name, agent_id in agent_map.items():
+                if agent_id not in active_ids:
+                    continue
+                existing = stored.get(agent_id) or {}
+                marketing = existing.get("marketing")
+                row = {
+                    "id": existing.get("id") or f"snap_{uuid.uuid4()}",
+                    "dateKey": date_key,
+                    "slot": slot_key,
+                    "slotLabel": slot_label,
+                    "agentId": agent_id,
+                    "billableCalls": existing.get("billableCalls") or 0,
+                    "sales": existing.get("sales") or 0,
+                    "marketing": float(marketing) if isinstance(marketing, (int, float)) else None,
+                    "updatedAt": now_iso,
+                }
+                if "policyden" in scraped:
+                    row["sales"] = sales_by_agent.get(display_name, 0)
+                if "wegenerate" in scraped:
+                    row["billableCalls"] = calls_by_agent.get(display_name, 0)
+                    # Prefer fresh marketing from WeGenerate; otherwise the stored value for this slot stays.
+                    raw_marketing = marketing_by_agent.get(display_name)
+                    if isinstance(raw_marketing, (int, float)):
+                        row["marketing"] = float(raw_marketing)
+                rows.append(row)
+            return rows
+
+        new_rows = build_rows(existing_snapshots)
+        if verbose:
+            names = {agent_id: name for name, agent_id in agent_map.items()}
+            for row in new_rows:
                 log(
-                    f"  [verbose] Row: {display_name!r} -> agentId={agent_id[:8]}... "
-                    f"sales={sales} calls={calls} marketing={marketing!r}"
+                    f"  [verbose] Row: {names[row['agentId']]!r} -> agentId={row['agentId'][:8]}... "
+                    f"sales={row['sales']} calls={row['billableCalls']} marketing={row['marketing']!r}"
                 )
 
         if not new_rows:
             log("No snapshot rows to push (check agent_map and active agents).")
-            return 0
-
-        merged = merge_snapshots(existing_snapshots, new_rows, date_key, slot_key)
-        if api_put_snapshots(session, api_base, merged):
-            log(f"Pushed {len(new_rows)} snapshots for {date_key} {slot_key}.")
+            return 0, state
+
+        # Skip the write (and the dashboards' SSE refetch) when the scraped sites' numbers for this slot are
+        # unchanged since their last push and the server still holds them. BOT_HEARTBEAT_MINUTES > 0 pushes
+        # anyway once the last push is that old, so the dashboard's "last updated" time keeps moving.
+        last_push_path = bot_dir / LAST_PUSH_FILE
+        fingerprints = {site: snapshot_fingerprint(new_rows, campaign_marketing, site) for site in scraped}
+        last_push = load_last_push(last_push_path)
+        last_fingerprints = last_push.get("fingerprints") or {}
+        # Only the agents this tick pushes: inactive or unmapped agents' stored rows are left alone.
+        pushed_ids = {row["agentId"] for row in new_rows}
+        stored_rows = [
+            s for s in existing_snapshots
+            if (s.get("dateKey"), s.get("slot")) == (date_key, slot_key) and s.get("agentId") in pushed_ids
+        ]
+        if (last_push.get("dateKey"), last_push.get("slot")) == (date_key, slot_key) and all(
+            last_fingerprints.get(site) == fingerprint
+            and snapshot_fingerprint(stored_rows, campaign_marketing, site) == fingerprint
+            for site, fingerprint in fingerprints.items()
+        ):
+            age_minutes = (time.time() - float(last_push.get("pushedAt") or 0)) / 60
+            heartbeat_minutes = float(os.environ.get("BOT_HEARTBEAT_MINUTES") or 0)
+            if heartbeat_minutes <= 0 or age_minutes < heartbeat_minutes:
+                log(f"No changes for {date_key} {slot_key} since last push ({age_minutes:.0f} min ago); skipping write.")
+                emit("write", outcome="unchanged", rows=len(new_rows), slot=slot_key)
+                return 0, state
+            log(f"No changes for {date_key} {slot_key} in {age_minutes:.0f} min; pushing heartbeat.")
+
+        pushed_snapshots: list = []
+        fields = [field for site in scraped for field in SITE_FIELDS[site]]
+
+        def slot_operations(current: dict[str, list]) -> list[dict]:
+            nonlocal new_rows, pushed_snapshots
+            # Rebuilt from the current rows on a version conflict, so a concurrent write of the other
+            # site's fields is merged rather than overwritten.
+            new_rows = build_rows(current["snapshots"])
+            pushed_snapshots = merge_snapshots(current["snapshots"], new_rows, date_key, slot_key)
+            if scraped == SITES:
+                operations = slot_snapshot_operations(current["snapshots"], new_rows, date_key, slot_key)
+            else:
+                operations = slot_field_operations(current["snapshots"], new_rows, fields)
             if campaign_marketing is not None:
-                if api_set_house_marketing(session, api_base, date_key, campaign_marketing):
-                    log(f"Set house marketing ${campaign_marketing:,.2f} for {date_key}.")
-                else:
-                    log("  Failed to set house marketing; skipping houseMarketing update for this run.")
-            return 0
-        return 1
-    except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                operations.append(batch_set_house_marketing(date_key, campaign_marketing))
+            return operations
+
+        # One transaction for the slot's snapshots and house marketing. Compare-and-swap: if snapshots
+        # changed since GET /state, re-fetch them and rebuild this slot's operations.
+        with log_phase("write", site=None if scraped == SITES else scraped[0]) as record:
+            pushed = await api_batch_update(client, ("snapshots",), slot_operations, {"snapshots": existing_snapshots})
+            record.update(outcome="pushed" if pushed else "failed", rows=len(new_rows), slot=slot_key)
+        if pushed:
+            pushed_fields = "" if scraped == SITES else f" ({', '.join(fields)})"
+            log(f"Pushed {len(new_rows)} snapshots for {date_key} {slot_key}{pushed_fields}.")
+            if campaign_marketing is not None:
+                log(f"Set house marketing ${campaign_marketing:,.2f} for {date_key}.")
+            save_last_push(last_push_path, date_key, slot_key, fingerprints)
+            return 0, {**state, "snapshots": pushed_snapshots}
+        return 1, None
+    except httpx.TransportError as e:
         log(f"  API connection failed after retries: {e}")
-        send_telegram("VC Dash bot: API connection failed after retries (GET state). Dashboard may not update.")
-        return 1
+        await send_telegram("VC Dash bot: API connection failed after retries (GET state). Dashboard may not update.")
+        return 1, None
 
 
 if __name__ == "__main__":
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Array-backed perf_history metrics (NumPy columns) for eod.py: frozen marketing / CPA / CVR,
+marketing rescaling and per-date house totals, each computed for a whole date range in one pass.
+
+Values match the per-row Python they replace exactly: divisions are the same IEEE operations,
+round_exact() follows built-in round() (the few near-tie values are re-rounded in Python), and
+per-date totals add rows in order like sum() does (np.bincount accumulates sequentially).
+Missing CPA/CVR are NaN in arrays and None once converted back with to_optional().
+"""
+
+import numpy as np
+
+COST_PER_CALL = 15
+
+
+def frozen_metrics(
+    calls: np.ndarray,
+    sales: np.ndarray,
+    marketing: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (marketing, cpa, cvr) columns for frozen rows. NaN marketing falls back to calls * COST_PER_CALL;
+    cpa is marketing / sales where sales > 0 and cvr is sales / calls where calls > 0, NaN otherwise.
+    """
+    calls = np.asarray(calls, dtype=np.float64)
+    sales = np.asarray(sales, dtype=np.float64)
+    marketing = np.asarray(marketing, dtype=np.float64)
+    marketing = np.where(np.isnan(marketing), calls * COST_PER_CALL, marketing)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cpa = np.where(sales > 0, marketing / sales, np.nan)
+        cvr = np.where(calls > 0, sales / calls, np.nan)
+    return marketing, cpa, cvr
+
+
+def round_exact(values: np.ndarray, digits: int) -> np.ndarray:
+    """np.round with the results of Python's round(): values within a hair of a tie are redone in Python."""
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, digits)
+    scaled = values * 10.0**digits
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) <= 1e-9 * np.maximum(1.0, np.abs(scaled))
+    for i in np.flatnonzero(near_tie):
+        rounded[i] = round(float(values[i]), digits)
+    return rounded
+
+
+def rescale_marketing(
+    marketing: np.ndarray,
+    sales: np.ndarray,
+    scale: float | np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (marketing, cpa) after scaling marketing by scale (one factor, or one per row): marketing rounded to cents,
+    cpa to 4 places (NaN without sales).
+    """
+    sales = np.asarray(sales, dtype=np.float64)
+    scaled = round_exact(np.asarray(marketing, dtype=np.float64) * scale, 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cpa = np.where(sales > 0, round_exact(scaled / sales, 4), np.nan)
+    return scaled, cpa
+
+
+def totals_by_date(date_keys: list[str], values: np.ndarray) -> dict[str, float]:
+    """{dateKey: sum of values} in first-seen date order, adding each date's rows in order like sum()."""
+    dates, index = np.unique(np.asarray(date_keys, dtype=object), return_inverse=True)
+    totals = np.bincount(index, weights=np.asarray(values, dtype=np.float64), minlength=len(dates))
+    by_date = {str(d): float(t) for d, t in zip(dates, totals)}
+    return {d: by_date[d] for d in dict.fromkeys(date_keys)}
+
+
+def to_optional(values: np.ndarray) -> list[float | None]:
+    """Column as Python floats with NaN as None (JSON null)."""
+    return [None if v != v else v for v in np.asarray(values, dtype=np.float64).tolist()]
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """
-PolicyDen Policies bot: scrape /policies for the current month (no status filter),
+PolicyDen Policies bot: scrape /policies for the current month (no status filter; also last
+month in the first week, or any --months window scanned concurrently),
 sync audit records so only pending_cms and flagged appear as action needed, and
 update existing records when PolicyDen status changes (e.g. to accepted/issued/placed).
 
@@ -8,23 +9,31 @@ Requires: .env (API_BASE_URL, ADMIN_USERNAME, ADMIN_PASSWORD), auth_policyden.js
 agent_map.json. Same auth as the main sales bot.
 """
 
+import argparse
 import asyncio
 import json
 import os
 import sys
 import uuid
+from datetime import date, timedelta
 from pathlib import Path
-from typing import Optional
+from typing import Awaitable, Callable, Optional
 
 from dotenv import load_dotenv
 
 from auth_login import login_and_save_async
-from http_retry import request_with_retries
-
-try:
-    from playwright_stealth import stealth_async
-except ImportError:
-    stealth_async = None
+from api_client import (
+    api_get_audit_records,
+    api_batch_update,
+    api_login,
+    batch_patch,
+    batch_set_last_policies_bot_run,
+    batch_upsert,
+    create_api_client,
+)
+from browser_profile import context_options, launch_options, low_memory, sample_browser_memory, trim_context
+from run_lock import single_flight
+from run_log import log_phase
 
 ZONE = "America/New_York"
 POLICYDEN_POLICIES = "https://app.policyden.com/policies"
@@ -49,6 +58,8 @@ CARRIER_MAP = {
     "humana": "Humana",
 }
 ALLOWED_CARRIERS = {"Aetna", "UHC", "Humana"}
+# "Previous page" clicks allowed to reach a month in the date picker (--months goes back at most 11).
+CALENDAR_MAX_PAGES = 24
 
 
 def _normalize_status_label(raw: str) -> str:
@@ -93,6 +104,15 @@ def log(msg: str) -> None:
     print(msg, flush=True)
 
 
+def load_stealth():
+    """playwright_stealth's stealth_async, or None if not installed. Imported on first use (it loads playwright)."""
+    try:
+        from playwright_stealth import stealth_async
+    except ImportError:
+        return None
+    return stealth_async
+
+
 def load_agent_map(bot_dir: Path) -> dict[str, str]:
     path = bot_dir / "agent_map.json"
     if not path.exists():
@@ -234,23 +254,108 @@ async def scrape_policies_table(page, agent_map: dict[str, str]) -> list[dict]:
     return out
 
 
+def month_windows(today: date, months: int) -> list[tuple[str, date, date]]:
+    """(label, first day, last day) of today's month and the months - 1 before it, newest first."""
+    windows: list[tuple[str, date, date]] = []
+    first = today.replace(day=1)
+    for i in range(months):
+        last = (first.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        label = "This Month" if i == 0 else "Last Month" if i == 1 else first.strftime("%B %Y")
+        windows.append((label, first, last))
+        first = (first - timedelta(days=1)).replace(day=1)
+    return windows
+
+
+def _day_label(day: date) -> str:
+    """Accessible name of a day button in PolicyDen's calendar, e.g. "Tuesday, March 10, 2026"."""
+    return day.strftime("%A, %B ") + f"{day.day}, {day.year}"
+
+
+async def set_month_range(page, label: str, first: date, last: date) -> bool:
+    """
+    Show policies for one month: the This Month / Last Month presets, otherwise page the date picker back
+    ("Previous page", as set_policyden_date in backfill_headed.py) until first's month and year show, then
+    click first and last day. Return True if done.
+    """
+    if label == "This Month":
+        return await set_date_range(page, "this_month")
+    if label == "Last Month":
+        return await set_date_range(page, "last_month")
+    try:
+        await page.locator("button#date, button:has-text('Pick a date range')").first.click(timeout=5000)
+        await page.wait_for_timeout(700)
+        popover = page.locator('[id^="reka-popover-content-"], [role="dialog"]').first
+        await popover.wait_for(state="visible", timeout=4000)
+        await page.wait_for_timeout(400)
+        # The day names carry the year, so a month of last year is never looked for in this year's calendar.
+        # The calendar opens on this month (or a newer one already selected on this page), so page back.
+        first_day = page.get_by_role("button", name=_day_label(first))
+        for _ in range(CALENDAR_MAX_PAGES):
+            if await first_day.count() > 0:
+                break
+            await page.get_by_role("button", name="Previous page").first.click(timeout=2000)
+            await page.wait_for_timeout(400)
+        else:
+            raise RuntimeError(f"calendar did not reach {first:%B %Y}")
+        for day in (first, last):
+            await page.get_by_role("button", name=_day_label(day)).first.click(timeout=2000)
+            await page.wait_for_timeout(300)
+        await page.get_by_role("button", name="Apply").click(timeout=5000)
+        await page.wait_for_timeout(1500)
+        return True
+    except Exception as e:
+        log(f"  Date picker ({label}) failed: {e}")
+        try:
+            await page.keyboard.press("Escape")
+        except Exception:
+            pass
+        return False
+
+
+async def scrape_month(page, label: str, first: date, last: date, agent_map: dict[str, str]) -> list[dict]:
+    """Load /policies on page (unless already there), select the month and harvest its table."""
+    if not page.url.startswith(POLICYDEN_POLICIES):
+        await page.goto(POLICYDEN_POLICIES, wait_until="networkidle", timeout=30000)
+        await page.wait_for_timeout(2500)
+    if not await set_month_range(page, label, first, last):
+        raise RuntimeError(f"could not select {label}")
+    await page.wait_for_timeout(2000)
+    policies = await scrape_policies_table(page, agent_map)
+    log(f"  PolicyDen policies ({label}): scraped {len(policies)} rows (valid agent + carrier).")
+    return policies
+
+
 async def scrape_policyden_policies(
     auth_path: Path,
     bot_dir: Path,
     agent_map: dict[str, str],
     policyden_user: str = "",
     policyden_pass: str = "",
-    include_last_month: bool = False,
-) -> list[dict]:
+    months: int = 1,
+    today: date | None = None,
+) -> tuple[list[dict], list[str]]:
+    """
+    Scrape /policies for this month and the months - 1 before it. Each month gets its own page in one
+    browser context and all are harvested concurrently (one after another on a single page with
+    BOT_LOW_MEMORY); where a policy appears in several months the newest month wins. If this month cannot
+    be scraped nothing is returned; older months are best effort. Returns (policies, labels of the older
+    months that could not be scraped).
+    """
+    from datetime import datetime
+    from zoneinfo import ZoneInfo
+
     from playwright.async_api import async_playwright
 
     if not auth_path.exists():
         log("  auth_policyden.json not found.")
-        return []
+        return [], []
+    windows = month_windows(today or datetime.now(ZoneInfo(ZONE)).date(), months)
     async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(storage_state=str(auth_path))
+        browser = await p.chromium.launch(**launch_options())
+        context = await browser.new_context(**context_options(storage_state=str(auth_path)))
+        await trim_context(context)
         page = await context.new_page()
+        stealth_async = load_stealth()
         if stealth_async:
             await stealth_async(page)
         try:
@@ -262,169 +367,69 @@ async def scrape_policyden_policies(
                 if policyden_user and policyden_pass:
                     if await login_and_save_async("policyden", policyden_user, policyden_pass, auth_path, log_fn=log):
                         return await scrape_policyden_policies(
-                            auth_path, bot_dir, agent_map, policyden_user, policyden_pass, include_last_month
+                            auth_path, bot_dir, agent_map, policyden_user, policyden_pass, months, today
                         )
                 log("  PolicyDen: session expired (no credentials in .env for auto re-login).")
-                return []
-
-            all_policies: list[dict] = []
-
-            await set_date_range(page, "this_month")
-            await page.wait_for_timeout(2000)
-            this_month_policies = await scrape_policies_table(page, agent_map)
-            log(f"  PolicyDen policies (This Month): scraped {len(this_month_policies)} rows (valid agent + carrier).")
-            # One row per (client_name, agent_id); last occurrence wins (most recent status). Use normalized key.
+                return [], []
+
+            results: list = []
+            skipped: list[str] = []
+            if low_memory():
+                # One tab: months are read one after another on the signed-in page.
+                for label, first, last in windows:
+                    try:
+                        results.append(await scrape_month(page, label, first, last, agent_map))
+                    except Exception as e:
+                        results.append(e)
+            else:
+                # The signed-in page takes this month; every older month opens its own page in the same context.
+                pages = [page]
+                for _ in windows[1:]:
+                    extra = await context.new_page()
+                    if stealth_async:
+                        await stealth_async(extra)
+                    pages.append(extra)
+                results = await asyncio.gather(
+                    *(scrape_month(pg, label, first, last, agent_map) for pg, (label, first, last) in zip(pages, windows)),
+                    return_exceptions=True,
+                )
+            if isinstance(results[0], BaseException):
+                raise results[0]
+
+            # One row per (client_name, agent_id). Within a month the last occurrence wins (most recent
+            # status); across months only keys not already seen in a newer month are added.
             by_key: dict[tuple[str, str], dict] = {}
-            for r in this_month_policies:
-                by_key[_policy_key(r)] = r
-
-            if include_last_month:
-                await set_date_range(page, "last_month")
-                await page.wait_for_timeout(2000)
-                last_month_policies = await scrape_policies_table(page, agent_map)
-                log(f"  PolicyDen policies (Last Month): scraped {len(last_month_policies)} rows (valid agent + carrier).")
-                # Only add from last month if not already in this month (most recent = this month wins)
-                for r in last_month_policies:
-                    key = _policy_key(r)
-                    if key not in by_key:
-                        by_key[key] = r
-
-            policies = list(by_key.values())
-            raw_count = len(this_month_policies)
-            if include_last_month:
-                raw_count += len(last_month_policies)
-            before_dedupe = len(policies)
-            policies = _dedupe_policies(policies)
-            if raw_count > len(policies) or before_dedupe > len(policies):
+            raw_count = 0
+            for (label, _, _), month_policies in zip(windows, results):
+                if isinstance(month_policies, BaseException):
+                    log(f"  PolicyDen policies ({label}) failed: {month_policies}; skipping that month.")
+                    skipped.append(label)
+                    continue
+                raw_count += len(month_policies)
+                month_by_key = {_policy_key(r): r for r in month_policies}
+                for key, r in month_by_key.items():
+                    by_key.setdefault(key, r)
+            policies = _dedupe_policies(list(by_key.values()))
+            if raw_count > len(policies):
                 log(f"  PolicyDen policies: {raw_count} raw rows -> {len(policies)} unique (removed {raw_count - len(policies)} duplicate(s)).")
             else:
-                log(f"  PolicyDen policies: total {len(policies)} unique rows (this month + last month if first week).")
+                log(f"  PolicyDen policies: total {len(policies)} unique rows across {len(windows)} month(s).")
         except Exception as e:
             log(f"  PolicyDen policies scrape failed: {e}")
-            policies = []
+            policies, skipped = [], []
         finally:
             await browser.close()
-    return policies
-
-
-def api_login(session, base_url: str, username: str, password: str) -> bool:
-    r = request_with_retries(
-        session,
-        "post",
-        f"{base_url.rstrip('/')}/auth/login",
-        json={"username": username, "password": password},
-        timeout=15,
-        log_fn=log,
-    )
-    if r.status_code != 200:
-        log(f"  Login failed: {r.status_code} {r.text[:200]}")
-        return False
-    return True
-
-
-def api_get_audit_records(session, base_url: str) -> list[dict]:
-    r = request_with_retries(
-        session,
-        "get",
-        f"{base_url.rstrip('/')}/state/auditRecords",
-        timeout=30,
-        headers={"Cache-Control": "no-cache", "Pragma": "no-cache"},
-        log_fn=log,
-    )
-    if r.status_code != 200:
-        log(f"  GET /state/auditRecords failed: {r.status_code}")
-        return []
-    data = r.json()
-    return data.get("data", data) if isinstance(data, dict) else []
-
-
-def api_put_audit_records(session, base_url: str, records: list[dict]) -> bool:
-    r = request_with_retries(
-        session,
-        "put",
-        f"{base_url.rstrip('/')}/state/auditRecords",
-        json=records,
-        timeout=15,
-        log_fn=log,
-    )
-    if r.status_code != 200:
-        log(f"  PUT /state/auditRecords failed: {r.status_code} {r.text[:200]}")
-        return False
-    return True
-
-
-def api_set_last_policies_bot_run(session, base_url: str, timestamp_iso: str) -> bool:
-    r = request_with_retries(
-        session,
-        "post",
-        f"{base_url.rstrip('/')}/state/last-policies-bot-run",
-        json={"timestamp": timestamp_iso},
-        timeout=10,
-        log_fn=log,
-    )
-    if r.status_code != 200:
-        log(f"  POST /state/last-policies-bot-run failed: {r.status_code} {r.text[:200]}")
-        return False
-    return True
-
-
-def main() -> int:
-    return asyncio.run(main_async())
-
-
-async def main_async() -> int:
-    from datetime import datetime, timezone
-    from zoneinfo import ZoneInfo
-
-    load_dotenv()
-    bot_dir = Path(__file__).resolve().parent
-
-    api_base = os.environ.get("API_BASE_URL", "").strip()
-    if not api_base:
-        log("Set API_BASE_URL in .env")
-        return 1
-    if not api_base.startswith("http://") and not api_base.startswith("https://"):
-        api_base = "https://" + api_base
-    admin_user = os.environ.get("ADMIN_USERNAME", "").strip()
-    admin_pass = os.environ.get("ADMIN_PASSWORD", "").strip()
-    if not admin_user or not admin_pass:
-        log("Set ADMIN_USERNAME, ADMIN_PASSWORD in .env")
-        return 1
-
-    agent_map = load_agent_map(bot_dir)
-    if not agent_map:
-        log("agent_map.json not found or empty; exiting.")
-        return 1
-
-    tz = ZoneInfo(ZONE)
-    now = datetime.now(tz)
-    now_iso = now.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
-    current_month = now.strftime("%Y-%m")
-    first_week = now.day <= 7
-
-    log("Scraping PolicyDen /policies (this month, all statuses)" + (" + last month (first week)" if first_week else "") + "...")
-    auth_policyden = bot_dir / "auth_policyden.json"
-    policyden_user = os.environ.get("POLICYDEN_USERNAME", "").strip()
-    policyden_pass = os.environ.get("POLICYDEN_PASSWORD", "").strip()
-    scraped = await scrape_policyden_policies(
-        auth_policyden,
-        bot_dir,
-        agent_map,
-        policyden_user,
-        policyden_pass,
-        include_last_month=first_week,
-    )
+    return policies, skipped
 
-    import requests
-    session = requests.Session()
-    session.headers["Content-Type"] = "application/json"
-    if not api_login(session, api_base, admin_user, admin_pass):
-        return 1
 
-    existing = api_get_audit_records(session, api_base)
-    # Build a lookup of latest row per (clientName, agentId) while preserving full history in `existing`.
+def apply_scraped_policies(records: list[dict], scraped: list[dict], now_iso: str) -> tuple[list[dict], list[dict]]:
+    """
+    Add audit records for newly flagged policies and update statuses in place.
+    Returns (added_records, patches): the new records and, per updated existing record, {"id", changed fields}.
+    """
+    # Build a lookup of latest row per (clientName, agentId) while preserving full history in `records`.
     by_client_agent: dict[tuple[str, str], dict] = {}
-    for r in existing:
+    for r in records:
         key = (r.get("clientName", "").strip(), (r.get("agentId") or "").strip())
         if not key[0] and not key[1]:
             continue
@@ -432,8 +437,14 @@ async def main_async() -> int:
         if key not in by_client_agent or (existing_ts > (by_client_agent[key].get("discoveryTs") or "")):
             by_client_agent[key] = r
 
-    added = 0
-    updated = 0
+    added: list[dict] = []
+    patches: dict[str, dict] = {}
+
+    def patch(rec: dict, **fields) -> None:
+        rec.update(fields)
+        # Records added by this run are sent whole; only pre-existing ones need a patch.
+        if all(rec is not a for a in added):
+            patches.setdefault(rec["id"], {"id": rec["id"]}).update(fields)
 
     for row in scraped:
         client_name = row["client_name"].strip()
@@ -460,36 +471,177 @@ async def main_async() -> int:
                     "resolutionTs": None,
                     "notes": "",
                 }
-                existing.append(new_rec)
+                records.append(new_rec)
                 by_client_agent[key] = new_rec
-                added += 1
+                added.append(new_rec)
             else:
                 if rec.get("currentStatus") != status:
                     transition_note = f"Status changed: {rec.get('currentStatus')} -> {status}"
-                    rec["currentStatus"] = status
-                    rec["reason"] = f"PolicyDen: {'Pending CMS' if status == 'pending_cms' else 'Flagged'}"
-                    rec["resolutionTs"] = now_iso
-                    rec["notes"] = append_unique_status_transition_note(rec.get("notes"), transition_note)
-                    updated += 1
+                    patch(
+                        rec,
+                        currentStatus=status,
+                        reason=f"PolicyDen: {'Pending CMS' if status == 'pending_cms' else 'Flagged'}",
+                        resolutionTs=now_iso,
+                        notes=append_unique_status_transition_note(rec.get("notes"), transition_note),
+                    )
         elif status in POSITIVE_STATUSES:
             if rec is not None and rec.get("currentStatus") in ACTION_NEEDED_STATUSES:
                 transition_note = f"Status changed: {rec.get('currentStatus')} -> {status}"
-                rec["currentStatus"] = status
-                rec["resolutionTs"] = now_iso
-                rec["reason"] = f"PolicyDen: {status.replace('_', ' ').title()}"
-                rec["notes"] = append_unique_status_transition_note(rec.get("notes"), transition_note)
-                updated += 1
-
-    if added or updated:
-        if api_put_audit_records(session, api_base, existing):
-            log(f"Synced audit records: added {added}, updated {updated}.")
-        else:
-            return 1
-    if not api_set_last_policies_bot_run(session, api_base, now_iso):
-        log("ERROR: Failed to set last policies bot run timestamp. Check API_BASE_URL, ADMIN_USERNAME, ADMIN_PASSWORD.")
+                patch(
+                    rec,
+                    currentStatus=status,
+                    resolutionTs=now_iso,
+                    reason=f"PolicyDen: {status.replace('_', ' ').title()}",
+                    notes=append_unique_status_transition_note(rec.get("notes"), transition_note),
+                )
+    return added, list(patches.values())
+
+
+async def _login_and_get_audit_records(client, username: str, password: str) -> list[dict] | None:
+    if not await api_login(client, username, password):
+        return None
+    return await api_get_audit_records(client)
+
+
+def main() -> int:
+    return asyncio.run(main_async())
+
+
+async def main_async() -> int:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Sync audit records from PolicyDen /policies.")
+    parser.add_argument(
+        "--months",
+        type=int,
+        default=None,
+        help="Months to scan, this month first (default: 1, or 2 in the first week of the month; max 12 for audit rebuilds)",
+    )
+    args = parser.parse_args()
+    if args.months is not None and not 1 <= args.months <= 12:
+        log("--months must be between 1 and 12.")
+        return 1
+    bot_dir = Path(__file__).resolve().parent
+
+    api_base = os.environ.get("API_BASE_URL", "").strip()
+    if not api_base:
+        log("Set API_BASE_URL in .env")
+        return 1
+    if not api_base.startswith("http://") and not api_base.startswith("https://"):
+        api_base = "https://" + api_base
+    admin_user = os.environ.get("ADMIN_USERNAME", "").strip()
+    admin_pass = os.environ.get("ADMIN_PASSWORD", "").strip()
+    if not admin_user or not admin_pass:
+        log("Set ADMIN_USERNAME, ADMIN_PASSWORD in .env")
+        return 1
+
+    agent_map = load_agent_map(bot_dir)
+    if not agent_map:
+        log("agent_map.json not found or empty; exiting.")
+        return 1
+
+    async with create_api_client(api_base) as client:
+        return await sync_audit_records(
+            client,
+            bot_dir,
+            agent_map,
+            lambda: _login_and_get_audit_records(client, admin_user, admin_pass),
+            months=args.months,
+        )
+
+
+async def sync_audit_records(
+    client,
+    bot_dir: Path,
+    agent_map: dict,
+    load_records: Callable[[], Awaitable[list[dict] | None]],
+    months: int | None = None,
+) -> int:
+    """
+    Scrape PolicyDen /policies and push new and changed audit records on client. load_records returns the current
+    records (main_async logs in first; scheduler.py serves copies from its state cache) and runs while the browser
+    scrapes. months as for --months. A sync started while another runs joins it (run_lock.py). Returns exit code.
+    """
+    async with single_flight(bot_dir, "policies") as flight:
+        if flight.joined is not None:
+            return flight.joined
+        flight.code = await _sync_audit_records(client, bot_dir, agent_map, load_records, months)
+        return flight.code
+
+
+async def _sync_audit_records(
+    client,
+    bot_dir: Path,
+    agent_map: dict,
+    load_records: Callable[[], Awaitable[list[dict] | None]],
+    months: int | None,
+) -> int:
+    from datetime import datetime, timezone
+    from zoneinfo import ZoneInfo
+
+    now = datetime.now(ZoneInfo(ZONE))
+    now_iso = now.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    # Early in the month, last month's late status changes still matter.
+    months = months or (2 if now.day <= 7 else 1)
+
+    log(f"Scraping PolicyDen /policies ({'this month' if months == 1 else f'this month + {months - 1} before'}, all statuses)...")
+    auth_policyden = bot_dir / "auth_policyden.json"
+    policyden_user = os.environ.get("POLICYDEN_USERNAME", "").strip()
+    policyden_pass = os.environ.get("POLICYDEN_PASSWORD", "").strip()
+    # Load audit records while the browser scrapes, so API I/O overlaps with Playwright work.
+    existing_task = asyncio.create_task(load_records())
+    try:
+        with log_phase("scrape", site="policyden") as record:
+            async with sample_browser_memory("PolicyDen policies") as memory:
+                scraped, skipped = await scrape_policyden_policies(
+                    auth_policyden,
+                    bot_dir,
+                    agent_map,
+                    policyden_user,
+                    policyden_pass,
+                    months=months,
+                    today=now.date(),
+                )
+            record.update(
+                outcome="ok" if scraped else "empty", rows=len(scraped), months=months,
+                skipped_months=skipped, browser_peak_mb=round(memory.peak_mb),
+            )
+    except BaseException:
+        existing_task.cancel()
+        raise
+
+    existing = await existing_task
+    if existing is None:
         return 1
-    if not added and not updated:
+    added: list[dict] = []
+    patches: list[dict] = []
+
+    def sync_operations(current: dict[str, list]) -> list[dict]:
+        # Re-run against the fresh list if auditRecords changed since it was read (compare-and-swap).
+        nonlocal added, patches
+        added, patches = apply_scraped_policies(current["auditRecords"], scraped, now_iso)
+        operations = []
+        if added:
+            operations.append(batch_upsert("auditRecords", added))
+        if patches:
+            operations.append(batch_patch("auditRecords", patches))
+        operations.append(batch_set_last_policies_bot_run(now_iso))
+        return operations
+
+    # Only new records and changed fields are sent, together with the run timestamp, in one transaction.
+    with log_phase("sync") as record:
+        synced = await api_batch_update(client, ("auditRecords",), sync_operations, {"auditRecords": existing})
+        record.update(outcome="ok" if synced else "failed", added=len(added), updated=len(patches))
+    if not synced:
+        log("ERROR: Failed to sync audit records. Check API_BASE_URL, ADMIN_USERNAME, ADMIN_PASSWORD.")
+        return 1
+    if added or patches:
+        log(f"Synced audit records: added {len(added)}, updated {len(patches)}.")
+    else:
         log("No audit record changes to push.")
+    if skipped:
+        # The other months are synced, but a rebuild that missed a month is not complete: exit non-zero.
+        log(f"ERROR: {len(skipped)} month(s) could not be scraped and were left out: {', '.join(skipped)}.")
+        return 1
     return 0
 
 
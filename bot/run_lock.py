@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Single-flight locks shared by main.py, eod.py, policies_bot.py, backfill.py and backfill_headed.py
+(and scheduler.py, which runs the same functions in one process).
+
+- Job lock (.lock-<job>): one run of a job at a time. A run that finds its job already running
+  joins it: it waits for that run to finish and returns its exit code instead of scraping again
+  (e.g. a cron tick at 9:15 PM and eod.py's own tick). Backfills skip instead (join=False), since
+  two backfills are rarely for the same dates.
+- Browser lock (.lock-browser): one job with Chromium open at a time, so different jobs queue
+  instead of competing for memory and CPU. A tick waits at most BOT_LOCK_WAIT_SECONDS (default 240)
+  and then skips, since the next tick is only minutes away. Other jobs wait as long as it takes.
+
+Locks are flock()s on files in the bot dir, so the kernel releases them if a process dies. Every
+wait is logged with its duration and the run holding the lock. Each flight is also one run in the
+JSON run log (run_log.py), with its outcome and time spent waiting for locks.
+
+Usage:
+    async with single_flight(bot_dir, "tick", browser_wait=lock_wait_seconds()) as flight:
+        if flight.joined is not None:
+            return flight.joined
+        if flight.skipped:
+            return 0
+        flight.code = await run()
+        return flight.code
+"""
+
+import asyncio
+import fcntl
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator
+
+from run_log import finish, run_context
+
+BROWSER_LOCK_FILE = ".lock-browser"
+LOCK_WAIT_SECONDS_DEFAULT = 240.0
+POLL_SECONDS = 0.5
+
+
+def log(msg: str) -> None:
+    print(msg, flush=True)
+
+
+def lock_wait_seconds() -> float:
+    """How long a tick waits for the browser (BOT_LOCK_WAIT_SECONDS)."""
+    try:
+        return float(os.environ.get("BOT_LOCK_WAIT_SECONDS") or LOCK_WAIT_SECONDS_DEFAULT)
+    except ValueError:
+        return LOCK_WAIT_SECONDS_DEFAULT
+
+
+@dataclass
+class Flight:
+    job: str
+    # Exit code of the run in progress that this one joined (None: this one runs).
+    joined: int | None = None
+    # True when this run should not start (job or browser busy); nothing was run.
+    skipped: bool = False
+    # Set by the caller to its exit code; recorded for runs that join this one.
+    code: int | None = None
+
+
+def _open(path: Path) -> int:
+    return os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+
+def _try_lock(fd: int) -> bool:
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+
+async def _wait_lock(fd: int, timeout: float | None) -> bool:
+    """Poll for the lock (cancellable, unlike a blocking flock in a thread). False on timeout."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while not _try_lock(fd):
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(POLL_SECONDS)
+    return True
+
+
+def _read(fd: int) -> dict:
+    try:
+        data = json.loads(os.pread(fd, 4096, 0) or b"{}")
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _write(fd: int, data: dict) -> None:
+    payload = json.dumps(data).encode()
+    os.ftruncate(fd, 0)
+    os.pwrite(fd, payload, 0)
+
+
+def _holder(data: dict) -> str:
+    if not data.get("job"):
+        return "unknown run"
+    age = time.time() - float(data.get("startedAt") or time.time())
+    return f"{data['job']} pid {data.get('pid')}, running {age:.0f}s"
+
+
+@asynccontextmanager
+async def single_flight(
+    bot_dir: Path,
+    job: str,
+    join: bool = True,
+    browser: bool = True,
+    browser_wait: float | None = None,
+) -> AsyncIterator[Flight]:
+    """
+    Hold job's lock (and the browser lock if browser) for the body. If job is already running, the flight
+    joins it (join) or is skipped; if the browser is still busy after browser_wait seconds it is skipped.
+    """
+    flight = Flight(job)
+    requested = time.time()
+    job_fd = _open(bot_dir / f".lock-{job}")
+    browser_fd = None
+    with run_context(job) as run:
+        try:
+            if not _try_lock(job_fd):
+                holder = _holder(_read(job_fd))
+                if not join:
+                    log(f"  Lock: {job} already running ({holder}); skipping.")
+                    flight.skipped = True
+                    run.fields.update(outcome="skipped", reason="job running")
+                    yield flight
+                    return
+                log(f"  Lock: {job} already running ({holder}); joining it.")
+                await _wait_lock(job_fd, None)
+                last = _read(job_fd)
+                waited = time.time() - requested
+                if float(last.get("finishedAt") or 0) >= requested:
+                    flight.joined = int(last.get("code") or 0)
+                    log(f"  Lock: joined the {job} run in progress; waited {waited:.1f}s (exit code {flight.joined}).")
+                    run.fields.update(outcome="joined", exit_code=flight.joined, lock_wait_ms=round(waited * 1000))
+                    yield flight
+                    return
+                log(f"  Lock: waited {waited:.1f}s for {job}; the previous run did not finish cleanly, running again.")
+
+            record = {"job": job, "pid": os.getpid(), "startedAt": time.time(), "finishedAt": None, "code": None}
+            _write(job_fd, record)
+            if browser:
+                browser_fd = _open(bot_dir / BROWSER_LOCK_FILE)
+                if not _try_lock(browser_fd):
+                    limit = "" if browser_wait is None else f" (up to {browser_wait:.0f}s)"
+                    log(f"  Lock: browser in use by {_holder(_read(browser_fd))}; {job} waiting{limit}...")
+                    wait_started = time.time()
+                    if not await _wait_lock(browser_fd, browser_wait):
+                        log(f"  Lock: browser still in use after {browser_wait:.0f}s; skipping {job}.")
+                        # Runs that joined this one skip too.
+                        record.update(finishedAt=time.time(), code=0)
+                        _write(job_fd, record)
+                        flight.skipped = True
+                        run.fields.update(
+                            outcome="skipped", reason="browser busy", lock_wait_ms=round((time.time() - requested) * 1000)
+                        )
+                        yield flight
+                        return
+                    log(f"  Lock: waited {time.time() - wait_started:.1f}s for the browser.")
+                _write(browser_fd, {"job": job, "pid": os.getpid(), "startedAt": time.time()})
+            run.fields["lock_wait_ms"] = round((time.time() - requested) * 1000)
+
+            try:
+                yield flight
+            finally:
+                record.update(finishedAt=time.time(), code=1 if flight.code is None else flight.code)
+                _write(job_fd, record)
+                finish(run, record["code"])
+        finally:
+            # Closing the descriptors releases the locks.
+            if browser_fd is not None:
+                os.close(browser_fd)
+            os.close(job_fd)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Optional JSON-lines run log, next to the free-text log() output. Set BOT_JSON_LOG to a file path
+(relative paths are in the bot dir, e.g. BOT_JSON_LOG=runs.jsonl) to turn it on.
+
+One record per line:
+    {"ts": "2025-03-03T14:05:02.113Z", "run_id": "3f9c0a7e51b2", "job": "tick", "site": "policyden",
+     "phase": "scrape", "duration_ms": 18422, "outcome": "ok", "rows": 14, "browser_peak_mb": 301}
+Every run (run_lock.single_flight: tick, eod, policies, backfill; eod.py's freeze-backfill and
+set-marketing) ends with a "run" record carrying its outcome (ok, failed, error, joined, skipped),
+exit_code and lock_wait_ms. Phases inside it (scrape, write, freeze, sync, date, chunk) share its
+run_id. A tick started by an EOD run has parent_run_id set.
+
+The file rotates at BOT_JSON_LOG_MAX_MB (default 10) and keeps BOT_JSON_LOG_BACKUPS old files (default
+5: runs.jsonl.1 is the newest). Rotation and appends happen under a flock on <file>.lock, so runs
+that overlap (cron, scheduler, backfills) never write to a file that is being renamed.
+
+    jq -c 'select(.phase == "run" and .job == "tick") | [.ts, .duration_ms, .outcome]' runs.jsonl*
+"""
+
+import contextvars
+import fcntl
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator
+
+MAX_MB_DEFAULT = 10.0
+BACKUPS_DEFAULT = 5
+
+_current: contextvars.ContextVar["Run | None"] = contextvars.ContextVar("run_log_current", default=None)
+_warned = False
+
+
+def log(msg: str) -> None:
+    print(msg, flush=True)
+
+
+@dataclass
+class Run:
+    job: str
+    run_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    parent_run_id: str | None = None
+    # Fields of the final "run" record (outcome, exit_code, lock_wait_ms, ...).
+    fields: dict[str, Any] = field(default_factory=dict)
+
+
+def _log_path() -> Path | None:
+    raw = os.environ.get("BOT_JSON_LOG", "").strip()
+    if not raw:
+        return None
+    path = Path(raw).expanduser()
+    return path if path.is_absolute() else Path(__file__).resolve().parent / path
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name) or default)
+    except ValueError:
+        return default
+
+
+def _rotate(path: Path, backups: int) -> None:
+    if backups < 1:
+        path.unlink(missing_ok=True)
+        return
+    for i in range(backups - 1, 0, -1):
+        older = path.with_name(f"{path.name}.{i}")
+        if older.exists():
+            os.replace(older, path.with_name(f"{path.name}.{i + 1}"))
+    os.replace(path, path.with_name(f"{path.name}.1"))
+
+
+def _append(path: Path, line: str) -> None:
+    data = line.encode()
+    max_bytes = _env_number("BOT_JSON_LOG_MAX_MB", MAX_MB_DEFAULT) * 1024 * 1024
+    backups = int(_env_number("BOT_JSON_LOG_BACKUPS", BACKUPS_DEFAULT))
+    lock_fd = os.open(path.with_name(path.name + ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            size = 0
+        if size and size + len(data) > max_bytes:
+            _rotate(path, backups)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+    finally:
+        os.close(lock_fd)
+
+
+def emit(phase: str, site: str | None = None, **fields: Any) -> None:
+    """Write one record for the current run (no-op unless BOT_JSON_LOG is set). Never raises."""
+    global _warned
+    path = _log_path()
+    if path is None:
+        return
+    run = _current.get()
+    record = {
+        "ts": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z",
+        "run_id": run.run_id if run else None,
+        "job": run.job if run else None,
+        "site": site,
+        "phase": phase,
+        **fields,
+    }
+    if run and run.parent_run_id:
+        record["parent_run_id"] = run.parent_run_id
+    try:
+        _append(path, json.dumps(record, default=str) + "\n")
+    except OSError as e:
+        if not _warned:
+            log(f"  Could not write JSON log {path}: {e}")
+            _warned = True
+
+
+@contextmanager
+def run_context(job: str) -> Iterator[Run]:
+    """Make a new run of job current for the block; its "run" record (with run.fields) is written at the end."""
+    parent = _current.get()
+    run = Run(job, parent_run_id=parent.run_id if parent else None)
+    token = _current.set(run)
+    started = time.monotonic()
+    try:
+        yield run
+    except BaseException as e:
+        run.fields.update(outcome="error", error=repr(e))
+        raise
+    finally:
+        emit("run", duration_ms=round((time.monotonic() - started) * 1000), **run.fields)
+        _current.reset(token)
+
+
+def finish(run: Run, code: int) -> int:
+    """Record exit code (and ok/failed) as run's outcome; returns code."""
+    run.fields.update(outcome="ok" if code == 0 else "failed", exit_code=code)
+    return code
+
+
+@contextmanager
+def log_phase(phase: str, site: str | None = None) -> Iterator[dict]:
+    """Time the block and emit one record for it; the caller adds outcome and row counts to the yielded dict."""
+    fields: dict[str, Any] = {}
+    started = time.monotonic()
+    try:
+        yield fields
+    except BaseException as e:
+        fields.update(outcome="error", error=repr(e))
+        raise
+    finally:
+        fields.setdefault("outcome", "ok")
+        emit(phase, site=site, duration_ms=round((time.monotonic() - started) * 1000), **fields)
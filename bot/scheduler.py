@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Resident scheduler: one long-running process that runs the bot's jobs in place of the cron lines.
+
+- tick      main.py's scrape-and-push every BOT_TICK_MINUTES (default 5, on the clock: :00, :05, ...)
+            from 9 AM through the 9 PM hour EST, Monday to Friday. BOT_TICK_MINUTES_POLICYDEN and
+            BOT_TICK_MINUTES_WEGENERATE give a site its own interval; the sites then tick separately
+            and each writes only its own fields. With BOT_CADENCE=adaptive each site's interval follows
+            how often its numbers change instead (see cadence.py).
+- eod       eod.py's tick + freeze of today at 9:15 PM EST, Monday to Friday.
+- policies  policies_bot.py's audit record sync at 9 AM EST every day.
+
+Every job runs in its own loop, so a job never overlaps itself: a run that takes longer than its
+interval is logged and the due times it missed are skipped, not queued. All jobs share one API
+client (keep-alive pool), one login and a StateCache fed by /state/stream, so a tick reads agents
+and snapshots from memory instead of GET /state. Each run still opens its own browsers.
+
+SIGTERM or SIGINT stops scheduling; runs in progress get BOT_SHUTDOWN_GRACE_SECONDS (default 300)
+to finish before they are cancelled.
+
+Usage:
+    ./venv/bin/python scheduler.py
+"""
+
+import asyncio
+import os
+import signal
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable
+from zoneinfo import ZoneInfo
+
+from dotenv import load_dotenv
+
+from api_client import api_login, create_api_client
+from cadence import BOUNDARY_MINUTES_DEFAULT, MAX_MINUTES_DEFAULT, MIN_MINUTES_DEFAULT, AdaptiveCadence
+from eod import run_eod
+from http_retry import new_retry_budget
+from main import SITES, SLOT_CONFIG, in_scraping_window, load_agent_map, run_tick
+from policies_bot import sync_audit_records
+from state_cache import StateCache
+
+ZONE = "America/New_York"
+TICK_MINUTES_DEFAULT = 5
+SHUTDOWN_GRACE_SECONDS_DEFAULT = 300.0
+# Sleep in short steps so clock changes (DST, NTP, suspend) are noticed.
+MAX_SLEEP_SECONDS = 60.0
+
+
+def log(msg: str) -> None:
+    print(msg, flush=True)
+
+
+@dataclass
+class Job:
+    name: str
+    next_due: Callable[[datetime], datetime]
+    run: Callable[[], Awaitable[int]]
+
+
+def next_tick(now: datetime, minutes: int) -> datetime:
+    """First minutes-aligned time after now inside the scraping window (9 AM–9:59 PM EST, Mon–Fri)."""
+    due = now.replace(minute=now.minute - now.minute % minutes, second=0, microsecond=0) + timedelta(minutes=minutes)
+    return in_window(due)
+
+
+def in_window(due: datetime) -> datetime:
+    """due if it is inside the scraping window, else the window's next opening (9 AM on a weekday)."""
+    if in_scraping_window(due):
+        return due
+    day = due if due.hour < 9 else due + timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return day.replace(hour=9, minute=0, second=0, microsecond=0)
+
+
+def next_daily(now: datetime, hour: int, minute: int, weekdays_only: bool = False) -> datetime:
+    """First hour:minute after now (Monday to Friday only with weekdays_only)."""
+    due = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if due <= now:
+        due += timedelta(days=1)
+    while weekdays_only and due.weekday() >= 5:
+        due += timedelta(days=1)
+    return due
+
+
+async def sleep_until(due: datetime, stop: asyncio.Event) -> bool:
+    """Wait until due (wall clock). Returns False if stop was set first."""
+    while True:
+        remaining = due.timestamp() - time.time()
+        if remaining <= 0:
+            return True
+        try:
+            await asyncio.wait_for(stop.wait(), min(remaining, MAX_SLEEP_SECONDS))
+            return False
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_job(job: Job, stop: asyncio.Event) -> None:
+    tz = ZoneInfo(ZONE)
+    while not stop.is_set():
+        due = job.next_due(datetime.now(tz))
+        if not await sleep_until(due, stop):
+            return
+        log(f"[{job.name}] Starting run due {due:%Y-%m-%d %H:%M}.")
+        # Each run gets the retry budget a cron run of the same script would have.
+        new_retry_budget()
+        started = time.monotonic()
+        try:
+            code = await job.run()
+        except Exception as e:
+            log(f"[{job.name}] Run failed: {e!r}")
+            code = 1
+        elapsed = time.monotonic() - started
+        log(f"[{job.name}] Finished with exit code {code} in {elapsed:.1f}s.")
+        following = job.next_due(due)
+        if datetime.now(tz) > following:
+            log(f"[{job.name}] Run overran the next due time ({following:%H:%M}); skipping missed runs.")
+
+
+def main() -> int:
+    return asyncio.run(main_async())
+
+
+async def main_async() -> int:
+    load_dotenv()
+    bot_dir = Path(__file__).resolve().parent
+
+    api_base = os.environ.get("API_BASE_URL", "").strip()
+    if not api_base:
+        log("Set API_BASE_URL in .env")
+        return 1
+    if not api_base.startswith("http://") and not api_base.startswith("https://"):
+        api_base = "https://" + api_base
+    admin_user = os.environ.get("ADMIN_USERNAME", "").strip()
+    admin_pass = os.environ.get("ADMIN_PASSWORD", "").strip()
+    if not admin_user or not admin_pass:
+        log("Set ADMIN_USERNAME, ADMIN_PASSWORD in .env")
+        return 1
+    try:
+        tick_minutes = int(os.environ.get("BOT_TICK_MINUTES") or TICK_MINUTES_DEFAULT)
+        site_minutes = {
+            site: int(os.environ.get(f"BOT_TICK_MINUTES_{site.upper()}") or tick_minutes) for site in SITES
+        }
+        grace = float(os.environ.get("BOT_SHUTDOWN_GRACE_SECONDS") or SHUTDOWN_GRACE_SECONDS_DEFAULT)
+        min_minutes = float(os.environ.get("BOT_CADENCE_MIN_MINUTES") or MIN_MINUTES_DEFAULT)
+        max_minutes = float(os.environ.get("BOT_CADENCE_MAX_MINUTES") or MAX_MINUTES_DEFAULT)
+        boundary_minutes = float(os.environ.get("BOT_CADENCE_BOUNDARY_MINUTES") or BOUNDARY_MINUTES_DEFAULT)
+    except ValueError:
+        log("BOT_TICK_MINUTES*, BOT_SHUTDOWN_GRACE_SECONDS and BOT_CADENCE_*_MINUTES must be numbers.")
+        return 1
+    if any(not 1 <= minutes <= 60 or 60 % minutes for minutes in site_minutes.values()):
+        log("BOT_TICK_MINUTES (and BOT_TICK_MINUTES_POLICYDEN / _WEGENERATE) must divide 60 (1, 2, 3, 4, 5, 6, 10, 12, 15, 20, 30 or 60).")
+        return 1
+    cadence = None
+    if os.environ.get("BOT_CADENCE", "").strip().lower() == "adaptive":
+        if not 1 <= min_minutes <= max_minutes:
+            log("BOT_CADENCE_MIN_MINUTES must be at least 1 and at most BOT_CADENCE_MAX_MINUTES.")
+            return 1
+        cadence = AdaptiveCadence(
+            [slot["minute_of_day"] for slot in SLOT_CONFIG], min_minutes, max_minutes, boundary_minutes
+        )
+        log(f"Adaptive cadence: every {min_minutes:g}–{max_minutes:g} min, {min_minutes:g} min near slot boundaries.")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    async with create_api_client(api_base) as client:
+        if not await api_login(client, admin_user, admin_pass):
+            return 1
+        async with StateCache(client) as cache:
+
+            async def load_state() -> dict | None:
+                return await cache.get_many(("agents", "snapshots"))
+
+            async def load_audit_records() -> list[dict] | None:
+                rows = await cache.get("auditRecords")
+                # apply_scraped_policies updates records in place; keep the cached rows as the server has them.
+                return None if rows is None else [dict(r) for r in rows]
+
+            def tick_job(sites: tuple[str, ...]) -> Job:
+                async def tick() -> int:
+                    code, state = await run_tick(
+                        client, bot_dir, load_state, cadence.observe if cadence else None, sites
+                    )
+                    if state is not None:
+                        cache.put("snapshots", state["snapshots"])
+                    return code
+
+                def tick_due(now: datetime) -> datetime:
+                    if cadence is not None:
+                        return in_window(cadence.next_due(now, sites))
+                    return next_tick(now, min(site_minutes[site] for site in sites))
+
+                return Job("tick" if sites == SITES else f"tick-{sites[0]}", tick_due, tick)
+
+            async def eod() -> int:
+                return await run_eod(client, bot_dir, load_state)
+
+            async def policies() -> int:
+                agent_map = load_agent_map(bot_dir)
+                if not agent_map:
+                    log("agent_map.json not found or empty; skipping policies sync.")
+                    return 1
+                return await sync_audit_records(client, bot_dir, agent_map, load_audit_records)
+
+            # Each site gets its own tick when their cadences differ; otherwise one tick scrapes both.
+            if cadence is not None or len(set(site_minutes.values())) > 1:
+                jobs = [tick_job((site,)) for site in SITES]
+            else:
+                jobs = [tick_job(SITES)]
+            jobs += [
+                Job("eod", lambda now: next_daily(now, 21, 15, weekdays_only=True), eod),
+                Job("policies", lambda now: next_daily(now, 9, 0), policies),
+            ]
+            tz = ZoneInfo(ZONE)
+            now = datetime.now(tz)
+            for job in jobs:
+                log(f"Scheduled {job.name}: next run {job.next_due(now):%a %Y-%m-%d %H:%M} EST.")
+            tasks = [asyncio.create_task(run_job(job, stop)) for job in jobs]
+
+            await stop.wait()
+            log(f"Stopping: waiting up to {grace:.0f}s for running jobs to finish...")
+            _, pending = await asyncio.wait(tasks, timeout=grace)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            if pending:
+                log(f"Cancelled {len(pending)} job(s) still running after {grace:.0f}s.")
+    log("Scheduler stopped.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
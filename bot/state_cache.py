@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+In-memory copies of API collections kept current by the server's SSE feed (GET /state/stream).
+For long-running bot processes (several jobs sharing one API client).
+
+Each `state-updated` event names the resources that changed (`resources`, or `resource` from
+older servers); only those collections are marked stale and re-fetched with GET /state/:key on
+their next read. Everything else is served from memory. While the stream is down every read
+goes to the API, and after a reconnect all collections are re-fetched once, since events may
+have been missed in between.
+
+Usage:
+    async with StateCache(client) as cache:
+        agents = await cache.get("agents")
+"""
+
+import asyncio
+import json
+from typing import Any, Iterable
+
+import httpx
+
+from api_client import api_get_collection, api_open_state_stream, log
+
+DEFAULT_KEYS = ("agents", "snapshots", "auditRecords")
+# The server sends a comment ping every 25s; a silent minute means the connection is dead.
+SSE_READ_TIMEOUT_SECONDS = 60.0
+SSE_CONNECT_WAIT_SECONDS = 10.0
+SSE_RECONNECT_MAX_SECONDS = 60.0
+
+
+class StateCache:
+    """Local copies of keys, invalidated per collection by /state/stream events."""
+
+    def __init__(self, client: httpx.AsyncClient, keys: Iterable[str] = DEFAULT_KEYS) -> None:
+        self.client = client
+        self.keys = tuple(keys)
+        self._rows: dict[str, list] = {}
+        self._stale: set[str] = set(self.keys)
+        self._connected = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def __aenter__(self) -> "StateCache":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        """Start listening; waits briefly for the stream so the first reads can already be cached."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+        try:
+            await asyncio.wait_for(self._connected.wait(), SSE_CONNECT_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            log("  State stream not connected yet; reading from the API until it is.")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._connected.clear()
+
+    async def get(self, key: str) -> list | None:
+        """Rows of key from memory, re-fetched first if stale (or uncached). None if the fetch failed."""
+        if key in self._rows and key not in self._stale and self._connected.is_set():
+            return self._rows[key]
+        # Clear the flag before fetching: an event arriving mid-fetch marks the key stale again.
+        self._stale.discard(key)
+        rows = await api_get_collection(self.client, key)
+        if rows is None:
+            self._stale.add(key)
+            return None
+        self._rows[key] = rows
+        return rows
+
+    async def get_many(self, keys: Iterable[str]) -> dict[str, list] | None:
+        """{key: rows} for keys, fetching the stale ones concurrently. None if any fetch failed."""
+        keys = tuple(keys)
+        results = await asyncio.gather(*(self.get(key) for key in keys))
+        if any(rows is None for rows in results):
+            return None
+        return dict(zip(keys, results))
+
+    def put(self, key: str, rows: list) -> None:
+        """Store rows this process just wrote (the server's echo event will still trigger one re-fetch)."""
+        self._rows[key] = rows
+
+    def invalidate(self, *keys: str) -> None:
+        self._stale.update(keys or self.keys)
+
+    def _handle_event(self, event: str, data: str) -> None:
+        if event == "connected":
+            # Anything may have changed while we were disconnected.
+            self.invalidate()
+            self._connected.set()
+            return
+        if event != "state-updated":
+            return
+        try:
+            payload = json.loads(data)
+        except ValueError:
+            self.invalidate()
+            return
+        resources = payload.get("resources") or [payload.get("resource")]
+        changed = [key for key in self.keys if key in resources]
+        if changed:
+            self._stale.update(changed)
+
+    async def _listen(self) -> None:
+        attempt = 0
+        while True:
+            try:
+                r = await api_open_state_stream(self.client, SSE_READ_TIMEOUT_SECONDS)
+                try:
+                    if r.status_code != 200:
+                        log(f"  GET /state/stream failed: {r.status_code}")
+                    else:
+                        attempt = 0
+                        event, data = "message", []
+                        async for line in r.aiter_lines():
+                            if line == "":
+                                if data:
+                                    self._handle_event(event, "\n".join(data))
+                                event, data = "message", []
+                            elif line.startswith(":"):
+                                continue
+                            elif line.startswith("event:"):
+                                event = line[6:].strip()
+                            elif line.startswith("data:"):
+                                data.append(line[5:].lstrip())
+                finally:
+                    await r.aclose()
+            except httpx.HTTPError as e:
+                log(f"  State stream dropped: {e!r}")
+            self._connected.clear()
+            self.invalidate()
+            delay = min(SSE_RECONNECT_MAX_SECONDS, 2 ** attempt)
+            attempt += 1
+            await asyncio.sleep(delay)
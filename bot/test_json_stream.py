@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for json_stream.py: python -m pytest bot
+"""
+
+import asyncio
+import json
+import unittest
+
+from json_stream import iter_members
+
+BODY = json.dumps({
+    "data": {
+        "agents": [{"id": "a1", "name": "Ann", "active": True}, {"id": "a2", "name": "Bo", "active": False}],
+        "skipped": [{"v": 12.5e-3}, -7, None, "x\\\"y"],
+        "snapshots": [
+            {"agentId": "a1", "sales": 3, "marketing": 1.5, "cpa": 1e3, "big": -2.25E+10, "none": None},
+            {"agentId": "a2", "sales": 10, "marketing": 1234.0625, "cpa": 0.0, "flag": False},
+        ],
+        "count": 42,
+        "ratio": 0.875,
+    },
+    "meta": {"version": 1.25},
+})
+
+
+async def _chunks(parts: list[str]):
+    for part in parts:
+        yield part
+
+
+def _read(parts: list[str], keys=None) -> tuple[dict, dict]:
+    async def run() -> tuple[dict, dict]:
+        extra = {"meta": None}
+        members = {name: value async for name, value in iter_members(_chunks(parts), keys, extra=extra)}
+        return members, extra
+
+    return asyncio.run(run())
+
+
+class IterMembersTest(unittest.TestCase):
+    def test_split_at_every_offset(self):
+        expected = json.loads(BODY)
+        for i in range(len(BODY) + 1):
+            with self.subTest(offset=i, around=BODY[max(0, i - 3):i + 3]):
+                members, extra = _read([BODY[:i], BODY[i:]])
+                self.assertEqual(members, expected["data"])
+                self.assertEqual(extra["meta"], expected["meta"])
+
+    def test_split_at_every_offset_with_skipped_members(self):
+        expected = json.loads(BODY)["data"]
+        keys = ("snapshots", "ratio")
+        for i in range(len(BODY) + 1):
+            with self.subTest(offset=i):
+                members, _ = _read([BODY[:i], BODY[i:]], keys)
+                self.assertEqual(members, {key: expected[key] for key in keys})
+
+    def test_one_character_chunks(self):
+        members, extra = _read(list(BODY))
+        self.assertEqual(members, json.loads(BODY)["data"])
+        self.assertEqual(extra["meta"], {"version": 1.25})
+
+    def test_number_split_before_fraction_and_exponent(self):
+        for parts in (['{"data":{"a":[1.', '5]}}'], ['{"data":{"a":[1e', '3]}}'], ['{"data":{"a":[1', '.5e-', '1]}}']):
+            with self.subTest(parts=parts):
+                members, _ = _read(parts)
+                self.assertEqual(members, {"a": [json.loads("".join(parts))["data"]["a"][0]]})
+
+    def test_truncated_body_raises(self):
+        with self.assertRaises(ValueError):
+            _read([BODY[:-3]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests for main.py's tick write: python -m pytest bot
+"""
+
+import asyncio
+import json
+
+import main
+
+DATE_KEY = "2026-03-02"
+SLOT = ("13:00", "1:00 PM")
+AGENTS = [
+    {"id": "a1", "name": "Ann", "active": True},
+    {"id": "a2", "name": "Bo", "active": True},
+    {"id": "a3", "name": "Cy", "active": False},
+]
+# Cy is inactive (and unmapped) but still has a row in the slot; ticks never write it.
+CY_ROW = {
+    "id": "snap_cy", "dateKey": DATE_KEY, "slot": SLOT[0], "slotLabel": SLOT[1], "agentId": "a3",
+    "billableCalls": 2, "sales": 1, "marketing": 40, "updatedAt": "2026-03-02T15:00:00.000Z",
+}
+
+
+def _as_served(rows: list) -> list:
+    """The rows as GET /state returns them: JSON from Node, where 201.0 is written as 201."""
+    def whole(value):
+        return int(value) if isinstance(value, float) and value.is_integer() else value
+
+    return json.loads(json.dumps([{k: whole(v) for k, v in row.items()} for row in rows]))
+
+
+class FakeServer:
+    def __init__(self):
+        self.snapshots = [CY_ROW]
+        self.batches: list[list[dict]] = []
+
+    async def load_state(self) -> dict:
+        return {"agents": AGENTS, "snapshots": _as_served(self.snapshots)}
+
+    async def batch_update(self, client, collections, build, current=None) -> bool:
+        self.batches.append(build(current))
+        return True
+
+
+def _tick(monkeypatch, tmp_path, server: FakeServer, sales: dict, marketing: dict) -> int:
+    async def scrapes(*args):
+        return sales, {"Ann": 10, "Bo": 4}, marketing, 300.0
+
+    monkeypatch.setattr(main, "_run_scrapes_async", scrapes)
+    code, state = asyncio.run(main._run_tick(None, tmp_path, server.load_state, None, main.SITES))
+    if state is not None:
+        server.snapshots = state["snapshots"]
+    return code
+
+
+def test_unchanged_tick_skips_push_and_changed_tick_pushes(monkeypatch, tmp_path):
+    (tmp_path / "agent_map.json").write_text(json.dumps({"Ann": "a1", "Bo": "a2"}))
+    monkeypatch.setattr(main, "get_date_key_est", lambda: DATE_KEY)
+    monkeypatch.setattr(main, "get_current_slot", lambda: SLOT)
+    monkeypatch.delenv("BOT_HEARTBEAT_MINUTES", raising=False)
+    server = FakeServer()
+    monkeypatch.setattr(main, "api_batch_update", server.batch_update)
+    marketing = {"Ann": 201.0, "Bo": 55.5}
+
+    assert _tick(monkeypatch, tmp_path, server, {"Ann": 3, "Bo": 1}, marketing) == 0
+    assert len(server.batches) == 1
+
+    assert _tick(monkeypatch, tmp_path, server, {"Ann": 3, "Bo": 1}, marketing) == 0
+    assert len(server.batches) == 1
+
+    assert _tick(monkeypatch, tmp_path, server, {"Ann": 4, "Bo": 1}, marketing) == 0
+    assert len(server.batches) == 2
+
+
+def test_fingerprint_ignores_number_type():
+    scraped = [{"agentId": "a1", "sales": 3, "billableCalls": 10, "marketing": 201.0}]
+    served = [{"agentId": "a1", "sales": 3.0, "billableCalls": 10, "marketing": 201}]
+    for site in main.SITES:
+        assert main.snapshot_fingerprint(scraped, 300.0, site) == main.snapshot_fingerprint(served, 300, site)
+    assert main.snapshot_fingerprint([{**scraped[0], "marketing": None}], None, "wegenerate") != (
+        main.snapshot_fingerprint(scraped, None, "wegenerate")
+    )
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tests for metrics.py against the per-row Python it replaced in eod.py: python -m pytest bot
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from metrics import frozen_metrics, rescale_marketing, to_optional, totals_by_date
+
+
+def per_row_metrics(calls: int, sales: int, marketing: float | None) -> tuple:
+    """eod.compute_metrics before metrics.py."""
+    if marketing is None:
+        marketing = calls * 15
+    cpa = (marketing / sales) if sales > 0 else None
+    cvr = (sales / calls) if calls > 0 else None
+    return marketing, cpa, cvr
+
+
+def per_row_rescale(marketing: float, sales: int, scale: float) -> tuple:
+    """eod.py's --set-marketing loop before metrics.py."""
+    m = round(float(marketing or 0) * scale, 2)
+    return m, round(m / float(sales or 0), 4) if sales > 0 else None
+
+
+def _rows(seed: int, n: int = 400) -> list[tuple[int, int, float | None]]:
+    rng = random.Random(seed)
+    rows = [
+        (0, 0, None), (0, 0, 0.0), (12, 0, 0.0), (0, 3, 0.0), (7, 0, None), (0, 2, None),
+        (3, 1, 0.125), (3, 2, 2.675), (4, 3, 1.005), (9, 7, 0.015), (5, 4, 0.045), (8, 3, 100.0 / 3),
+    ]
+    for _ in range(n):
+        marketing = None if rng.random() < 0.2 else round(rng.uniform(0, 5000), rng.choice((0, 1, 2, 3)))
+        rows.append((rng.randint(0, 60), rng.choice((0, 0, *range(1, 15))), marketing))
+    return rows
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_frozen_metrics_match_per_row(seed):
+    rows = _rows(seed)
+    calls, sales, marketing = zip(*rows)
+    columns = frozen_metrics(
+        np.array(calls), np.array(sales), np.array([np.nan if m is None else m for m in marketing])
+    )
+    got = list(zip(*(to_optional(column) for column in columns)))
+    assert got == [per_row_metrics(*row) for row in rows]
+
+
+@pytest.mark.parametrize("scale", [1.0, 0.5, 1.1, 1 / 3, 1.005, 2.675, 0.0])
+def test_rescale_marketing_matches_per_row(scale):
+    rows = _rows(7)
+    marketing = [m or 0.0 for _, _, m in rows]
+    sales = [s for _, s, _ in rows]
+    scaled, cpa = rescale_marketing(np.array(marketing), np.array(sales), scale)
+    assert list(zip(to_optional(scaled), to_optional(cpa))) == [
+        per_row_rescale(m, s, scale) for m, s in zip(marketing, sales)
+    ]
+
+
+def test_rescale_marketing_half_cent_ties():
+    # Halves of a cent that are exact in binary round to even; the others follow their binary value.
+    marketing = [0.125, 0.375, 2.675, 1.005, 0.015, 0.045, 10.125, 1234.565, 0.0]
+    sales = [1, 0, 2, 3, 0, 1, 4, 7, 0]
+    scaled, cpa = rescale_marketing(np.array(marketing), np.array(sales), 1.0)
+    assert to_optional(scaled) == [round(m, 2) for m in marketing]
+    assert to_optional(scaled)[:3] == [0.12, 0.38, 2.67]
+    assert list(zip(to_optional(scaled), to_optional(cpa))) == [
+        per_row_rescale(m, s, 1.0) for m, s in zip(marketing, sales)
+    ]
+
+
+def test_totals_by_date_match_sum():
+    rng = random.Random(11)
+    date_keys = [rng.choice(("2026-03-03", "2026-03-02", "2026-03-04")) for _ in range(300)]
+    values = [rng.uniform(0, 1000) for _ in date_keys]
+    # Order-sensitive sums: the result changes if a date's rows are added in any other order.
+    date_keys += ["2026-03-05"] * 4 + ["2026-03-06"] * 2
+    values += [1e16, 1.0, -1e16, 1.0, 0.0, 0.0]
+    expected: dict[str, float] = {}
+    for date_key in dict.fromkeys(date_keys):
+        expected[date_key] = sum(v for d, v in zip(date_keys, values) if d == date_key)
+
+    got = totals_by_date(date_keys, np.array(values))
+    assert got == expected
+    assert list(got) == list(expected)
+    assert got["2026-03-05"] == 1.0 and got["2026-03-06"] == 0.0
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tests for policies_bot.py's month selection and sync exit code: python -m pytest bot
+"""
+
+import asyncio
+import calendar
+from datetime import date
+
+import policies_bot
+
+
+class FakeLocator:
+    def __init__(self, page, role: str | None = None, name: str | None = None):
+        self.page, self.role, self.name = page, role, name
+
+    @property
+    def first(self):
+        return self
+
+    async def count(self) -> int:
+        if self.role != "button" or self.name is None:
+            return 1
+        return sum(self.name.lower() in label.lower() for label in self.page.buttons())
+
+    async def click(self, timeout=None) -> None:
+        if await self.count() == 0:
+            raise TimeoutError(f"no {self.role} named {self.name!r}")
+        self.page.clicked.append(self.name)
+        if self.name == "Previous page":
+            year, month = self.page.shown
+            self.page.shown = (year, month - 1) if month > 1 else (year - 1, 12)
+
+    async def wait_for(self, state=None, timeout=None) -> None:
+        pass
+
+
+class FakeKeyboard:
+    async def press(self, key) -> None:
+        pass
+
+
+class FakePage:
+    """PolicyDen's date picker: it opens on `shown` and labels each day button with weekday, date and year."""
+
+    def __init__(self, shown: tuple[int, int]):
+        self.shown = shown
+        self.clicked: list[str | None] = []
+        self.keyboard = FakeKeyboard()
+
+    def buttons(self) -> list[str]:
+        year, month = self.shown
+        days = [date(year, month, d) for d in range(1, calendar.monthrange(year, month)[1] + 1)]
+        return ["Previous page", "Apply", *(d.strftime("%A, %B ") + f"{d.day}, {d.year}" for d in days)]
+
+    def locator(self, selector):
+        return FakeLocator(self)
+
+    def get_by_role(self, role, name=None):
+        return FakeLocator(self, role, name)
+
+    async def wait_for_timeout(self, ms) -> None:
+        pass
+
+
+def test_month_of_last_year_pages_back_across_the_year():
+    page = FakePage(shown=(2026, 2))
+    label, first, last = policies_bot.month_windows(date(2026, 2, 10), 4)[-1]
+    assert (label, first, last) == ("November 2025", date(2025, 11, 1), date(2025, 11, 30))
+
+    assert asyncio.run(policies_bot.set_month_range(page, label, first, last))
+    assert page.shown == (2025, 11)
+    assert page.clicked[-3:] == ["Saturday, November 1, 2025", "Sunday, November 30, 2025", "Apply"]
+
+
+def test_month_out_of_reach_fails():
+    page = FakePage(shown=(2026, 2))
+    assert not asyncio.run(policies_bot.set_month_range(page, "May 2020", date(2020, 5, 1), date(2020, 5, 31)))
+
+
+def test_skipped_month_fails_the_sync(monkeypatch, tmp_path):
+    async def scrape(*args, **kwargs):
+        return [], ["December 2025"]
+
+    async def batch_update(client, collections, build, current=None) -> bool:
+        build(current)
+        return True
+
+    async def load_records() -> list[dict]:
+        return []
+
+    monkeypatch.setattr(policies_bot, "scrape_policyden_policies", scrape)
+    monkeypatch.setattr(policies_bot, "api_batch_update", batch_update)
+    assert asyncio.run(policies_bot._sync_audit_records(None, tmp_path, {}, load_records, 3)) == 1
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""
+The intra-day scraping window (9 AM through the 9 PM hour EST, Monday to Friday), standard library only,
+so a cron tick outside it exits before main.py imports asyncio, httpx, dotenv and the API client.
+"""
+
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+ZONE = "America/New_York"
+
+
+def in_scraping_window(now_est: datetime) -> bool:
+    """True from 9 AM through the 9 PM hour EST, Monday to Friday (when ticks scrape)."""
+    return 9 <= now_est.hour <= 21 and now_est.weekday() < 5
+
+
+def exit_outside_window() -> None:
+    """Exit with code 0 if now is outside the scraping window (main.py's fast path)."""
+    if not in_scraping_window(datetime.now(ZoneInfo(ZONE))):
+        print("Outside scraping window (9 AM–9 PM EST, Mon–Fri); skipping.", flush=True)
+        raise SystemExit(0)
@@ -1,6 +1,8 @@
 import { mkdtempSync, rmSync } from 'node:fs'
 import { tmpdir } from 'node:os'
 import { join } from 'node:path'
+import { gunzipSync, gzipSync } from 'node:zlib'
+import Database from 'better-sqlite3'
 import { afterAll, beforeAll, describe, expect, it } from 'vitest'
 import { buildApp } from './app.js'
 
@@ -104,4 +106,347 @@ describe('state resources', () => {
     expect(parsed.data.agents).toHaveLength(1)
     expect(parsed.data.agents[0].id).toBe('a1')
   })
+
+  it('accepts gzip request bodies and compresses large state responses', async () => {
+    const rows = Array.from({ length: 50 }, (_, i) => ({
+      id: `a${i}`,
+      name: `Agent ${i}`,
+      active: true,
+      createdAt: new Date().toISOString(),
+    }))
+    const putRes = await app.inject({
+      method: 'PUT',
+      url: '/state/agents',
+      headers: { 'content-type': 'application/json', 'content-encoding': 'gzip' },
+      payload: gzipSync(Buffer.from(JSON.stringify(rows))),
+    })
+    expect(putRes.statusCode).toBe(200)
+
+    const getRes = await app.inject({
+      method: 'GET',
+      url: '/state/agents',
+      headers: { 'accept-encoding': 'gzip' },
+    })
+    expect(getRes.statusCode).toBe(200)
+    expect(getRes.headers['content-encoding']).toBe('gzip')
+    const parsed = JSON.parse(gunzipSync(getRes.rawPayload).toString('utf8')) as { data: Array<{ id: string }> }
+    expect(parsed.data).toHaveLength(50)
+
+    const plainRes = await app.inject({ method: 'GET', url: '/state/agents' })
+    expect(plainRes.headers['content-encoding']).toBeUndefined()
+  })
+
+  it('applies batch operations across collections in one transaction', async () => {
+    const seed = await app.inject({
+      method: 'PUT',
+      url: '/state/transfers',
+      payload: [
+        { id: 't1', dateKey: '2025-03-03', fromAgentId: 'a1', toAgentId: 'a2', successClosed: false },
+        { id: 't2', dateKey: '2025-03-03', fromAgentId: 'a2', toAgentId: 'a1', successClosed: false },
+      ],
+    })
+    const transfersVersion = (seed.json() as { meta: { version: number } }).meta.version
+
+    const batchRes = await app.inject({
+      method: 'POST',
+      url: '/state/batch',
+      payload: {
+        operations: [
+          { op: 'upsert', collection: 'transfers', rows: [{ id: 't2', dateKey: '2025-03-03', fromAgentId: 'a2', toAgentId: 'a1', successClosed: true }] },
+          { op: 'delete', collection: 'transfers', ids: ['t1'] },
+          { op: 'setHouseMarketing', dateKey: '2025-03-03', amount: 1234.5 },
+        ],
+        expectedVersions: { transfers: transfersVersion },
+      },
+    })
+    expect(batchRes.statusCode).toBe(200)
+    expect((batchRes.json() as { meta: { versions: Record<string, number> } }).meta.versions.transfers).toBe(transfersVersion + 1)
+
+    const state = (await app.inject({ method: 'GET', url: '/state' })).json() as {
+      data: { transfers: Array<{ id: string; successClosed: boolean }>; houseMarketing: { dateKey: string; amount: number } }
+    }
+    expect(state.data.transfers).toEqual([expect.objectContaining({ id: 't2', successClosed: true })])
+    expect(state.data.houseMarketing).toEqual({ dateKey: '2025-03-03', amount: 1234.5 })
+
+    const staleRes = await app.inject({
+      method: 'POST',
+      url: '/state/batch',
+      payload: {
+        operations: [
+          { op: 'delete', collection: 'transfers', ids: ['t2'] },
+          { op: 'setHouseMarketing', dateKey: '2025-03-04', amount: 1 },
+        ],
+        expectedVersions: { transfers: transfersVersion },
+      },
+    })
+    expect(staleRes.statusCode).toBe(412)
+    const after = (await app.inject({ method: 'GET', url: '/state' })).json() as {
+      data: { transfers: unknown[]; houseMarketing: { dateKey: string } }
+    }
+    expect(after.data.transfers).toHaveLength(1)
+    expect(after.data.houseMarketing.dateKey).toBe('2025-03-03')
+  })
+
+  it('keeps house marketing per date and upserts ranges in one write', async () => {
+    const batchRes = await app.inject({
+      method: 'POST',
+      url: '/state/batch',
+      payload: {
+        operations: [
+          {
+            op: 'upsertHouseMarketing',
+            entries: [
+              { dateKey: '2025-02-27', amount: 900 },
+              { dateKey: '2025-02-28', amount: 950.25 },
+            ],
+          },
+        ],
+      },
+    })
+    expect(batchRes.statusCode).toBe(200)
+
+    const bulkRes = await app.inject({
+      method: 'POST',
+      url: '/state/house-marketing',
+      payload: { entries: [{ dateKey: '2025-02-28', amount: 960 }, { dateKey: '2025-03-05', amount: 1000 }] },
+    })
+    expect(bulkRes.statusCode).toBe(200)
+
+    const state = (await app.inject({ method: 'GET', url: '/state' })).json() as {
+      data: { houseMarketing: { dateKey: string; amount: number }; houseMarketingSeries: Array<{ dateKey: string; amount: number }> }
+    }
+    expect(state.data.houseMarketingSeries).toEqual([
+      { dateKey: '2025-02-27', amount: 900 },
+      { dateKey: '2025-02-28', amount: 960 },
+      { dateKey: '2025-03-03', amount: 1234.5 },
+      { dateKey: '2025-03-05', amount: 1000 },
+    ])
+    expect(state.data.houseMarketing).toEqual({ dateKey: '2025-03-05', amount: 1000 })
+
+    const invalidRes = await app.inject({
+      method: 'POST',
+      url: '/state/house-marketing',
+      payload: { entries: [{ dateKey: '2025-03-06' }] },
+    })
+    expect(invalidRes.statusCode).toBe(400)
+  })
+
+  it('replaces perf history for selected dates and returns only those rows', async () => {
+    const perf = (id: string, dateKey: string, sales: number) => ({
+      id,
+      dateKey,
+      agentId: 'a1',
+      billableCalls: 10,
+      sales,
+      marketing: 150,
+      cpa: sales > 0 ? 150 / sales : null,
+      cvr: sales / 10,
+      frozenAt: `${dateKey}T21:15:00.000Z`,
+    })
+    await app.inject({
+      method: 'PUT',
+      url: '/state/perfHistory',
+      payload: [perf('p1', '2025-03-03', 1), perf('p2', '2025-03-03', 2), perf('p3', '2025-03-04', 3)],
+    })
+
+    const replaceRes = await app.inject({
+      method: 'POST',
+      url: '/state/batch',
+      payload: {
+        operations: [
+          {
+            op: 'replaceDates',
+            collection: 'perfHistory',
+            dateKeys: ['2025-03-03', '2025-03-05'],
+            rows: [perf('p4', '2025-03-03', 4), perf('p5', '2025-03-05', 5)],
+            houseMarketing: [
+              { dateKey: '2025-03-03', amount: 300 },
+              { dateKey: '2025-03-05', amount: 150 },
+            ],
+          },
+        ],
+      },
+    })
+    expect(replaceRes.statusCode).toBe(200)
+    const replaced = replaceRes.json() as { data: { rows: { perfHistory: Array<{ id: string }> } } }
+    expect(replaced.data.rows.perfHistory.map((row) => row.id).sort()).toEqual(['p4', 'p5'])
+
+    const skipRes = await app.inject({
+      method: 'POST',
+      url: '/state/batch',
+      payload: {
+        operations: [
+          {
+            op: 'replaceDates',
+            collection: 'perfHistory',
+            dateKeys: ['2025-03-05'],
+            rows: [perf('p6', '2025-03-05', 6)],
+            skipExisting: true,
+            houseMarketing: [{ dateKey: '2025-03-05', amount: 999 }],
+          },
+        ],
+      },
+    })
+    const skipped = skipRes.json() as { data: { rows: { perfHistory: Array<{ id: string }> } } }
+    expect(skipped.data.rows.perfHistory.map((row) => row.id)).toEqual(['p5'])
+
+    const all = (await app.inject({ method: 'GET', url: '/state/perfHistory' })).json() as { data: Array<{ id: string }> }
+    expect(all.data.map((row) => row.id).sort()).toEqual(['p3', 'p4', 'p5'])
+
+    // House marketing follows the replaced dates only: the skipped date keeps its amount.
+    const state = (await app.inject({ method: 'GET', url: '/state' })).json() as {
+      data: { houseMarketingSeries: Array<{ dateKey: string; amount: number }> }
+    }
+    const amounts = Object.fromEntries(state.data.houseMarketingSeries.map((entry) => [entry.dateKey, entry.amount]))
+    expect(amounts['2025-03-03']).toBe(300)
+    expect(amounts['2025-03-05']).toBe(150)
+  })
+
+  it('creates and patches audit records row by row', async () => {
+    const record = {
+      id: 'audit_1',
+      agentId: 'a1',
+      carrier: 'Aetna',
+      clientName: 'Jane Doe',
+      reason: 'PolicyDen: Flagged',
+      currentStatus: 'flagged',
+      discoveryTs: '2025-03-03T14:00:00.000Z',
+      mgmtNotified: true,
+      outreachMade: false,
+      resolutionTs: null,
+      notes: 'called client',
+    }
+    const createRes = await app.inject({
+      method: 'POST',
+      url: '/state/batch',
+      payload: { operations: [{ op: 'upsert', collection: 'auditRecords', rows: [record] }] },
+    })
+    expect(createRes.statusCode).toBe(200)
+
+    const patchRes = await app.inject({
+      method: 'POST',
+      url: '/state/batch',
+      payload: {
+        operations: [
+          { op: 'patch', collection: 'auditRecords', rows: [{ id: 'audit_1', currentStatus: 'active', resolutionTs: '2025-03-04T14:00:00.000Z' }] },
+        ],
+      },
+    })
+    expect(patchRes.statusCode).toBe(200)
+    const records = (await app.inject({ method: 'GET', url: '/state/auditRecords' })).json() as { data: Array<typeof record> }
+    expect(records.data).toEqual([
+      { ...record, currentStatus: 'active', resolutionTs: '2025-03-04T14:00:00.000Z' },
+    ])
+
+    const missingRes = await app.inject({
+      method: 'POST',
+      url: '/state/batch',
+      payload: { operations: [{ op: 'patch', collection: 'auditRecords', rows: [{ id: 'audit_missing', notes: 'x' }] }] },
+    })
+    expect(missingRes.statusCode).toBe(404)
+    expect((missingRes.json() as { error: { code: string } }).error.code).toBe('ROW_NOT_FOUND')
+  })
+
+  it('rejects collection writes whose If-Match version is stale', async () => {
+    const getRes = await app.inject({ method: 'GET', url: '/state/qaRecords' })
+    const { meta } = getRes.json() as { meta: { version: number } }
+    expect(getRes.headers.etag).toBe(`"${meta.version}"`)
+
+    const firstPut = await app.inject({
+      method: 'PUT',
+      url: '/state/qaRecords',
+      headers: { 'if-match': `"${meta.version}"` },
+      payload: [],
+    })
+    expect(firstPut.statusCode).toBe(200)
+    expect((firstPut.json() as { meta: { version: number } }).meta.version).toBe(meta.version + 1)
+
+    const stalePut = await app.inject({
+      method: 'PUT',
+      url: '/state/qaRecords',
+      headers: { 'if-match': `"${meta.version}"` },
+      payload: [],
+    })
+    expect(stalePut.statusCode).toBe(412)
+    expect((stalePut.json() as { error: { code: string } }).error.code).toBe('VERSION_CONFLICT')
+    expect(stalePut.headers.etag).toBe(`"${meta.version + 1}"`)
+
+    const stateRes = await app.inject({ method: 'GET', url: '/state' })
+    const state = stateRes.json() as { meta: { versions: Record<string, number> } }
+    expect(state.meta.versions.qaRecords).toBe(meta.version + 1)
+  })
+})
+
+// Set TEST_DATABASE_URL to a scratch Postgres database to run these against PostgresStore as well.
+const storeCases: Array<{ store: string; databaseUrl?: string }> = [
+  { store: 'sqlite' },
+  ...(process.env.TEST_DATABASE_URL ? [{ store: 'postgres', databaseUrl: process.env.TEST_DATABASE_URL }] : []),
+]
+
+describe.each(storeCases)('batch patch on the $store store', ({ store, databaseUrl }) => {
+  const storeRoot = mkdtempSync(join(tmpdir(), `vcdash-${store}-`))
+  let storeApp: Awaited<ReturnType<typeof buildApp>>
+
+  beforeAll(async () => {
+    storeApp = await buildApp({
+      dbPath: join(storeRoot, 'test.sqlite'),
+      databaseUrl,
+      jwtSecret: 'test-secret',
+      frontendOrigins: ['http://localhost:5173/'],
+      adminUsername: 'admin',
+      adminPassword: 'admin',
+    })
+    await storeApp.ready()
+  })
+
+  afterAll(async () => {
+    await storeApp.close()
+    rmSync(storeRoot, { recursive: true, force: true })
+  })
+
+  it('patches known fields and rejects fields the row type does not have', async () => {
+    const id = `audit_patch_${Date.now()}`
+    const record = {
+      id,
+      agentId: 'a1',
+      carrier: 'Aetna',
+      clientName: 'Jane Doe',
+      reason: 'PolicyDen: Flagged',
+      currentStatus: 'flagged',
+      discoveryTs: '2025-03-03T14:00:00.000Z',
+      mgmtNotified: false,
+      outreachMade: false,
+      resolutionTs: null,
+      notes: '',
+    }
+    const batch = (operations: unknown[]) => storeApp.inject({ method: 'POST', url: '/state/batch', payload: { operations } })
+    expect((await batch([{ op: 'upsert', collection: 'auditRecords', rows: [record] }])).statusCode).toBe(200)
+
+    const unknownRes = await batch([{ op: 'patch', collection: 'auditRecords', rows: [{ id, notes: 'x', bogus: 1 }] }])
+    expect(unknownRes.statusCode).toBe(400)
+    expect((unknownRes.json() as { error: { code: string } }).error.code).toBe('UNKNOWN_FIELD')
+
+    const patchRes = await batch([{ op: 'patch', collection: 'auditRecords', rows: [{ id, mgmtNotified: true, notes: 'called' }] }])
+    expect(patchRes.statusCode).toBe(200)
+    const records = (await storeApp.inject({ method: 'GET', url: '/state/auditRecords' })).json() as {
+      data: Array<typeof record>
+    }
+    // The rejected batch changed nothing; the accepted one only its fields.
+    expect(records.data.find((row) => row.id === id)).toEqual({ ...record, mgmtNotified: true, notes: 'called' })
+  })
+
+  it('rejects a field the row type does not have even where the table has a column for it', async () => {
+    if (store === 'sqlite') {
+      const db = new Database(join(storeRoot, 'test.sqlite'))
+      db.exec('ALTER TABLE audit_records ADD COLUMN legacyNote TEXT')
+      db.close()
+    }
+    const res = await storeApp.inject({
+      method: 'POST',
+      url: '/state/batch',
+      payload: { operations: [{ op: 'patch', collection: 'auditRecords', rows: [{ id: 'audit_any', legacyNote: 'x' }] }] },
+    })
+    expect(res.statusCode).toBe(400)
+    expect((res.json() as { error: { code: string } }).error.code).toBe('UNKNOWN_FIELD')
+  })
 })
@@ -3,6 +3,7 @@ import cookie from '@fastify/cookie'
 import cors from '@fastify/cors'
 import jwt from '@fastify/jwt'
 import rateLimit from '@fastify/rate-limit'
+import { decodeRequestBody } from './compression.js'
 import { runMigrations } from './db/migrate.js'
 import { PostgresStore } from './db/postgres-store.js'
 import { SqliteStore } from './db/store.js'
@@ -46,10 +47,12 @@ export async function buildApp(config: AppConfig) {
     },
     credentials: false,
     methods: ['GET', 'HEAD', 'POST', 'PUT', 'OPTIONS'],
-    allowedHeaders: ['content-type', 'authorization', 'cache-control', 'pragma'],
+    allowedHeaders: ['content-type', 'content-encoding', 'authorization', 'cache-control', 'pragma', 'if-match'],
+    exposedHeaders: ['etag'],
     maxAge: 86400,
   })
   await app.register(cookie)
+  app.addHook('preParsing', decodeRequestBody)
   await app.register(rateLimit, {
     max: 60,
     timeWindow: '1 minute',
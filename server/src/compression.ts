@@ -0,0 +1,87 @@
+import type { FastifyReply, FastifyRequest, RequestPayload } from 'fastify'
+import type { Transform } from 'node:stream'
+import { promisify } from 'node:util'
+import zlib from 'node:zlib'
+
+const MIN_COMPRESS_BYTES = 1024
+const brotliCompress = promisify(zlib.brotliCompress)
+const gzip = promisify(zlib.gzip)
+
+type ResponseEncoding = 'br' | 'gzip'
+
+function createDecoder(encoding: string): Transform | null {
+  switch (encoding) {
+    case 'gzip':
+    case 'x-gzip':
+      return zlib.createGunzip()
+    case 'br':
+      return zlib.createBrotliDecompress()
+    case 'deflate':
+      return zlib.createInflate()
+    default:
+      return null
+  }
+}
+
+function negotiateEncoding(header: string | string[] | undefined): ResponseEncoding | null {
+  const accepted = new Map<string, number>()
+  for (const part of String(header ?? '').split(',')) {
+    const [name, ...params] = part.trim().toLowerCase().split(';')
+    if (!name) continue
+    const q = params.map((p) => p.trim()).find((p) => p.startsWith('q='))
+    accepted.set(name, q ? Number(q.slice(2)) : 1)
+  }
+  const allowed = (encoding: string) => (accepted.get(encoding) ?? accepted.get('*') ?? 0) > 0
+  if (allowed('br')) return 'br'
+  if (allowed('gzip')) return 'gzip'
+  return null
+}
+
+/** preParsing hook: decode gzip/br/deflate request bodies (Content-Encoding) before JSON parsing. */
+export async function decodeRequestBody(
+  request: FastifyRequest,
+  _reply: FastifyReply,
+  payload: RequestPayload,
+): Promise<RequestPayload> {
+  const encoding = String(request.headers['content-encoding'] ?? '').trim().toLowerCase()
+  if (!encoding || encoding === 'identity') return payload
+  const decoder = createDecoder(encoding)
+  if (!decoder) {
+    throw Object.assign(new Error(`Unsupported Content-Encoding: ${encoding}.`), {
+      statusCode: 415,
+      code: 'UNSUPPORTED_CONTENT_ENCODING',
+    })
+  }
+  // Fastify compares Content-Length (and bodyLimit) against the encoded byte count.
+  const decoded = decoder as Transform & { receivedEncodedLength: number }
+  decoded.receivedEncodedLength = 0
+  payload.on('data', (chunk: Buffer) => {
+    decoded.receivedEncodedLength += chunk.length
+  })
+  payload.on('error', (err) => decoded.destroy(err))
+  return payload.pipe(decoded)
+}
+
+/** onSend hook: br/gzip-compress JSON responses of at least 1 KB when the client accepts it. */
+export async function compressResponse(request: FastifyRequest, reply: FastifyReply, payload: unknown): Promise<unknown> {
+  if (typeof payload !== 'string' && !Buffer.isBuffer(payload)) return payload
+  if (reply.hasHeader('content-encoding')) return payload
+  const vary = reply.getHeader('vary')
+  reply.header('vary', vary ? `${String(vary)}, Accept-Encoding` : 'Accept-Encoding')
+  const raw = Buffer.isBuffer(payload) ? payload : Buffer.from(payload)
+  if (raw.length < MIN_COMPRESS_BYTES) return payload
+  const encoding = negotiateEncoding(request.headers['accept-encoding'])
+  if (!encoding) return payload
+  const body =
+    encoding === 'br'
+      ? await brotliCompress(raw, {
+          params: {
+            [zlib.constants.BROTLI_PARAM_QUALITY]: 5,
+            [zlib.constants.BROTLI_PARAM_SIZE_HINT]: raw.length,
+          },
+        })
+      : await gzip(raw, { level: 6 })
+  reply.header('content-encoding', encoding)
+  reply.removeHeader('content-length')
+  return body
+}
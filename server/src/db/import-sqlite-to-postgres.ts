@@ -38,6 +38,9 @@ async function run(): Promise<void> {
     await postgres.replaceCollection(key, rows)
     console.log(`Imported ${key}: ${rows.length} rows`)
   }
+  const houseMarketing = await sqlite.getHouseMarketingSeries()
+  if (houseMarketing.length > 0) await postgres.upsertHouseMarketing(houseMarketing)
+  console.log(`Imported houseMarketing: ${houseMarketing.length} dates`)
 
   sqlite.close()
   await postgres.close()
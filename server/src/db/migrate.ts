@@ -12,5 +12,13 @@ export function runMigrations(dbPath: string): void {
   } catch {
     // Column already exists (e.g. after schema bump)
   }
+  // House marketing used to be a single app_meta value; keep it as the first entry of the per-date series.
+  db.exec(`
+    INSERT OR IGNORE INTO house_marketing (dateKey, amount)
+      SELECT json_extract(value, '$.dateKey'), json_extract(value, '$.amount') FROM app_meta
+      WHERE key = 'houseMarketing' AND json_valid(value) AND json_extract(value, '$.dateKey') IS NOT NULL
+        AND json_extract(value, '$.amount') IS NOT NULL;
+    DELETE FROM app_meta WHERE key = 'houseMarketing';
+  `)
   db.close()
 }
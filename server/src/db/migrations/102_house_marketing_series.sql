@@ -0,0 +1,6 @@
+-- House marketing becomes a per-date series: { dateKey: amount } under 'houseMarketingByDate'.
+INSERT INTO app_state (key, payload, updated_at)
+  SELECT 'houseMarketingByDate', jsonb_build_object(payload->>'dateKey', payload->'amount'), NOW()
+  FROM app_state WHERE key = 'houseMarketing' AND payload ? 'dateKey' AND payload ? 'amount'
+ON CONFLICT (key) DO NOTHING;
+DELETE FROM app_state WHERE key = 'houseMarketing';
@@ -1,6 +1,60 @@
 import { Pool } from 'pg'
-import type { StoreState } from '../types.js'
-import type { EntityKey, StoreAdapter } from './store.types.js'
+import type { HouseMarketingEntry, StoreState } from '../types.js'
+import { ROW_FIELDS, RowPatchError, VersionConflictError, rowIdField } from './store.types.js'
+import type { BatchOperation, BatchResult, CollectionVersions, DatedKey, EntityKey, StoreAdapter } from './store.types.js'
+
+const UPSERT_STATE_SQL = `
+  INSERT INTO app_state (key, payload, updated_at)
+  VALUES ($1, $2::jsonb, NOW())
+  ON CONFLICT (key)
+  DO UPDATE SET payload = EXCLUDED.payload, updated_at = NOW();
+`
+
+/** House marketing is one JSONB object { dateKey: amount }; upserts merge into it key by key. */
+const UPSERT_HOUSE_MARKETING_SQL = `
+  INSERT INTO app_state (key, payload, updated_at)
+  VALUES ('houseMarketingByDate', $1::jsonb, NOW())
+  ON CONFLICT (key)
+  DO UPDATE SET payload = app_state.payload || EXCLUDED.payload, updated_at = NOW();
+`
+
+type Row = Record<string, unknown>
+
+function houseMarketingPayload(entries: HouseMarketingEntry[]): string {
+  return JSON.stringify(Object.fromEntries(entries.map((entry) => [entry.dateKey, entry.amount])))
+}
+
+function upsertRows(rows: Row[], updates: Row[], idField: string): Row[] {
+  const next = [...rows]
+  const index = new Map(next.map((row, i) => [row[idField], i]))
+  for (const row of updates) {
+    const at = index.get(row[idField])
+    if (at === undefined) {
+      index.set(row[idField], next.length)
+      next.push(row)
+    } else {
+      next[at] = row
+    }
+  }
+  return next
+}
+
+function patchRows(key: EntityKey, rows: Row[], patches: Row[], idField: string): Row[] {
+  const next = [...rows]
+  const index = new Map(next.map((row, i) => [row[idField], i]))
+  // Rows are JSONB, so nothing else stops a patch from adding keys the row type does not have.
+  const fields = new Set<string>(ROW_FIELDS[key] as ReadonlyArray<string>)
+  for (const patch of patches) {
+    const unknownField = Object.keys(patch).find((field) => field !== idField && !fields.has(field))
+    if (unknownField) {
+      throw new RowPatchError(key, 'UNKNOWN_FIELD', `${key} rows have no patchable field ${unknownField}.`)
+    }
+    const at = index.get(patch[idField])
+    if (at === undefined) throw new RowPatchError(key, 'ROW_NOT_FOUND', `${key} has no row ${String(patch[idField])}.`)
+    next[at] = { ...next[at], ...patch }
+  }
+  return next
+}
 
 export class PostgresStore implements StoreAdapter {
   private readonly pool: Pool
@@ -19,6 +73,12 @@ export class PostgresStore implements StoreAdapter {
         payload JSONB NOT NULL,
         updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
       );
+      ALTER TABLE app_state ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 0;
+      INSERT INTO app_state (key, payload, updated_at)
+        SELECT 'houseMarketingByDate', jsonb_build_object(payload->>'dateKey', payload->'amount'), NOW()
+        FROM app_state WHERE key = 'houseMarketing' AND payload ? 'dateKey' AND payload ? 'amount'
+      ON CONFLICT (key) DO NOTHING;
+      DELETE FROM app_state WHERE key = 'houseMarketing';
     `)
   }
 
@@ -27,6 +87,7 @@ export class PostgresStore implements StoreAdapter {
   }
 
   async getState(): Promise<StoreState> {
+    const houseMarketingSeries = await this.getHouseMarketingSeries()
     return {
       agents: await this.getCollection('agents'),
       snapshots: await this.getCollection('snapshots'),
@@ -44,7 +105,8 @@ export class PostgresStore implements StoreAdapter {
       transfers: await this.getCollection('transfers'),
       shadowLogs: await this.getCollection('shadowLogs'),
       lastPoliciesBotRun: await this.getLastPoliciesBotRun(),
-      houseMarketing: await this.getHouseMarketing(),
+      houseMarketing: houseMarketingSeries[houseMarketingSeries.length - 1] ?? null,
+      houseMarketingSeries,
     }
   }
 
@@ -90,31 +152,29 @@ export class PostgresStore implements StoreAdapter {
     )
   }
 
-  async getHouseMarketing(): Promise<{ dateKey: string; amount: number } | null> {
+  async getHouseMarketing(): Promise<HouseMarketingEntry | null> {
+    const series = await this.getHouseMarketingSeries()
+    return series[series.length - 1] ?? null
+  }
+
+  async getHouseMarketingSeries(): Promise<HouseMarketingEntry[]> {
     const result = await this.pool.query<{ payload: unknown }>(
-      "SELECT payload FROM app_state WHERE key = 'houseMarketing'",
+      "SELECT payload FROM app_state WHERE key = 'houseMarketingByDate'",
     )
-    if (result.rows.length === 0) return null
-    const payload = result.rows[0].payload
-    if (payload !== null && typeof payload === 'object') {
-      const obj = payload as Record<string, unknown>
-      const dateKey = typeof obj.dateKey === 'string' ? obj.dateKey : null
-      const amount = typeof obj.amount === 'number' ? obj.amount : Number(obj.amount)
-      if (dateKey && Number.isFinite(amount)) return { dateKey, amount }
-    }
-    return null
+    const payload = result.rows[0]?.payload
+    if (payload === null || typeof payload !== 'object') return []
+    return Object.entries(payload as Record<string, unknown>)
+      .map(([dateKey, amount]) => ({ dateKey, amount: Number(amount) }))
+      .filter((entry) => Number.isFinite(entry.amount))
+      .sort((a, b) => (a.dateKey < b.dateKey ? -1 : a.dateKey > b.dateKey ? 1 : 0))
   }
 
   async setHouseMarketing(dateKey: string, amount: number): Promise<void> {
-    await this.pool.query(
-      `
-      INSERT INTO app_state (key, payload, updated_at)
-      VALUES ('houseMarketing', $1::jsonb, NOW())
-      ON CONFLICT (key)
-      DO UPDATE SET payload = EXCLUDED.payload, updated_at = NOW();
-      `,
-      [JSON.stringify({ dateKey, amount })],
-    )
+    await this.upsertHouseMarketing([{ dateKey, amount }])
+  }
+
+  async upsertHouseMarketing(entries: HouseMarketingEntry[]): Promise<void> {
+    await this.pool.query(UPSERT_HOUSE_MARKETING_SQL, [houseMarketingPayload(entries)])
   }
 
   async getCollection<T extends EntityKey>(key: T): Promise<StoreState[T]> {
@@ -123,16 +183,146 @@ export class PostgresStore implements StoreAdapter {
     return result.rows[0].payload
   }
 
-  async replaceCollection<T extends EntityKey>(key: T, rows: StoreState[T]): Promise<StoreState[T]> {
-    await this.pool.query(
-      `
-      INSERT INTO app_state (key, payload, updated_at)
-      VALUES ($1, $2::jsonb, NOW())
-      ON CONFLICT (key)
-      DO UPDATE SET payload = EXCLUDED.payload, updated_at = NOW();
-      `,
-      [key, JSON.stringify(rows)],
-    )
-    return rows
+  async getCollectionVersion(key: EntityKey): Promise<number> {
+    const result = await this.pool.query<{ version: number }>('SELECT version FROM app_state WHERE key = $1', [key])
+    return result.rows[0]?.version ?? 0
+  }
+
+  async getCollectionVersions(): Promise<CollectionVersions> {
+    const result = await this.pool.query<{ key: EntityKey; version: number }>('SELECT key, version FROM app_state')
+    return Object.fromEntries(result.rows.map((row) => [row.key, row.version])) as CollectionVersions
+  }
+
+  async replaceCollection<T extends EntityKey>(key: T, rows: StoreState[T], expectedVersion?: number): Promise<number> {
+    const client = await this.pool.connect()
+    try {
+      await client.query('BEGIN')
+      const current = await client.query<{ version: number }>('SELECT version FROM app_state WHERE key = $1 FOR UPDATE', [key])
+      const currentVersion = current.rows[0]?.version ?? 0
+      if (expectedVersion !== undefined && expectedVersion !== currentVersion) {
+        throw new VersionConflictError(key, currentVersion)
+      }
+      await client.query(
+        `
+        INSERT INTO app_state (key, payload, version, updated_at)
+        VALUES ($1, $2::jsonb, $3, NOW())
+        ON CONFLICT (key)
+        DO UPDATE SET payload = EXCLUDED.payload, version = EXCLUDED.version, updated_at = NOW();
+        `,
+        [key, JSON.stringify(rows), currentVersion + 1],
+      )
+      await client.query('COMMIT')
+      return currentVersion + 1
+    } catch (err) {
+      await client.query('ROLLBACK')
+      throw err
+    } finally {
+      client.release()
+    }
+  }
+
+  async applyBatch(operations: BatchOperation[], expectedVersions: CollectionVersions = {}): Promise<BatchResult> {
+    const keys = new Set(Object.keys(expectedVersions) as EntityKey[])
+    for (const operation of operations) {
+      if ('collection' in operation) keys.add(operation.collection)
+    }
+    const client = await this.pool.connect()
+    try {
+      await client.query('BEGIN')
+      // Lock in key order so concurrent batches cannot deadlock.
+      const locked = await client.query<{ key: EntityKey; payload: Row[]; version: number }>(
+        'SELECT key, payload, version FROM app_state WHERE key = ANY($1::text[]) ORDER BY key FOR UPDATE',
+        [[...keys]],
+      )
+      const current = new Map(locked.rows.map((row) => [row.key, { rows: row.payload, version: row.version }]))
+      for (const [key, expected] of Object.entries(expectedVersions) as Array<[EntityKey, number]>) {
+        const currentVersion = current.get(key)?.version ?? 0
+        if (expected !== currentVersion) throw new VersionConflictError(key, currentVersion)
+      }
+      const touched = new Map<EntityKey, Row[]>()
+      const rowsOf = (key: EntityKey): Row[] => touched.get(key) ?? current.get(key)?.rows ?? []
+      const replacedDates = new Map<DatedKey, Set<unknown>>()
+      for (const operation of operations) {
+        switch (operation.op) {
+          case 'upsert':
+            touched.set(
+              operation.collection,
+              upsertRows(rowsOf(operation.collection), operation.rows as Row[], rowIdField(operation.collection)),
+            )
+            break
+          case 'replace':
+            touched.set(operation.collection, operation.rows as Row[])
+            break
+          case 'patch':
+            touched.set(
+              operation.collection,
+              patchRows(operation.collection, rowsOf(operation.collection), operation.rows, rowIdField(operation.collection)),
+            )
+            break
+          case 'replaceDates': {
+            const existing = rowsOf(operation.collection)
+            const filled = new Set(existing.map((row) => row.dateKey))
+            const dates = new Set<unknown>(
+              operation.skipExisting ? operation.dateKeys.filter((dateKey) => !filled.has(dateKey)) : operation.dateKeys,
+            )
+            touched.set(operation.collection, [
+              ...existing.filter((row) => !dates.has(row.dateKey)),
+              ...(operation.rows as Row[]).filter((row) => dates.has(row.dateKey)),
+            ])
+            const marketing = (operation.houseMarketing ?? []).filter((entry) => dates.has(entry.dateKey))
+            if (marketing.length > 0) await client.query(UPSERT_HOUSE_MARKETING_SQL, [houseMarketingPayload(marketing)])
+            const returned = replacedDates.get(operation.collection) ?? new Set<unknown>()
+            for (const dateKey of operation.dateKeys) returned.add(dateKey)
+            replacedDates.set(operation.collection, returned)
+            break
+          }
+          case 'delete': {
+            const ids = new Set<unknown>(operation.ids)
+            const idField = rowIdField(operation.collection)
+            touched.set(
+              operation.collection,
+              rowsOf(operation.collection).filter((row) => !ids.has(row[idField])),
+            )
+            break
+          }
+          case 'setHouseMarketing':
+            await client.query(UPSERT_HOUSE_MARKETING_SQL, [
+              houseMarketingPayload([{ dateKey: operation.dateKey, amount: operation.amount }]),
+            ])
+            break
+          case 'upsertHouseMarketing':
+            await client.query(UPSERT_HOUSE_MARKETING_SQL, [houseMarketingPayload(operation.entries)])
+            break
+          case 'setLastPoliciesBotRun':
+            await client.query(UPSERT_STATE_SQL, ['lastPoliciesBotRun', JSON.stringify(operation.timestamp)])
+            break
+        }
+      }
+      const versions: CollectionVersions = {}
+      for (const [key, rows] of touched) {
+        const next = (current.get(key)?.version ?? 0) + 1
+        await client.query(
+          `
+          INSERT INTO app_state (key, payload, version, updated_at)
+          VALUES ($1, $2::jsonb, $3, NOW())
+          ON CONFLICT (key)
+          DO UPDATE SET payload = EXCLUDED.payload, version = EXCLUDED.version, updated_at = NOW();
+          `,
+          [key, JSON.stringify(rows), next],
+        )
+        versions[key] = next
+      }
+      await client.query('COMMIT')
+      const rows: BatchResult['rows'] = {}
+      for (const [key, dateKeys] of replacedDates) {
+        rows[key] = rowsOf(key).filter((row) => dateKeys.has(row.dateKey)) as StoreState[DatedKey]
+      }
+      return { versions, rows }
+    } catch (err) {
+      await client.query('ROLLBACK')
+      throw err
+    } finally {
+      client.release()
+    }
   }
 }
@@ -146,8 +146,18 @@ CREATE TABLE IF NOT EXISTS eod_reports (
   submittedAt TEXT NOT NULL
 );
 
+CREATE TABLE IF NOT EXISTS house_marketing (
+  dateKey TEXT PRIMARY KEY,
+  amount REAL NOT NULL
+);
+
 CREATE TABLE IF NOT EXISTS app_meta (
   key TEXT PRIMARY KEY,
   value TEXT
 );
+
+CREATE TABLE IF NOT EXISTS collection_versions (
+  key TEXT PRIMARY KEY,
+  version INTEGER NOT NULL
+);
 `
@@ -25,6 +25,7 @@ const seedState: StoreState = {
   shadowLogs: [],
   lastPoliciesBotRun: null,
   houseMarketing: null,
+  houseMarketingSeries: [],
 }
 
 runMigrations(DB_PATH)
@@ -5,6 +5,7 @@ import type {
   AttendanceSubmission,
   AuditRecord,
   EodReport,
+  HouseMarketingEntry,
   IntraSubmission,
   PerfHistory,
   QaRecord,
@@ -17,7 +18,27 @@ import type {
   VaultMeeting,
   WeeklyTarget,
 } from '../types.js'
-import type { EntityKey, StoreAdapter } from './store.types.js'
+import { ROW_FIELDS, RowPatchError, VersionConflictError } from './store.types.js'
+import type { BatchOperation, BatchResult, CollectionVersions, DatedKey, EntityKey, StoreAdapter } from './store.types.js'
+
+/** SQLite table and primary-key column of each collection. */
+const TABLES: Record<EntityKey, { table: string; idColumn: string }> = {
+  agents: { table: 'agents', idColumn: 'id' },
+  snapshots: { table: 'snapshots', idColumn: 'id' },
+  perfHistory: { table: 'perf_history', idColumn: 'id' },
+  qaRecords: { table: 'qa_records', idColumn: 'id' },
+  auditRecords: { table: 'audit_records', idColumn: 'id' },
+  attendance: { table: 'attendance', idColumn: 'id' },
+  spiffRecords: { table: 'spiff_records', idColumn: 'id' },
+  attendanceSubmissions: { table: 'attendance_submissions', idColumn: 'id' },
+  intraSubmissions: { table: 'intra_submissions', idColumn: 'id' },
+  weeklyTargets: { table: 'weekly_targets', idColumn: 'weekKey' },
+  vaultMeetings: { table: 'vault_meetings', idColumn: 'id' },
+  vaultDocs: { table: 'vault_docs', idColumn: 'id' },
+  transfers: { table: 'transfers', idColumn: 'id' },
+  eodReports: { table: 'eod_reports', idColumn: 'id' },
+  shadowLogs: { table: 'shadow_logs', idColumn: 'id' },
+}
 
 export class SqliteStore implements StoreAdapter {
   private db: Database.Database
@@ -54,6 +75,7 @@ export class SqliteStore implements StoreAdapter {
       shadowLogs: this.getShadowLogs(),
       lastPoliciesBotRun: await this.getLastPoliciesBotRun(),
       houseMarketing: await this.getHouseMarketing(),
+      houseMarketingSeries: this.readHouseMarketingSeries(),
     }
   }
 
@@ -62,180 +84,295 @@ export class SqliteStore implements StoreAdapter {
     return state[key]
   }
 
-  async replaceCollection<T extends EntityKey>(key: T, rows: StoreState[T]): Promise<StoreState[T]> {
-    const tx = this.db.transaction(() => {
-      switch (key) {
-        case 'agents':
-          this.db.prepare('DELETE FROM agents').run()
-          for (const row of rows as Agent[]) {
-            this.db
-              .prepare('INSERT INTO agents (id,name,active,createdAt) VALUES (@id,@name,@active,@createdAt)')
-              .run({ ...row, active: row.active ? 1 : 0 })
-          }
-          break
-        case 'snapshots':
-          this.db.prepare('DELETE FROM snapshots').run()
-          for (const row of rows as Snapshot[]) {
-            this.db
-              .prepare(
-                'INSERT INTO snapshots (id,dateKey,slot,slotLabel,agentId,billableCalls,sales,marketing,updatedAt) VALUES (@id,@dateKey,@slot,@slotLabel,@agentId,@billableCalls,@sales,@marketing,@updatedAt)',
-              )
-              .run(row)
-          }
-          break
-        case 'perfHistory':
-          this.db.prepare('DELETE FROM perf_history').run()
-          for (const row of rows as PerfHistory[]) {
-            this.db
-              .prepare(
-                'INSERT INTO perf_history (id,dateKey,agentId,billableCalls,sales,marketing,cpa,cvr,frozenAt) VALUES (@id,@dateKey,@agentId,@billableCalls,@sales,@marketing,@cpa,@cvr,@frozenAt)',
-              )
-              .run(row)
-          }
-          break
-        case 'qaRecords':
-          this.db.prepare('DELETE FROM qa_records').run()
-          for (const row of rows as QaRecord[]) {
-            this.db
-              .prepare(
-                'INSERT INTO qa_records (id,dateKey,agentId,clientName,decision,status,notes,createdAt,resolvedAt) VALUES (@id,@dateKey,@agentId,@clientName,@decision,@status,@notes,@createdAt,@resolvedAt)',
-              )
-              .run(row)
-          }
-          break
-        case 'auditRecords':
-          this.db.prepare('DELETE FROM audit_records').run()
-          for (const row of rows as AuditRecord[]) {
-            this.db
-              .prepare(
-                'INSERT INTO audit_records (id,agentId,carrier,clientName,reason,currentStatus,discoveryTs,mgmtNotified,outreachMade,resolutionTs,notes) VALUES (@id,@agentId,@carrier,@clientName,@reason,@currentStatus,@discoveryTs,@mgmtNotified,@outreachMade,@resolutionTs,@notes)',
-              )
-              .run({
-                ...row,
-                mgmtNotified: row.mgmtNotified ? 1 : 0,
-                outreachMade: row.outreachMade ? 1 : 0,
-                notes: row.notes ?? '',
-              })
-          }
-          break
-        case 'attendance':
-          this.db.prepare('DELETE FROM attendance').run()
-          for (const row of rows as AttendanceRecord[]) {
-            this.db
-              .prepare(
-                'INSERT INTO attendance (id,weekKey,dateKey,agentId,percent,notes) VALUES (@id,@weekKey,@dateKey,@agentId,@percent,@notes)',
-              )
-              .run(row)
-          }
-          break
-        case 'spiffRecords':
-          this.db.prepare('DELETE FROM spiff_records').run()
-          for (const row of rows as SpiffRecord[]) {
-            this.db
-              .prepare(
-                'INSERT INTO spiff_records (id,weekKey,dateKey,agentId,amount) VALUES (@id,@weekKey,@dateKey,@agentId,@amount)',
-              )
-              .run(row)
-          }
-          break
-        case 'attendanceSubmissions':
-          this.db.prepare('DELETE FROM attendance_submissions').run()
-          for (const row of rows as AttendanceSubmission[]) {
-            this.db
-              .prepare(
-                'INSERT INTO attendance_submissions (id,dateKey,submittedAt,updatedAt,submittedBy,daySignature) VALUES (@id,@dateKey,@submittedAt,@updatedAt,@submittedBy,@daySignature)',
-              )
-              .run(row)
-          }
-          break
-        case 'intraSubmissions':
-          this.db.prepare('DELETE FROM intra_submissions').run()
-          for (const row of rows as IntraSubmission[]) {
-            this.db
-              .prepare(
-                'INSERT INTO intra_submissions (id,dateKey,slot,submittedAt,updatedAt,submittedBy,slotSignature) VALUES (@id,@dateKey,@slot,@submittedAt,@updatedAt,@submittedBy,@slotSignature)',
-              )
-              .run(row)
-          }
-          break
-        case 'weeklyTargets':
-          this.db.prepare('DELETE FROM weekly_targets').run()
-          for (const row of rows as WeeklyTarget[]) {
-            this.db
-              .prepare(
-                'INSERT INTO weekly_targets (weekKey,targetSales,targetCpa,setAt) VALUES (@weekKey,@targetSales,@targetCpa,@setAt)',
-              )
-              .run(row)
-          }
-          break
-        case 'vaultMeetings':
-          this.db.prepare('DELETE FROM vault_meetings').run()
-          for (const row of rows as VaultMeeting[]) {
-            this.db
-              .prepare(
-                'INSERT INTO vault_meetings (id,agentId,dateKey,meetingType,notes,actionItems) VALUES (@id,@agentId,@dateKey,@meetingType,@notes,@actionItems)',
-              )
-              .run(row)
-          }
-          break
-        case 'vaultDocs':
-          this.db.prepare('DELETE FROM vault_docs').run()
-          for (const row of rows as VaultDoc[]) {
-            this.db
-              .prepare(
-                'INSERT INTO vault_docs (id,agentId,fileName,fileSize,uploadedAt) VALUES (@id,@agentId,@fileName,@fileSize,@uploadedAt)',
-              )
-              .run(row)
-          }
-          break
-        case 'transfers':
-          this.db.prepare('DELETE FROM transfers').run()
-          for (const row of rows as TransferRecord[]) {
-            this.db
-              .prepare(
-                'INSERT INTO transfers (id,dateKey,fromAgentId,toAgentId,successClosed) VALUES (@id,@dateKey,@fromAgentId,@toAgentId,@successClosed)',
-              )
-              .run({
-                ...row,
-                successClosed: row.successClosed ? 1 : 0,
-              })
-          }
-          break
-        case 'eodReports':
-          this.db.prepare('DELETE FROM eod_reports').run()
-          for (const row of rows as EodReport[]) {
-            this.db
-              .prepare(
-                'INSERT INTO eod_reports (id,weekKey,dateKey,houseSales,houseCpa,reportText,submittedAt) VALUES (@id,@weekKey,@dateKey,@houseSales,@houseCpa,@reportText,@submittedAt)',
-              )
-              .run(row)
+  private readCollectionVersion(key: EntityKey): number {
+    const row = this.db.prepare('SELECT version FROM collection_versions WHERE key = ?').get(key) as { version: number } | undefined
+    return row?.version ?? 0
+  }
+
+  async getCollectionVersion(key: EntityKey): Promise<number> {
+    return Promise.resolve(this.readCollectionVersion(key))
+  }
+
+  async getCollectionVersions(): Promise<CollectionVersions> {
+    const rows = this.db.prepare('SELECT key, version FROM collection_versions').all() as Array<{ key: EntityKey; version: number }>
+    return Object.fromEntries(rows.map((row) => [row.key, row.version])) as CollectionVersions
+  }
+
+  async replaceCollection<T extends EntityKey>(key: T, rows: StoreState[T], expectedVersion?: number): Promise<number> {
+    const tx = this.db.transaction((): number => {
+      const currentVersion = this.readCollectionVersion(key)
+      if (expectedVersion !== undefined && expectedVersion !== currentVersion) {
+        throw new VersionConflictError(key, currentVersion)
+      }
+      this.db.prepare(`DELETE FROM ${TABLES[key].table}`).run()
+      this.insertRows(key, rows)
+      this.writeCollectionVersion(key, currentVersion + 1)
+      return currentVersion + 1
+    })
+
+    return tx()
+  }
+
+  async applyBatch(operations: BatchOperation[], expectedVersions: CollectionVersions = {}): Promise<BatchResult> {
+    const tx = this.db.transaction((): BatchResult => {
+      for (const [key, expected] of Object.entries(expectedVersions) as Array<[EntityKey, number]>) {
+        const currentVersion = this.readCollectionVersion(key)
+        if (expected !== currentVersion) throw new VersionConflictError(key, currentVersion)
+      }
+      const touched = new Set<EntityKey>()
+      const replacedDates = new Map<DatedKey, Set<string>>()
+      for (const operation of operations) {
+        switch (operation.op) {
+          case 'upsert':
+            this.insertRows(operation.collection, operation.rows)
+            touched.add(operation.collection)
+            break
+          case 'replace':
+            this.db.prepare(`DELETE FROM ${TABLES[operation.collection].table}`).run()
+            this.insertRows(operation.collection, operation.rows)
+            touched.add(operation.collection)
+            break
+          case 'delete': {
+            const { table, idColumn } = TABLES[operation.collection]
+            const statement = this.db.prepare(`DELETE FROM ${table} WHERE ${idColumn} = ?`)
+            for (const id of operation.ids) statement.run(id)
+            touched.add(operation.collection)
+            break
           }
-          break
-        case 'shadowLogs':
-          this.db.prepare('DELETE FROM shadow_logs').run()
-          for (const row of rows as ShadowLog[]) {
-            this.db
-              .prepare(
-                'INSERT INTO shadow_logs (id,agentId,managerName,dateKey,startedAt,endedAt,callsJson,createdAt,updatedAt) VALUES (@id,@agentId,@managerName,@dateKey,@startedAt,@endedAt,@callsJson,@createdAt,@updatedAt)',
-              )
-              .run({
-                id: row.id,
-                agentId: row.agentId,
-                managerName: row.managerName,
-                dateKey: row.dateKey,
-                startedAt: row.startedAt,
-                endedAt: row.endedAt,
-                callsJson: JSON.stringify(row.calls ?? []),
-                createdAt: row.createdAt,
-                updatedAt: row.updatedAt,
-              })
+          case 'patch':
+            this.patchRows(operation.collection, operation.rows)
+            touched.add(operation.collection)
+            break
+          case 'replaceDates': {
+            const { table } = TABLES[operation.collection]
+            const hasRows = this.db.prepare(`SELECT 1 FROM ${table} WHERE dateKey = ? LIMIT 1`)
+            const dates = new Set(
+              operation.skipExisting ? operation.dateKeys.filter((dateKey) => !hasRows.get(dateKey)) : operation.dateKeys,
+            )
+            const remove = this.db.prepare(`DELETE FROM ${table} WHERE dateKey = ?`)
+            for (const dateKey of dates) remove.run(dateKey)
+            this.insertRows(
+              operation.collection,
+              (operation.rows as Array<{ dateKey: string }>).filter((row) => dates.has(row.dateKey)) as StoreState[DatedKey],
+            )
+            touched.add(operation.collection)
+            const marketing = (operation.houseMarketing ?? []).filter((entry) => dates.has(entry.dateKey))
+            if (marketing.length > 0) this.writeHouseMarketing(marketing)
+            const returned = replacedDates.get(operation.collection) ?? new Set<string>()
+            for (const dateKey of operation.dateKeys) returned.add(dateKey)
+            replacedDates.set(operation.collection, returned)
+            break
           }
-          break
+          case 'setHouseMarketing':
+            this.writeHouseMarketing([{ dateKey: operation.dateKey, amount: operation.amount }])
+            break
+          case 'upsertHouseMarketing':
+            this.writeHouseMarketing(operation.entries)
+            break
+          case 'setLastPoliciesBotRun':
+            this.writeLastPoliciesBotRun(operation.timestamp)
+            break
+        }
+      }
+      const versions: CollectionVersions = {}
+      for (const key of touched) {
+        const next = this.readCollectionVersion(key) + 1
+        this.writeCollectionVersion(key, next)
+        versions[key] = next
       }
+      const rows: BatchResult['rows'] = {}
+      for (const [key, dateKeys] of replacedDates) rows[key] = this.getRowsForDates(key, [...dateKeys])
+      return { versions, rows }
     })
 
-    tx()
-    return rows
+    return tx()
+  }
+
+  private writeCollectionVersion(key: EntityKey, version: number): void {
+    this.db.prepare('INSERT OR REPLACE INTO collection_versions (key, version) VALUES (?, ?)').run(key, version)
+  }
+
+  /**
+   * Updates only the given columns of existing rows (matched by the id column); booleans are stored as 0/1.
+   * Throws RowPatchError for unknown ids or fields that are not plain columns. Call inside a transaction.
+   */
+  private patchRows(key: EntityKey, patches: Array<Record<string, unknown>>): void {
+    const { table, idColumn } = TABLES[key]
+    // The row type's fields, not the table's columns, so the Postgres store accepts exactly the same patches.
+    const columns = new Set<string>(ROW_FIELDS[key] as ReadonlyArray<string>)
+    for (const patch of patches) {
+      const id = patch[idColumn]
+      const fields = Object.keys(patch).filter((field) => field !== idColumn)
+      const unknownField = fields.find((field) => !columns.has(field))
+      if (unknownField) {
+        throw new RowPatchError(key, 'UNKNOWN_FIELD', `${key} rows have no patchable field ${unknownField}.`)
+      }
+      if (fields.length === 0) continue
+      const values = fields.map((field) => (typeof patch[field] === 'boolean' ? (patch[field] ? 1 : 0) : patch[field]))
+      const result = this.db
+        .prepare(`UPDATE ${table} SET ${fields.map((field) => `${field} = ?`).join(', ')} WHERE ${idColumn} = ?`)
+        .run(...values, id)
+      if (result.changes === 0) {
+        throw new RowPatchError(key, 'ROW_NOT_FOUND', `${key} has no row ${String(id)}.`)
+      }
+    }
+  }
+
+  /** Inserts rows into key's table, replacing any row with the same primary key. Call inside a transaction. */
+  private insertRows<T extends EntityKey>(key: T, rows: StoreState[T]): void {
+    switch (key) {
+      case 'agents':
+        for (const row of rows as Agent[]) {
+          this.db
+            .prepare('INSERT OR REPLACE INTO agents (id,name,active,createdAt) VALUES (@id,@name,@active,@createdAt)')
+            .run({ ...row, active: row.active ? 1 : 0 })
+        }
+        break
+      case 'snapshots':
+        for (const row of rows as Snapshot[]) {
+          this.db
+            .prepare(
+              'INSERT OR REPLACE INTO snapshots (id,dateKey,slot,slotLabel,agentId,billableCalls,sales,marketing,updatedAt) VALUES (@id,@dateKey,@slot,@slotLabel,@agentId,@billableCalls,@sales,@marketing,@updatedAt)',
+            )
+            .run(row)
+        }
+        break
+      case 'perfHistory':
+        for (const row of rows as PerfHistory[]) {
+          this.db
+            .prepare(
+              'INSERT OR REPLACE INTO perf_history (id,dateKey,agentId,billableCalls,sales,marketing,cpa,cvr,frozenAt) VALUES (@id,@dateKey,@agentId,@billableCalls,@sales,@marketing,@cpa,@cvr,@frozenAt)',
+            )
+            .run(row)
+        }
+        break
+      case 'qaRecords':
+        for (const row of rows as QaRecord[]) {
+          this.db
+            .prepare(
+              'INSERT OR REPLACE INTO qa_records (id,dateKey,agentId,clientName,decision,status,notes,createdAt,resolvedAt) VALUES (@id,@dateKey,@agentId,@clientName,@decision,@status,@notes,@createdAt,@resolvedAt)',
+            )
+            .run(row)
+        }
+        break
+      case 'auditRecords':
+        for (const row of rows as AuditRecord[]) {
+          this.db
+            .prepare(
+              'INSERT OR REPLACE INTO audit_records (id,agentId,carrier,clientName,reason,currentStatus,discoveryTs,mgmtNotified,outreachMade,resolutionTs,notes) VALUES (@id,@agentId,@carrier,@clientName,@reason,@currentStatus,@discoveryTs,@mgmtNotified,@outreachMade,@resolutionTs,@notes)',
+            )
+            .run({
+              ...row,
+              mgmtNotified: row.mgmtNotified ? 1 : 0,
+              outreachMade: row.outreachMade ? 1 : 0,
+              notes: row.notes ?? '',
+            })
+        }
+        break
+      case 'attendance':
+        for (const row of rows as AttendanceRecord[]) {
+          this.db
+            .prepare(
+              'INSERT OR REPLACE INTO attendance (id,weekKey,dateKey,agentId,percent,notes) VALUES (@id,@weekKey,@dateKey,@agentId,@percent,@notes)',
+            )
+            .run(row)
+        }
+        break
+      case 'spiffRecords':
+        for (const row of rows as SpiffRecord[]) {
+          this.db
+            .prepare(
+              'INSERT OR REPLACE INTO spiff_records (id,weekKey,dateKey,agentId,amount) VALUES (@id,@weekKey,@dateKey,@agentId,@amount)',
+            )
+            .run(row)
+        }
+        break
+      case 'attendanceSubmissions':
+        for (const row of rows as AttendanceSubmission[]) {
+          this.db
+            .prepare(
+              'INSERT OR REPLACE INTO attendance_submissions (id,dateKey,submittedAt,updatedAt,submittedBy,daySignature) VALUES (@id,@dateKey,@submittedAt,@updatedAt,@submittedBy,@daySignature)',
+            )
+            .run(row)
+        }
+        break
+      case 'intraSubmissions':
+        for (const row of rows as IntraSubmission[]) {
+          this.db
+            .prepare(
+              'INSERT OR REPLACE INTO intra_submissions (id,dateKey,slot,submittedAt,updatedAt,submittedBy,slotSignature) VALUES (@id,@dateKey,@slot,@submittedAt,@updatedAt,@submittedBy,@slotSignature)',
+            )
+            .run(row)
+        }
+        break
+      case 'weeklyTargets':
+        for (const row of rows as WeeklyTarget[]) {
+          this.db
+            .prepare(
+              'INSERT OR REPLACE INTO weekly_targets (weekKey,targetSales,targetCpa,setAt) VALUES (@weekKey,@targetSales,@targetCpa,@setAt)',
+            )
+            .run(row)
+        }
+        break
+      case 'vaultMeetings':
+        for (const row of rows as VaultMeeting[]) {
+          this.db
+            .prepare(
+              'INSERT OR REPLACE INTO vault_meetings (id,agentId,dateKey,meetingType,notes,actionItems) VALUES (@id,@agentId,@dateKey,@meetingType,@notes,@actionItems)',
+            )
+            .run(row)
+        }
+        break
+      case 'vaultDocs':
+        for (const row of rows as VaultDoc[]) {
+          this.db
+            .prepare(
+              'INSERT OR REPLACE INTO vault_docs (id,agentId,fileName,fileSize,uploadedAt) VALUES (@id,@agentId,@fileName,@fileSize,@uploadedAt)',
+            )
+            .run(row)
+        }
+        break
+      case 'transfers':
+        for (const row of rows as TransferRecord[]) {
+          this.db
+            .prepare(
+              'INSERT OR REPLACE INTO transfers (id,dateKey,fromAgentId,toAgentId,successClosed) VALUES (@id,@dateKey,@fromAgentId,@toAgentId,@successClosed)',
+            )
+            .run({
+              ...row,
+              successClosed: row.successClosed ? 1 : 0,
+            })
+        }
+        break
+      case 'eodReports':
+        for (const row of rows as EodReport[]) {
+          this.db
+            .prepare(
+              'INSERT OR REPLACE INTO eod_reports (id,weekKey,dateKey,houseSales,houseCpa,reportText,submittedAt) VALUES (@id,@weekKey,@dateKey,@houseSales,@houseCpa,@reportText,@submittedAt)',
+            )
+            .run(row)
+        }
+        break
+      case 'shadowLogs':
+        for (const row of rows as ShadowLog[]) {
+          this.db
+            .prepare(
+              'INSERT OR REPLACE INTO shadow_logs (id,agentId,managerName,dateKey,startedAt,endedAt,callsJson,createdAt,updatedAt) VALUES (@id,@agentId,@managerName,@dateKey,@startedAt,@endedAt,@callsJson,@createdAt,@updatedAt)',
+            )
+            .run({
+              id: row.id,
+              agentId: row.agentId,
+              managerName: row.managerName,
+              dateKey: row.dateKey,
+              startedAt: row.startedAt,
+              endedAt: row.endedAt,
+              callsJson: JSON.stringify(row.calls ?? []),
+              createdAt: row.createdAt,
+              updatedAt: row.updatedAt,
+            })
+        }
+        break
+    }
   }
 
   private getAgents(): Agent[] {
@@ -254,6 +391,17 @@ export class SqliteStore implements StoreAdapter {
       .all() as Snapshot[]
   }
 
+  private getRowsForDates(key: DatedKey, dateKeys: string[]): StoreState[DatedKey] {
+    if (dateKeys.length === 0) return []
+    const select =
+      key === 'snapshots'
+        ? 'SELECT id,dateKey,slot,slotLabel,agentId,billableCalls,sales,marketing,updatedAt FROM snapshots'
+        : 'SELECT id,dateKey,agentId,billableCalls,sales,marketing,cpa,cvr,frozenAt FROM perf_history'
+    return this.db
+      .prepare(`${select} WHERE dateKey IN (${dateKeys.map(() => '?').join(',')})`)
+      .all(...dateKeys) as StoreState[DatedKey]
+  }
+
   private getPerfHistory(): PerfHistory[] {
     return this.db
       .prepare('SELECT id,dateKey,agentId,billableCalls,sales,marketing,cpa,cvr,frozenAt FROM perf_history')
@@ -405,27 +553,39 @@ export class SqliteStore implements StoreAdapter {
     return Promise.resolve(this.readLastPoliciesBotRun())
   }
 
-  async setLastPoliciesBotRun(iso: string): Promise<void> {
+  private writeLastPoliciesBotRun(iso: string): void {
     this.db.prepare("INSERT OR REPLACE INTO app_meta (key, value) VALUES ('lastPoliciesBotRun', ?)").run(iso)
   }
 
-  private readHouseMarketing(): { dateKey: string; amount: number } | null {
-    const row = this.db.prepare("SELECT value FROM app_meta WHERE key = 'houseMarketing'").get() as { value: string } | undefined
-    if (!row?.value) return null
-    try {
-      const parsed = JSON.parse(row.value) as { dateKey?: string; amount?: number }
-      if (typeof parsed?.dateKey === 'string' && Number.isFinite(parsed?.amount)) return { dateKey: parsed.dateKey, amount: Number(parsed.amount) }
-    } catch {
-      // ignore
-    }
-    return null
+  async setLastPoliciesBotRun(iso: string): Promise<void> {
+    this.writeLastPoliciesBotRun(iso)
   }
 
-  async getHouseMarketing(): Promise<{ dateKey: string; amount: number } | null> {
-    return Promise.resolve(this.readHouseMarketing())
+  private readHouseMarketingSeries(): HouseMarketingEntry[] {
+    return this.db.prepare('SELECT dateKey, amount FROM house_marketing ORDER BY dateKey').all() as HouseMarketingEntry[]
+  }
+
+  async getHouseMarketing(): Promise<HouseMarketingEntry | null> {
+    const row = this.db.prepare('SELECT dateKey, amount FROM house_marketing ORDER BY dateKey DESC LIMIT 1').get() as
+      | HouseMarketingEntry
+      | undefined
+    return Promise.resolve(row ?? null)
+  }
+
+  async getHouseMarketingSeries(): Promise<HouseMarketingEntry[]> {
+    return Promise.resolve(this.readHouseMarketingSeries())
+  }
+
+  private writeHouseMarketing(entries: HouseMarketingEntry[]): void {
+    const statement = this.db.prepare('INSERT OR REPLACE INTO house_marketing (dateKey, amount) VALUES (?, ?)')
+    for (const entry of entries) statement.run(entry.dateKey, entry.amount)
   }
 
   async setHouseMarketing(dateKey: string, amount: number): Promise<void> {
-    this.db.prepare("INSERT OR REPLACE INTO app_meta (key, value) VALUES ('houseMarketing', ?)").run(JSON.stringify({ dateKey, amount }))
+    this.writeHouseMarketing([{ dateKey, amount }])
+  }
+
+  async upsertHouseMarketing(entries: HouseMarketingEntry[]): Promise<void> {
+    this.db.transaction(() => this.writeHouseMarketing(entries))()
   }
 }
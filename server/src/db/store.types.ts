@@ -1,14 +1,116 @@
-import type { StoreState } from '../types.js'
+import type { HouseMarketingEntry, StoreState } from '../types.js'
 
-export type EntityKey = Exclude<keyof StoreState, 'lastPoliciesBotRun' | 'houseMarketing'>
+export type EntityKey = Exclude<keyof StoreState, 'lastPoliciesBotRun' | 'houseMarketing' | 'houseMarketingSeries'>
+
+/** Per-collection version, bumped on every write; collections never written are version 0. */
+export type CollectionVersions = Partial<Record<EntityKey, number>>
+
+/** Thrown by replaceCollection when expectedVersion no longer matches the stored version. */
+export class VersionConflictError extends Error {
+  constructor(
+    readonly key: EntityKey,
+    readonly currentVersion: number,
+  ) {
+    super(`${key} was changed by another writer (now version ${currentVersion}).`)
+    this.name = 'VersionConflictError'
+  }
+}
+
+/** Fields of each collection's row type (types.ts); a batch patch may only set these. Keep in sync. */
+export const ROW_FIELDS: { [K in EntityKey]: ReadonlyArray<keyof StoreState[K][number]> } = {
+  agents: ['id', 'name', 'active', 'createdAt'],
+  snapshots: ['id', 'dateKey', 'slot', 'slotLabel', 'agentId', 'billableCalls', 'sales', 'marketing', 'updatedAt'],
+  perfHistory: ['id', 'dateKey', 'agentId', 'billableCalls', 'sales', 'marketing', 'cpa', 'cvr', 'frozenAt'],
+  qaRecords: ['id', 'dateKey', 'agentId', 'clientName', 'decision', 'status', 'notes', 'createdAt', 'resolvedAt'],
+  auditRecords: [
+    'id',
+    'agentId',
+    'carrier',
+    'clientName',
+    'reason',
+    'currentStatus',
+    'discoveryTs',
+    'mgmtNotified',
+    'outreachMade',
+    'resolutionTs',
+    'notes',
+  ],
+  attendance: ['id', 'weekKey', 'dateKey', 'agentId', 'percent', 'notes'],
+  spiffRecords: ['id', 'weekKey', 'dateKey', 'agentId', 'amount'],
+  attendanceSubmissions: ['id', 'dateKey', 'submittedAt', 'updatedAt', 'submittedBy', 'daySignature'],
+  intraSubmissions: ['id', 'dateKey', 'slot', 'submittedAt', 'updatedAt', 'submittedBy', 'slotSignature'],
+  weeklyTargets: ['weekKey', 'targetSales', 'targetCpa', 'setAt'],
+  transfers: ['id', 'dateKey', 'fromAgentId', 'toAgentId', 'successClosed'],
+  shadowLogs: ['id', 'agentId', 'managerName', 'dateKey', 'startedAt', 'endedAt', 'calls', 'createdAt', 'updatedAt'],
+  vaultMeetings: ['id', 'agentId', 'dateKey', 'meetingType', 'notes', 'actionItems'],
+  vaultDocs: ['id', 'agentId', 'fileName', 'fileSize', 'uploadedAt'],
+  eodReports: ['id', 'weekKey', 'dateKey', 'houseSales', 'houseCpa', 'reportText', 'submittedAt'],
+}
+
+/** Thrown by a batch patch that targets a missing row or a field the collection does not store. */
+export class RowPatchError extends Error {
+  constructor(
+    readonly key: EntityKey,
+    readonly code: 'ROW_NOT_FOUND' | 'UNKNOWN_FIELD',
+    message: string,
+  ) {
+    super(message)
+    this.name = 'RowPatchError'
+  }
+}
+
+/** Collections whose rows carry a dateKey and can be replaced date by date. */
+export type DatedKey = 'snapshots' | 'perfHistory'
+
+/** One step of POST /state/batch; all steps of a batch are applied in a single transaction. */
+export type BatchOperation =
+  | { op: 'upsert'; collection: EntityKey; rows: StoreState[EntityKey] }
+  | { op: 'delete'; collection: EntityKey; ids: string[] }
+  | { op: 'patch'; collection: EntityKey; rows: Array<Record<string, unknown>> }
+  | {
+      op: 'replaceDates'
+      collection: DatedKey
+      dateKeys: string[]
+      rows: StoreState[DatedKey]
+      skipExisting?: boolean
+      /** House marketing written for the dates this operation actually replaces (not for skipped ones). */
+      houseMarketing?: HouseMarketingEntry[]
+    }
+  | { op: 'replace'; collection: EntityKey; rows: StoreState[EntityKey] }
+  | { op: 'setHouseMarketing'; dateKey: string; amount: number }
+  | { op: 'upsertHouseMarketing'; entries: HouseMarketingEntry[] }
+  | { op: 'setLastPoliciesBotRun'; timestamp: string }
+
+/** New collection versions of a batch, plus the stored rows of every date touched by replaceDates. */
+export interface BatchResult {
+  versions: CollectionVersions
+  rows: Partial<Record<DatedKey, StoreState[DatedKey]>>
+}
+
+/** Row identity within a collection: weekly targets are keyed by weekKey, everything else by id. */
+export function rowIdField(key: EntityKey): 'id' | 'weekKey' {
+  return key === 'weeklyTargets' ? 'weekKey' : 'id'
+}
 
 export interface StoreAdapter {
   getState(): Promise<StoreState>
   getCollection<T extends EntityKey>(key: T): Promise<StoreState[T]>
-  replaceCollection<T extends EntityKey>(key: T, rows: StoreState[T]): Promise<StoreState[T]>
+  getCollectionVersion(key: EntityKey): Promise<number>
+  getCollectionVersions(): Promise<CollectionVersions>
+  /** Replaces the collection and returns its new version; throws VersionConflictError if expectedVersion is stale. */
+  replaceCollection<T extends EntityKey>(key: T, rows: StoreState[T], expectedVersion?: number): Promise<number>
+  /**
+   * Applies the operations in order in one transaction, bumping each touched collection's version once.
+   * Throws VersionConflictError if any expectedVersions entry is stale.
+   */
+  applyBatch(operations: BatchOperation[], expectedVersions?: CollectionVersions): Promise<BatchResult>
   getLastPoliciesBotRun(): Promise<string | null>
   setLastPoliciesBotRun(iso: string): Promise<void>
+  /** Latest date of the house marketing series. */
   getHouseMarketing(): Promise<StoreState['houseMarketing']>
+  getHouseMarketingSeries(): Promise<HouseMarketingEntry[]>
   setHouseMarketing(dateKey: string, amount: number): Promise<void>
+  /** Inserts or overwrites the amount of each entry's date; other dates are kept. */
+  upsertHouseMarketing(entries: HouseMarketingEntry[]): Promise<void>
   close(): Promise<void> | void
 }
@@ -1,5 +1,8 @@
 import type { FastifyInstance } from 'fastify'
 import { z } from 'zod'
+import { compressResponse } from '../compression.js'
+import { RowPatchError, VersionConflictError, rowIdField } from '../db/store.types.js'
+import type { BatchOperation, BatchResult } from '../db/store.types.js'
 import type { StoreState } from '../types.js'
 
 const keySchema = z.enum([
@@ -20,6 +23,46 @@ const keySchema = z.enum([
   'eodReports',
 ])
 
+const rowsSchema = z.array(z.record(z.string(), z.unknown()))
+
+const houseMarketingEntrySchema = z.object({ dateKey: z.string().trim().min(1), amount: z.number() })
+
+const batchSchema = z.object({
+  operations: z
+    .array(
+      z.discriminatedUnion('op', [
+        z.object({ op: z.literal('upsert'), collection: keySchema, rows: rowsSchema }),
+        z.object({ op: z.literal('delete'), collection: keySchema, ids: z.array(z.string()) }),
+        z.object({ op: z.literal('replace'), collection: keySchema, rows: rowsSchema }),
+        z.object({ op: z.literal('patch'), collection: keySchema, rows: rowsSchema }),
+        z.object({
+          op: z.literal('replaceDates'),
+          collection: z.enum(['snapshots', 'perfHistory']),
+          dateKeys: z.array(z.string().trim().min(1)).min(1),
+          rows: rowsSchema,
+          skipExisting: z.boolean().optional(),
+          houseMarketing: z.array(houseMarketingEntrySchema).optional(),
+        }),
+        z.object({ op: z.literal('setHouseMarketing'), dateKey: z.string().trim().min(1), amount: z.number() }),
+        z.object({ op: z.literal('upsertHouseMarketing'), entries: z.array(houseMarketingEntrySchema).min(1) }),
+        z.object({ op: z.literal('setLastPoliciesBotRun'), timestamp: z.string().trim().min(1) }),
+      ]),
+    )
+    .min(1),
+  expectedVersions: z.partialRecord(keySchema, z.number().int().nonnegative()).optional(),
+})
+
+/**
+ * Parses an If-Match header carrying a collection version ("3", W/"3" or 3).
+ * Returns undefined when absent or `*` (unconditional write) and null when malformed.
+ */
+function parseIfMatch(header: string | string[] | undefined): number | undefined | null {
+  const value = (Array.isArray(header) ? header[0] : header)?.trim()
+  if (!value || value === '*') return undefined
+  const match = /^(?:W\/)?"?(\d+)"?$/.exec(value)
+  return match ? Number(match[1]) : null
+}
+
 type StateRoutesConfig = {
   frontendOrigins: string[]
 }
@@ -29,14 +72,16 @@ export async function stateRoutes(app: FastifyInstance, config: StateRoutesConfi
   const allowedOrigins = new Set(config.frontendOrigins.map(normalizeOrigin).filter(Boolean))
   const sseClients = new Set<import('node:http').ServerResponse>()
 
-  const publishStateUpdate = (resource: string) => {
-    if (sseClients.size === 0) return
-    const payload = JSON.stringify({ resource, timestamp: new Date().toISOString() })
+  /** One `state-updated` event per write; `resource` is the single resource or 'batch' when several changed. */
+  const publishStateUpdate = (...resources: string[]) => {
+    if (sseClients.size === 0 || resources.length === 0) return
+    const resource = resources.length === 1 ? resources[0] : 'batch'
+    const payload = JSON.stringify({ resource, resources, timestamp: new Date().toISOString() })
     for (const client of sseClients) {
       client.write(`event: state-updated\n`)
       client.write(`data: ${payload}\n\n`)
     }
-    app.log.debug({ resource, clients: sseClients.size }, 'Broadcasted state update event.')
+    app.log.debug({ resources, clients: sseClients.size }, 'Broadcasted state update event.')
   }
 
   app.get('/state/stream', { config: { rateLimit: false } }, async (request, reply) => {
@@ -81,13 +126,16 @@ export async function stateRoutes(app: FastifyInstance, config: StateRoutesConfi
     return reply.hijack()
   })
 
-  app.get('/state', { config: { rateLimit: { max: 240, timeWindow: '1 minute' } } }, async (_request, reply) => {
+  app.get('/state', { config: { rateLimit: { max: 240, timeWindow: '1 minute' } }, onSend: compressResponse }, async (_request, reply) => {
     reply.header('Cache-Control', 'no-store, no-cache, must-revalidate')
     reply.header('Pragma', 'no-cache')
-    return reply.send({ data: await app.store.getState() })
+    // Versions are read before the data so they can only be stale (forcing a refetch), never ahead of it.
+    const stored = await app.store.getCollectionVersions()
+    const versions = Object.fromEntries(keySchema.options.map((key) => [key, stored[key] ?? 0]))
+    return reply.send({ data: await app.store.getState(), meta: { versions } })
   })
 
-  app.get('/state/:key', { config: { rateLimit: { max: 180, timeWindow: '1 minute' } } }, async (request, reply) => {
+  app.get('/state/:key', { config: { rateLimit: { max: 180, timeWindow: '1 minute' } }, onSend: compressResponse }, async (request, reply) => {
     const parse = keySchema.safeParse((request.params as { key: string }).key)
     if (!parse.success) {
       return reply.code(400).send({
@@ -97,7 +145,9 @@ export async function stateRoutes(app: FastifyInstance, config: StateRoutesConfi
         },
       })
     }
-    return reply.send({ data: await app.store.getCollection(parse.data) })
+    const version = await app.store.getCollectionVersion(parse.data)
+    reply.header('etag', `"${version}"`)
+    return reply.send({ data: await app.store.getCollection(parse.data), meta: { version } })
   })
 
   app.put('/state/:key', { config: { rateLimit: { max: 240, timeWindow: '1 minute' } } }, async (request, reply) => {
@@ -110,10 +160,78 @@ export async function stateRoutes(app: FastifyInstance, config: StateRoutesConfi
         },
       })
     }
+    const expectedVersion = parseIfMatch(request.headers['if-match'])
+    if (expectedVersion === null) {
+      return reply.code(400).send({
+        error: { code: 'VALIDATION_ERROR', message: 'If-Match must be a collection version, e.g. "3".' },
+      })
+    }
     const rows = request.body as StoreState[typeof parse.data]
-    const next = await app.store.replaceCollection(parse.data, rows)
+    let version: number
+    try {
+      version = await app.store.replaceCollection(parse.data, rows, expectedVersion)
+    } catch (err) {
+      if (!(err instanceof VersionConflictError)) throw err
+      reply.header('etag', `"${err.currentVersion}"`)
+      return reply.code(412).send({
+        error: { code: 'VERSION_CONFLICT', message: err.message },
+      })
+    }
     publishStateUpdate(parse.data)
-    return reply.send({ data: next })
+    reply.header('etag', `"${version}"`)
+    return reply.send({ data: rows, meta: { version } })
+  })
+
+  app.post('/state/batch', { config: { rateLimit: { max: 240, timeWindow: '1 minute' } } }, async (request, reply) => {
+    const parse = batchSchema.safeParse(request.body)
+    if (!parse.success) {
+      return reply.code(400).send({
+        error: { code: 'VALIDATION_ERROR', message: 'Invalid batch body.', details: parse.error.issues },
+      })
+    }
+    const { operations, expectedVersions } = parse.data
+    for (const operation of operations) {
+      if (operation.op !== 'upsert' && operation.op !== 'replace' && operation.op !== 'patch' && operation.op !== 'replaceDates') {
+        continue
+      }
+      if (operation.op === 'replaceDates') {
+        const dateKeys = new Set(operation.dateKeys)
+        if (operation.rows.some((row) => !dateKeys.has(row.dateKey as string))) {
+          return reply.code(400).send({
+            error: { code: 'VALIDATION_ERROR', message: `Every ${operation.collection} row must have one of the replaced dateKeys.` },
+          })
+        }
+      }
+      const idField = rowIdField(operation.collection)
+      if (operation.rows.some((row) => typeof row[idField] !== 'string')) {
+        return reply.code(400).send({
+          error: { code: 'VALIDATION_ERROR', message: `Every ${operation.collection} row needs a string ${idField}.` },
+        })
+      }
+    }
+    let result: BatchResult
+    try {
+      result = await app.store.applyBatch(operations as BatchOperation[], expectedVersions)
+    } catch (err) {
+      if (err instanceof RowPatchError) {
+        return reply.code(err.code === 'ROW_NOT_FOUND' ? 404 : 400).send({
+          error: { code: err.code, message: err.message, details: { collection: err.key } },
+        })
+      }
+      if (!(err instanceof VersionConflictError)) throw err
+      return reply.code(412).send({
+        error: { code: 'VERSION_CONFLICT', message: err.message, details: { collection: err.key, version: err.currentVersion } },
+      })
+    }
+    const { versions, rows } = result
+    const resources = new Set<string>(Object.keys(versions))
+    for (const operation of operations) {
+      if (operation.op === 'setHouseMarketing' || operation.op === 'upsertHouseMarketing') resources.add('houseMarketing')
+      if (operation.op === 'replaceDates' && operation.houseMarketing?.length) resources.add('houseMarketing')
+      if (operation.op === 'setLastPoliciesBotRun') resources.add('lastPoliciesBotRun')
+    }
+    publishStateUpdate(...resources)
+    return reply.send({ data: { ok: true, rows }, meta: { versions } })
   })
 
   app.post('/state/last-policies-bot-run', async (request, reply) => {
@@ -130,7 +248,19 @@ export async function stateRoutes(app: FastifyInstance, config: StateRoutesConfi
   })
 
   app.post('/state/house-marketing', async (request, reply) => {
-    const body = request.body as { dateKey?: string; amount?: number }
+    const body = request.body as { dateKey?: string; amount?: number; entries?: unknown }
+    if (body?.entries !== undefined) {
+      // Bulk form: { entries: [{ dateKey, amount }, ...] } upserts every date in one write and one broadcast.
+      const parse = z.array(houseMarketingEntrySchema).min(1).safeParse(body.entries)
+      if (!parse.success) {
+        return reply.code(400).send({
+          error: { code: 'VALIDATION_ERROR', message: 'entries must be a non-empty array of { dateKey, amount }.', details: parse.error.issues },
+        })
+      }
+      await app.store.upsertHouseMarketing(parse.data)
+      publishStateUpdate('houseMarketing')
+      return reply.send({ data: { ok: true } })
+    }
     const dateKey = typeof body?.dateKey === 'string' ? body.dateKey.trim() : null
     const amount = typeof body?.amount === 'number' && Number.isFinite(body.amount) ? body.amount : Number(body?.amount)
     if (!dateKey || !Number.isFinite(amount)) {
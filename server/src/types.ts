@@ -153,6 +153,11 @@ export type ShadowLog = {
   updatedAt: string
 }
 
+export type HouseMarketingEntry = {
+  dateKey: string
+  amount: number
+}
+
 export type StoreState = {
   agents: Agent[]
   snapshots: Snapshot[]
@@ -171,8 +176,10 @@ export type StoreState = {
   eodReports: EodReport[]
   /** Last time the policies bot successfully ran (ISO string). */
   lastPoliciesBotRun: string | null
-  /** Scraped campaign marketing for house pulse (dateKey + amount). Set by bot. */
-  houseMarketing: { dateKey: string; amount: number } | null
+  /** Scraped campaign marketing for house pulse: the latest date of houseMarketingSeries. Set by bot. */
+  houseMarketing: HouseMarketingEntry | null
+  /** House marketing for every date the bot has written, ascending by dateKey. */
+  houseMarketingSeries: HouseMarketingEntry[]
 }
 
 export type ExportFlags = {
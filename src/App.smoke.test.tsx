@@ -82,6 +82,73 @@ describe('App smoke', () => {
     expect(parsedAgents.some((agent) => agent.name === 'New Agent')).toBe(true)
   })
 
+  it('shows the rebased agents after a version conflict on sync', async () => {
+    const remoteAgent = { id: 'r1', name: 'Remote Agent', active: true, createdAt: '2026-02-15T12:00:00.000Z' }
+    let agentPuts = 0
+    const fetchMock = vi.fn().mockImplementation(async (input: RequestInfo | URL, init?: RequestInit) => {
+      const url = String(input)
+      if (url.endsWith('/auth/me')) {
+        return {
+          ok: true,
+          status: 200,
+          text: async () => JSON.stringify({ data: { loggedIn: true, role: 'admin' } }),
+        }
+      }
+      if (url.endsWith('/state') || url.includes('/state?')) {
+        return {
+          ok: true,
+          status: 200,
+          text: async () => JSON.stringify({ data: emptyState, meta: { versions: { agents: 1 } } }),
+        }
+      }
+      if (url.includes('/state/agents?')) {
+        return {
+          ok: true,
+          status: 200,
+          text: async () => JSON.stringify({ data: [remoteAgent], meta: { version: 2 } }),
+        }
+      }
+      if (url.endsWith('/state/agents') && init?.method === 'PUT') {
+        agentPuts += 1
+        if (agentPuts === 1) {
+          return {
+            ok: false,
+            status: 412,
+            json: async () => ({ error: { code: 'VERSION_CONFLICT', message: 'Collection changed since it was read.' } }),
+          }
+        }
+        return {
+          ok: true,
+          status: 200,
+          text: async () => JSON.stringify({ data: JSON.parse(init.body as string), meta: { version: 2 + agentPuts } }),
+        }
+      }
+      return {
+        ok: true,
+        status: 200,
+        text: async () => JSON.stringify({ data: { loggedIn: false } }),
+      }
+    })
+    vi.stubGlobal('fetch', fetchMock)
+
+    renderApp()
+    const settingsLinks = await screen.findAllByRole('link', { name: 'Settings' })
+    fireEvent.click(settingsLinks[0])
+    const input = await screen.findByPlaceholderText('Add agent name')
+    fireEvent.change(input, { target: { value: 'New Agent' } })
+    fireEvent.click(screen.getByRole('button', { name: 'Add Agent' }))
+
+    // The other writer's agent is merged in and shown next to the one added here.
+    expect(await screen.findByText('Remote Agent', undefined, { timeout: 2500 })).toBeInTheDocument()
+    expect(screen.getByText('New Agent')).toBeInTheDocument()
+    const retried = JSON.parse(
+      (fetchMock.mock.calls as Array<[RequestInfo | URL, RequestInit | undefined]>).filter(
+        ([url, init]) => String(url).endsWith('/state/agents') && init?.method === 'PUT',
+      )[1][1]?.body as string,
+    ) as Array<{ name: string }>
+    expect(retried.map((agent) => agent.name)).toEqual(['Remote Agent', 'New Agent'])
+  })
+
   it('does not expose clear history control in settings', async () => {
     const populatedState = {
       ...emptyState,
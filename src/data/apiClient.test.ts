@@ -0,0 +1,94 @@
+import { afterEach, describe, expect, it, vi } from 'vitest'
+import { ApiClient, VersionConflictError, rebaseRows } from './apiClient'
+import type { Agent } from '../types'
+
+function agent(id: string, name: string, active = true): Agent {
+  return { id, name, active, createdAt: '2026-02-15T12:00:00.000Z' }
+}
+
+function ok(data: unknown, meta?: unknown) {
+  return { ok: true, status: 200, text: async () => JSON.stringify({ data, meta }) }
+}
+
+const conflict = {
+  ok: false,
+  status: 412,
+  json: async () => ({ error: { code: 'VERSION_CONFLICT', message: 'Collection changed since it was read.' } }),
+}
+
+type FetchCall = [RequestInfo | URL, RequestInit | undefined]
+
+function puts(fetchMock: ReturnType<typeof vi.fn>): RequestInit[] {
+  return (fetchMock.mock.calls as FetchCall[])
+    .filter(([, init]) => init?.method === 'PUT')
+    .map(([, init]) => init as RequestInit)
+}
+
+afterEach(() => {
+  vi.unstubAllGlobals()
+})
+
+describe('rebaseRows', () => {
+  it('keeps a local edit and a remote edit of different rows', () => {
+    const base = [agent('a1', 'Ann'), agent('a2', 'Bo')]
+    const local = [agent('a1', 'Ann Lee'), agent('a2', 'Bo')]
+    const remote = [agent('a1', 'Ann'), agent('a2', 'Bo', false)]
+    expect(rebaseRows(base, local, remote)).toEqual([agent('a1', 'Ann Lee'), agent('a2', 'Bo', false)])
+  })
+
+  it('keeps a local delete over a remote edit of the same row', () => {
+    const base = [agent('a1', 'Ann'), agent('a2', 'Bo')]
+    const local = [agent('a1', 'Ann')]
+    const remote = [agent('a1', 'Ann'), agent('a2', 'Bo', false)]
+    expect(rebaseRows(base, local, remote)).toEqual([agent('a1', 'Ann')])
+  })
+
+  it('keeps rows added on both sides', () => {
+    const base = [agent('a1', 'Ann')]
+    const local = [agent('a1', 'Ann'), agent('l1', 'Local')]
+    const remote = [agent('a1', 'Ann'), agent('r1', 'Remote')]
+    expect(rebaseRows(base, local, remote)).toEqual([agent('a1', 'Ann'), agent('r1', 'Remote'), agent('l1', 'Local')])
+  })
+})
+
+describe('ApiClient.putCollection', () => {
+  it('rebases onto the latest rows after a version conflict and writes against their version', async () => {
+    let putCount = 0
+    const fetchMock = vi.fn().mockImplementation(async (input: RequestInfo | URL, init?: RequestInit) => {
+      const url = String(input)
+      if (url.includes('/state?')) return ok({ agents: [agent('a1', 'Ann')] }, { versions: { agents: 1 } })
+      if (url.includes('/state/agents?')) return ok([agent('a1', 'Ann'), agent('r1', 'Remote')], { version: 2 })
+      if (init?.method === 'PUT') return (putCount += 1) === 1 ? conflict : ok(null, { version: 3 })
+      throw new Error(`unexpected request ${url}`)
+    })
+    vi.stubGlobal('fetch', fetchMock)
+    const client = new ApiClient('http://api.test')
+    await client.getState()
+
+    const stored = await client.putCollection('agents', [agent('a1', 'Ann'), agent('l1', 'Local')])
+
+    const expected = [agent('a1', 'Ann'), agent('r1', 'Remote'), agent('l1', 'Local')]
+    expect(stored).toEqual(expected)
+    const [first, second] = puts(fetchMock)
+    expect(first.headers).toEqual({ 'if-match': '"1"', 'content-type': 'application/json' })
+    expect(second.headers).toEqual({ 'if-match': '"2"', 'content-type': 'application/json' })
+    expect(JSON.parse(second.body as string)).toEqual(expected)
+  })
+
+  it('gives up with VersionConflictError once the retries run out', async () => {
+    let version = 1
+    const fetchMock = vi.fn().mockImplementation(async (input: RequestInfo | URL, init?: RequestInit) => {
+      if (init?.method === 'PUT') return conflict
+      version += 1
+      if (String(input).includes('/state/agents?')) return ok([agent('a1', `Ann ${version}`)], { version })
+      throw new Error(`unexpected request ${String(input)}`)
+    })
+    vi.stubGlobal('fetch', fetchMock)
+    const client = new ApiClient('http://api.test')
+
+    await expect(client.putCollection('agents', [agent('l1', 'Local')])).rejects.toBeInstanceOf(VersionConflictError)
+    // The first write and one retry per conflict, with a fresh read before each retry.
+    expect(puts(fetchMock)).toHaveLength(4)
+    expect(fetchMock).toHaveBeenCalledTimes(7)
+  })
+})
@@ -36,11 +36,53 @@ export type StoreCollections = {
   houseMarketing: { dateKey: string; amount: number } | null
 }
 
-type ApiSuccess<T> = { data: T }
+export type CollectionKey = Exclude<keyof StoreCollections, 'lastPoliciesBotRun' | 'houseMarketing'>
+
+type ApiSuccess<T> = { data: T; meta?: { version?: number; versions?: Partial<Record<CollectionKey, number>> } }
 type ApiError = { error?: { code?: string; message?: string } }
 
+const MAX_CONFLICT_RETRIES = 3
+
+/** Thrown when PUT /state/:key is rejected because the collection changed since it was read (HTTP 412). */
+export class VersionConflictError extends Error {}
+
+function rowKey(row: unknown): string {
+  const value = row as { id?: unknown; weekKey?: unknown }
+  return String(value.id ?? value.weekKey ?? JSON.stringify(row))
+}
+
+/**
+ * Re-applies local changes (rows added, edited or removed relative to base) onto the server's newer
+ * copy, keeping rows that only another writer touched as the server has them.
+ */
+export function rebaseRows<T>(base: T[], local: T[], remote: T[]): T[] {
+  const baseByKey = new Map(base.map((row) => [rowKey(row), JSON.stringify(row)]))
+  const localKeys = new Set(local.map(rowKey))
+  const changed = new Map<string, T>()
+  for (const row of local) {
+    const key = rowKey(row)
+    if (baseByKey.get(key) !== JSON.stringify(row)) changed.set(key, row)
+  }
+  const merged: T[] = []
+  for (const row of remote) {
+    const key = rowKey(row)
+    const edited = changed.get(key)
+    if (edited !== undefined) {
+      merged.push(edited)
+      changed.delete(key)
+    } else if (!baseByKey.has(key) || localKeys.has(key)) {
+      merged.push(row)
+    }
+  }
+  merged.push(...changed.values())
+  return merged
+}
+
 export class ApiClient {
   private readonly baseUrl: string
+  // Server version of each collection and the rows it had at that version (base for rebasing).
+  private readonly versions = new Map<CollectionKey, number>()
+  private readonly bases = new Map<CollectionKey, unknown[]>()
 
   constructor(baseUrl: string) {
     this.baseUrl = baseUrl.replace(/\/+$/, '')
@@ -66,24 +108,72 @@ export class ApiClient {
   async getState(): Promise<StoreCollections> {
     // Cache-bust and request no-cache so dashboard always gets latest (avoids CDN/browser/proxy cache)
     const path = `/state?_=${Date.now()}`
-    return this.request<StoreCollections>(path, {
+    const payload = await this.requestEnvelope<StoreCollections>(path, {
       method: 'GET',
       headers: { 'Cache-Control': 'no-cache', Pragma: 'no-cache' },
     })
+    for (const [key, version] of Object.entries(payload.meta?.versions ?? {}) as Array<[CollectionKey, number]>) {
+      this.remember(key, payload.data[key] ?? [], version)
+    }
+    return payload.data
+  }
+
+  async getCollection<K extends CollectionKey>(key: K): Promise<StoreCollections[K]> {
+    const payload = await this.requestEnvelope<StoreCollections[K]>(`/state/${key}?_=${Date.now()}`, {
+      method: 'GET',
+      headers: { 'Cache-Control': 'no-cache', Pragma: 'no-cache' },
+    })
+    this.remember(key, payload.data, payload.meta?.version)
+    return payload.data
   }
 
   getStateStreamUrl(): string {
     return `${this.baseUrl}/state/stream`
   }
 
-  async putCollection<K extends keyof StoreCollections>(key: K, value: StoreCollections[K]): Promise<void> {
-    await this.request(`/state/${String(key)}`, { method: 'PUT', body: value })
+  /**
+   * Writes a collection conditionally (If-Match on the version it was based on). On a conflict the
+   * collection is re-fetched and the local changes rebased onto it; resolves to the rows stored.
+   */
+  async putCollection<K extends CollectionKey>(key: K, value: StoreCollections[K]): Promise<StoreCollections[K]> {
+    let rows = value
+    for (let attempt = 0; ; attempt += 1) {
+      const version = this.versions.get(key)
+      try {
+        const payload = await this.requestEnvelope(`/state/${key}`, {
+          method: 'PUT',
+          body: rows,
+          headers: version === undefined ? undefined : { 'if-match': `"${version}"` },
+        })
+        this.remember(key, rows, payload.meta?.version)
+        return rows
+      } catch (err) {
+        if (!(err instanceof VersionConflictError) || attempt >= MAX_CONFLICT_RETRIES) throw err
+        const base = this.bases.get(key) ?? []
+        const latest = await this.getCollection(key)
+        rows = rebaseRows(base, rows as unknown[], latest as unknown[]) as StoreCollections[K]
+      }
+    }
+  }
+
+  private remember(key: CollectionKey, rows: unknown[], version: number | undefined): void {
+    if (version === undefined) return
+    this.versions.set(key, version)
+    this.bases.set(key, rows)
   }
 
   private async request<T = void>(
     path: string,
     options: { method: string; body?: unknown; headers?: Record<string, string> },
   ): Promise<T> {
+    const payload = await this.requestEnvelope<T>(path, options)
+    return payload.data
+  }
+
+  private async requestEnvelope<T>(
+    path: string,
+    options: { method: string; body?: unknown; headers?: Record<string, string> },
+  ): Promise<ApiSuccess<T>> {
     const hasBody = options.body !== undefined
     const headers: Record<string, string> = {
       ...(options.headers ?? {}),
@@ -108,13 +198,13 @@ export class ApiClient {
       } catch {
         // Keep fallback message when body is non-JSON.
       }
+      if (response.status === 412) throw new VersionConflictError(errorMessage)
       throw new Error(errorMessage)
     }
 
     const text = await response.text()
-    if (!text) return undefined as T
-    const payload = JSON.parse(text) as ApiSuccess<T>
-    return payload.data
+    if (!text) return { data: undefined as T }
+    return JSON.parse(text) as ApiSuccess<T>
   }
 }
 
@@ -19,7 +19,7 @@ import type {
 } from '../types'
 import type { DataStore } from './store.types'
 import { createApiClient } from './apiClient'
-import type { StoreCollections } from './apiClient'
+import type { CollectionKey, StoreCollections } from './apiClient'
 import { estDateKey } from '../utils'
 
 type Setter<T> = React.Dispatch<SetStateAction<T>>
@@ -193,6 +193,28 @@ export function useDataStore(): DataStore {
     setError(null)
   }, [])
 
+  const applyRebasedCollection = useCallback(<K extends CollectionKey>(key: K, rows: StoreCollections[K]) => {
+    const setters: { [P in CollectionKey]: Setter<StoreCollections[P]> } = {
+      agents: setAgentsState,
+      snapshots: setSnapshotsState,
+      perfHistory: setPerfHistoryState,
+      qaRecords: setQaRecordsState,
+      auditRecords: setAuditRecordsState,
+      attendance: setAttendanceState,
+      spiffRecords: setSpiffRecordsState,
+      attendanceSubmissions: setAttendanceSubmissionsState,
+      intraSubmissions: setIntraSubmissionsState,
+      weeklyTargets: setWeeklyTargetsState,
+      transfers: setTransfersState,
+      shadowLogs: setShadowLogsState,
+      vaultMeetings: setVaultMeetingsState,
+      vaultDocs: setVaultDocsState,
+      eodReports: setEodReportsState,
+    }
+    const setter = setters[key] as Setter<StoreCollections[K]>
+    setter(rows)
+  }, [])
+
   const syncCollection = useCallback(
     async <K extends Parameters<typeof client.putCollection>[0]>(key: K, value: Parameters<typeof client.putCollection<K>>[1]) => {
       if (hydratingRef.current || !hasLoadedRemoteRef.current) return
@@ -207,7 +229,7 @@ export function useDataStore(): DataStore {
         clearTimeout(timer)
         delete collectionSyncTimersRef.current[collectionKey]
       }
-      const scheduleCollectionFlush = <K extends keyof StoreCollections>(collectionKey: K, delayMs: number) => {
+      const scheduleCollectionFlush = <K extends CollectionKey>(collectionKey: K, delayMs: number) => {
         clearCollectionTimer(collectionKey)
         collectionSyncTimersRef.current[collectionKey] = setTimeout(() => {
           delete collectionSyncTimersRef.current[collectionKey]
@@ -215,7 +237,7 @@ export function useDataStore(): DataStore {
         }, Math.max(delayMs, 0))
       }
 
-      const flushCollectionSync = async <K extends keyof StoreCollections>(collectionKey: K) => {
+      const flushCollectionSync = async <K extends CollectionKey>(collectionKey: K) => {
         if (hydratingRef.current || !hasLoadedRemoteRef.current) return
         const now = Date.now()
         const backoffUntil = collectionBackoffUntilRef.current[collectionKey] ?? 0
@@ -236,7 +258,9 @@ export function useDataStore(): DataStore {
             if (payload === undefined) break
             delete pendingCollectionSyncRef.current[collectionKey]
             try {
-              await client.putCollection(collectionKey, payload)
+              const stored = await client.putCollection(collectionKey, payload)
+              // Another writer changed the collection meanwhile; show the rebased rows that were saved.
+              if (stored !== payload) applyRebasedCollection(collectionKey, stored)
               collectionRetryCountRef.current[collectionKey] = 0
               collectionBackoffUntilRef.current[collectionKey] = 0
               setError((current) => (current && /429|rate[\s-]?limit/i.test(current) ? null : current))
@@ -264,7 +288,7 @@ export function useDataStore(): DataStore {
       pendingCollectionSyncRef.current[key] = value
       scheduleCollectionFlush(key, getSyncDebounceMs(key))
     },
-    [client],
+    [applyRebasedCollection, client],
   )
 
   const pushSnapshotsToApi = useCallback(
@@ -292,7 +316,9 @@ export function useDataStore(): DataStore {
       do {
         shadowSyncQueuedRef.current = false
         try {
-          await client.putCollection('shadowLogs', shadowSyncLatestRef.current)
+          const latest = shadowSyncLatestRef.current
+          const stored = await client.putCollection('shadowLogs', latest)
+          if (stored !== latest) setShadowLogsState(stored)
         } catch (err) {
           setError(err instanceof Error ? err.message : 'Failed to sync data.')
         }